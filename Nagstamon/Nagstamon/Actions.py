@@ -26,7 +26,8 @@ import subprocess
 import re
 import sys
 import traceback
-import gtk
+import Queue
+import random
 
 # if running on windows import winsound
 import platform
@@ -44,9 +45,6 @@ import os, stat
 from Nagstamon import Objects
 from Nagstamon.Objects import Result
 
-#from Nagstamon import GUI
-import GUI
-
 # import md5 for centreon url autologin encoding
 try:
     #from python 2.5 md5 is in hashlib
@@ -58,124 +56,296 @@ except:
 # flag which indicates if already rechecking all
 RecheckingAll = False
 
+# refreshs all servers, started by StartRefreshLoop()
+Scheduler = None
+
 
 def StartRefreshLoop(servers=None, output=None, conf=None):
     """
-    the everlasting refresh cycle - starts refresh cycle for every server as thread
+    the everlasting refresh cycle - one scheduler cares about refreshing all servers
     """
+    global Scheduler
 
+    Scheduler = RefreshScheduler(output=output, conf=conf)
     for server in servers.values():
         if str(conf.servers[server.get_name()].enabled) == "True":
-            server.thread = RefreshLoopOneServer(server=server, output=output, conf=conf)
-            server.thread.start()
+            Scheduler.Add(server)
+    Scheduler.start()
 
 
-class RefreshLoopOneServer(threading.Thread):
+def RefreshInterval(server, conf):
     """
-    one thread for one server per loop
+    seconds until next refresh of server - its update interval plus/minus some jitter
+    to not let all servers be refreshed at once
     """
-    # kind of a stop please flag, if set to True run() should run no more
-    stopped = False
-    # Check flag, if set and thread recognizes do a refresh, set to True at the beginning
-    doRefresh = True
+    interval = int(conf.update_interval_seconds)
+    # servers might have their own update interval
+    server_interval = str(conf.servers[server.get_name()].update_interval_seconds)
+    if server_interval.isdigit() and int(server_interval) > 0:
+        interval = int(server_interval)
+    jitter = interval * int(conf.update_interval_jitter) / 100.0
+    return interval + random.uniform(-jitter, jitter)
+
+
+class RefreshScheduler(threading.Thread):
+    """
+    one thread for all servers which sleeps until the next server is due and hands it over to
+    a fixed number of RefreshWorker threads doing the actual refresh
+    """
+
+    # seconds to wait before next try after an error
+    ERROR_RETRY_SECONDS = 10
 
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
         # include threading mechanism
-        threading.Thread.__init__(self, name=self.server.get_name())
+        threading.Thread.__init__(self, name="RefreshScheduler")
         self.setDaemon(1)
+        # server -> time of next refresh
+        self.due = dict()
+        # servers currently refreshed by workers and those which were triggered meanwhile
+        self.running = set()
+        self.triggered = set()
+        # servers whose init_config() has already been called
+        self.configured = set()
+        # due servers waiting for a worker
+        self.queue = Queue.Queue()
+        # guards all of the above and wakes up scheduler if something changed
+        self.condition = threading.Condition()
+        # flag to show only one error at once in statusbar
+        self.showing_error = False
+        self.workers = list()
+
+
+    def Add(self, server):
+        """
+        start refreshing server - first refresh is done immediately
+        """
+        self.condition.acquire()
+        try:
+            server.scheduler = self
+            self.due[server] = time.time()
+            self.condition.notify()
+        finally:
+            self.condition.release()
 
-    def Stop(self):
-        # simply sets the stopped flag to True to let the above while stop this thread when checking next
-        self.stopped = True
 
-    def Refresh(self):
-        # simply sets the stopped flag to True to let the above while stop this thread when checking next
-        self.doRefresh = True
+    def Remove(self, server):
+        """
+        stop refreshing server, e.g. if it has been disabled or deleted
+        """
+        self.condition.acquire()
+        try:
+            self.due.pop(server, None)
+            self.triggered.discard(server)
+            self.configured.discard(server)
+        finally:
+            self.condition.release()
 
-    def run(self):
+
+    def Configure(self, server):
         """
-        loop until end of eternity or until server is stopped
+        gives back True if init_config() of server still has to be called - only the one worker
+        refreshing the server calls it so checking and marking are separate
         """
-        # do stuff like getting server version and setting some URLs
-        self.server.init_config()
-
-        while self.stopped == False:
-            # check if we have to leave update interval sleep
-            if self.server.count > int(self.conf.update_interval_seconds): self.doRefresh = True
-
-            # self.doRefresh could also been changed by RefreshAllServers()
-            if self.doRefresh == True:
-                # reset server count
-                self.server.count = 0
-                # check if server is already checked
-                if self.server.isChecking == False:
-                    # set server status for status field in popwin
-                    self.server.status = "Refreshing (last updated %s)" % time.ctime()
-                    gobject.idle_add(self.output.popwin.UpdateStatus, self.server)
-                    # get current status
-                    server_status = self.server.GetStatus(output=self.output)
-                    # GTK/Pango does not like tag brackets < and >, so clean them out from description
-                    server_status.error = server_status.error.replace("<", "").replace(">", "").replace("\n", " ")
-                    # debug
-                    if str(self.conf.debug_mode) == "True":
-                        self.server.Debug(server=self.server.get_name(), debug="server return values: " + str(server_status.result) + " " + str(server_status.error))
-                    if server_status.error != "":
-                        # set server status for status field in popwin
-                        self.server.status = "ERROR"
-                        # give server status description for future usage
-                        self.server.status_description = str(server_status.error)
-                        gobject.idle_add(self.output.popwin.UpdateStatus, self.server)
-                        # tell gobject to care about GUI stuff - refresh display status
-                        # use a flag to prevent all threads at once to write to statusbar label in case
-                        # of lost network connectivity - this leads to a mysterious pango crash
-                        if self.output.statusbar.isShowingError == False:
-                            gobject.idle_add(self.output.RefreshDisplayStatus)
-                            if str(self.conf.fullscreen) == "True":
-                                gobject.idle_add(self.output.popwin.RefreshFullscreen)
-                            # wait a moment
-                            time.sleep(5)
-                            # change statusbar to the following error message
-                            # show error message in statusbar
-                            # shorter error message - see https://sourceforge.net/tracker/?func=detail&aid=3017044&group_id=236865&atid=1101373
-                            gobject.idle_add(self.output.statusbar.ShowErrorMessage, {"True":"ERROR", "False":"ERR"}[str(self.conf.long_display)])
-                            # wait some seconds
-                            time.sleep(5)
-                            # set statusbar error message status back
-                            self.output.statusbar.isShowingError = False
-                        # wait a moment
-                        time.sleep(10)
-                    else:
-                        # set server status for status field in popwin
-                        self.server.status = "Connected (last updated %s)" % time.ctime()
-                        # tell gobject to care about GUI stuff - refresh display status
-                        gobject.idle_add(self.output.RefreshDisplayStatus)
-                        if str(self.conf.fullscreen) == "True":
-                            gobject.idle_add(self.output.popwin.RefreshFullscreen)
-                        # wait for the doRefresh flag to be True, if it is, do a refresh
-                        if self.doRefresh == True:
-                            if str(self.conf.debug_mode) == "True":
-                                self.server.Debug(server=self.server.get_name(), debug="Refreshing output - server is already checking: " + str(self.server.isChecking))
-                            # reset refresh flag
-                            self.doRefresh = False
-                            # call Hook() for extra action
-                            self.server.Hook()
+        self.condition.acquire()
+        try:
+            return not server in self.configured
+        finally:
+            self.condition.release()
+
+
+    def Configured(self, server):
+        """
+        remember that init_config() of server has been called - not if it has been removed meanwhile
+        """
+        self.condition.acquire()
+        try:
+            if server in self.due:
+                self.configured.add(server)
+        finally:
+            self.condition.release()
 
+
+    def Trigger(self, server):
+        """
+        refresh server as soon as possible - if it is refreshed right now do it once again afterwards
+        to catch changes of actions like acknowledging
+        """
+        self.condition.acquire()
+        try:
+            if server in self.running:
+                self.triggered.add(server)
+            elif server in self.due:
+                self.due[server] = time.time()
+                self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def Reschedule(self, server, error=False):
+        """
+        called by workers after refresh - next refresh is due after the server's update interval
+        plus/minus some jitter to not let all servers be refreshed at once
+        """
+        self.condition.acquire()
+        try:
+            self.running.discard(server)
+            if not server in self.due:
+                # server has been removed meanwhile
+                return
+            if server in self.triggered:
+                self.triggered.discard(server)
+                self.due[server] = time.time()
+            elif error == True:
+                self.due[server] = time.time() + self.ERROR_RETRY_SECONDS
             else:
-                # sleep and count
-                time.sleep(1)
-                self.server.count += 1
-                # call Hook() for extra action
-                self.server.Hook()
-                # refresh fullscreen window - maybe somehow raw approach
+                self.due[server] = time.time() + RefreshInterval(server, self.conf)
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def ShowError(self, server=None):
+        """
+        show error message in statusbar after a moment and unlock statusbar some seconds later, by gobject
+        timers instead of sleeping - only one at once to prevent a mysterious pango crash
+        """
+        if self.showing_error == True or self.output.statusbar.isShowingError == True:
+            return
+        self.showing_error = True
+
+        def show():
+            # shorter error message - see https://sourceforge.net/tracker/?func=detail&aid=3017044&group_id=236865&atid=1101373
+            self.output.statusbar.ShowErrorMessage({"True":"ERROR", "False":"ERR"}[str(self.conf.long_display)])
+            gobject.timeout_add(5000, unlock)
+            return False
+
+        def unlock():
+            # set statusbar error message status back
+            self.output.statusbar.isShowingError = False
+            self.showing_error = False
+            return False
+
+        self.output.ScheduleRefresh(server)
+        if str(self.conf.fullscreen) == "True":
+            gobject.idle_add(self.output.popwin.RefreshFullscreen)
+        gobject.timeout_add(5000, show)
+
+
+    def run(self):
+        for i in range(max(1, int(self.conf.refresh_workers))):
+            worker = RefreshWorker(scheduler=self, output=self.output, conf=self.conf)
+            worker.start()
+            self.workers.append(worker)
+
+        last_fullscreen = 0
+        while True:
+            self.condition.acquire()
+            try:
+                now = time.time()
+                for server, due in self.due.items():
+                    if due <= now and not server in self.running:
+                        self.running.add(server)
+                        # refresh is due again only after worker rescheduled it
+                        self.due[server] = now + 86400
+                        self.queue.put(server)
+                # sleep until next server is due, in fullscreen mode wake up every second to refresh it
+                timeout = None
+                if len(self.due) > 0:
+                    timeout = max(0, min(self.due.values()) - now)
                 if str(self.conf.fullscreen) == "True":
-                    gobject.idle_add(self.output.popwin.RefreshFullscreen)
+                    if now - last_fullscreen >= 1:
+                        gobject.idle_add(self.output.popwin.RefreshFullscreen)
+                        last_fullscreen = now
+                    timeout = min(timeout, 1) if timeout != None else 1
+                self.condition.wait(timeout)
+            finally:
+                self.condition.release()
+
+
+class RefreshWorker(threading.Thread):
+    """
+    one of a fixed number of threads refreshing servers which are due
+    """
+
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        # include threading mechanism
+        threading.Thread.__init__(self, name="RefreshWorker")
+        self.setDaemon(1)
+
+
+    def run(self):
+        while True:
+            server = self.scheduler.queue.get()
+            error = False
+            try:
+                error = self.Refresh(server)
+            except:
+                server.Error(sys.exc_info())
+                server.clear_stale_status()
+                self.output.ScheduleRefresh(server)
+                error = True
+            self.scheduler.Reschedule(server, error=error)
+
+
+    def Refresh(self, server):
+        """
+        refresh one server, gives back True in case of error
+        """
+        # connect to server, get its version and set some URLs once - not done at startup
+        # so many or unreachable servers do not block GUI
+        if self.scheduler.Configure(server):
+            server.status = server.get_stale_status("Connecting")
+            gobject.idle_add(self.output.popwin.UpdateStatus, server)
+            server.init_HTTP()
+            server.init_config()
+            self.scheduler.Configured(server)
+
+        # check if server is already checked
+        if server.isChecking == True:
+            return False
+
+        # set server status for status field in popwin
+        server.status = server.get_stale_status("Refreshing (last updated %s)" % time.ctime())
+        gobject.idle_add(self.output.popwin.UpdateStatus, server)
+        # get current status
+        server_status = server.GetStatus(output=self.output)
+        # GTK/Pango does not like tag brackets < and >, so clean them out from description
+        server_status.error = server_status.error.replace("<", "").replace(">", "").replace("\n", " ")
+        # debug
+        if str(self.conf.debug_mode) == "True":
+            server.Debug(server=server.get_name(), debug="server return values: " + str(server_status.result) + " " + str(server_status.error))
+        if server_status.error != "":
+            # status of cache must not look like current one
+            server.clear_stale_status()
+            # set server status for status field in popwin
+            server.status = "ERROR"
+            # give server status description for future usage
+            server.status_description = str(server_status.error)
+            gobject.idle_add(self.output.popwin.UpdateStatus, server)
+            self.scheduler.ShowError(server)
+            return True
+
+        # set server status for status field in popwin
+        server.status = "Connected (last updated %s)" % time.ctime()
+        if str(self.conf.status_cache) == "True":
+            server.save_status_cache(self.output.events_history)
+        # tell gobject to care about GUI stuff - refresh display status together with other servers polled meanwhile
+        self.output.ScheduleRefresh(server)
+        if str(self.conf.fullscreen) == "True":
+            gobject.idle_add(self.output.popwin.RefreshFullscreen)
+        # call Hook() for extra action
+        server.Hook()
+        return False
 
 
 def RefreshAllServers(servers=None, output=None, conf=None):
     """
-    one refreshing action, starts threads, one per polled server
+    one refreshing action, triggers refresh of every enabled server
     """
     # first delete all freshness flags
     output.UnfreshEventHistory()
@@ -187,10 +357,10 @@ def RefreshAllServers(servers=None, output=None, conf=None):
             if str(conf.debug_mode) == "True":
                 server.Debug(server=server.get_name(), debug="Checking server...")
 
-            server.thread.Refresh()
+            Scheduler.Trigger(server)
 
             # set server status for status field in popwin
-            server.status = "Refreshing"
+            server.status = server.get_stale_status("Refreshing")
             gobject.idle_add(output.popwin.UpdateStatus, server)
 
 
@@ -250,11 +420,32 @@ class DebugLoop(threading.Thread):
         self.stopped = True
 
 
+def FailedCommands(results):
+    """
+    (command, host, service) keys of failed commands in results as given back by GenericServer.send_commands(),
+    monitors which do not tell give back None
+    """
+    if results == None:
+        return []
+    return sorted([key for key, result in results.items() if result.error != ""])
+
+
+def ReportFailedCommands(server, results, output=None):
+    """
+    tell user in GUI about failed commands
+    """
+    failed = FailedCommands(results)
+    if len(failed) > 0 and output != None:
+        gobject.idle_add(output.CommandsFailedDialog, server, failed)
+    return failed
+
+
 class Recheck(threading.Thread):
     """
     recheck a clicked service/host
     """
     def __init__(self, **kwds):
+        self.output = None
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
         threading.Thread.__init__(self, name=self.server.get_name() + "-Recheck")
@@ -263,15 +454,116 @@ class Recheck(threading.Thread):
 
     def run(self):
         try:
-            self.server.set_recheck(self)
+            ReportFailedCommands(self.server, self.server.set_recheck(self), self.output)
         except:
             self.server.Error(sys.exc_info())
 
 
+class RecheckWorker(threading.Thread):
+    """
+    one of a limited number of workers per server which recheck lists of (host, service) from queue for RecheckAll -
+    servers using send_commands() get a whole list at once to use their batch or bulk command sending,
+    others get rechecked item by item by server.set_recheck()
+    """
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        threading.Thread.__init__(self, name=self.server.get_name() + "-RecheckWorker")
+        self.setDaemon(1)
+        # set for every item, server.set_recheck() takes them from here like from Recheck thread
+        self.host = ""
+        self.service = ""
+
+
+    def run(self):
+        while True:
+            try:
+                items = self.queue.get(False)
+            except Queue.Empty:
+                break
+            try:
+                if self.server.RECHECK_BY_COMMANDS == True:
+                    failed = FailedCommands(self.server.send_commands([("recheck", host, service, {}) for host, service in items]))
+                else:
+                    failed = list()
+                    for self.host, self.service in items:
+                        failed.extend(FailedCommands(self.server.set_recheck(self)))
+                failed = set([(host, service) for command, host, service in failed])
+            except:
+                self.server.Error(sys.exc_info())
+                failed = set(items)
+            # tell RecheckAll about progress, even in case of errors
+            for host, service in items:
+                self.events.put((self.server, host, service, (host, service) in failed))
+
+
+class CommandWorker(threading.Thread):
+    """
+    one of a limited number of workers per server which send commands of a batch from queue,
+    used by GenericServer._send_command_batch()
+    """
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        threading.Thread.__init__(self, name=self.server.get_name() + "-CommandWorker")
+        self.setDaemon(1)
+
+
+    def run(self):
+        while True:
+            try:
+                host, service = self.queue.get(False)
+            except Queue.Empty:
+                break
+            try:
+                result = self.server._send_command(self.command, host, service, self.params)
+            except:
+                result, error = self.server.Error(sys.exc_info())
+                result = Result(result=result, error=error)
+            # assigning to dictionary is thread safe
+            self.results[(self.command, host, service)] = result
+
+
+class PageWorker(threading.Thread):
+    """
+    one of a limited number of workers per server which fetch pages of paged monitor APIs,
+    page numbers are taken from counter until a page is not full anymore
+    """
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        threading.Thread.__init__(self, name=self.server.get_name() + "-PageWorker")
+        self.setDaemon(1)
+
+
+    def run(self):
+        while not self.done.isSet():
+            self.lock.acquire()
+            try:
+                page = self.counter.next()
+            finally:
+                self.lock.release()
+            try:
+                result = self.server._fetch_page(self.query, page)
+            except:
+                result, error = self.server.Error(sys.exc_info())
+                result = Result(result=result, error=error)
+            # last page or failure - no need for more pages
+            if result.error != "" or len(result.result) < self.server.API_PAGE_SIZE:
+                self.done.set()
+            self.pages.put(result)
+        # tell collecting server that this worker is finished
+        self.pages.put(None)
+
+
 class RecheckAll(threading.Thread):
     """
     recheck all services/hosts
     """
+
+    # rechecks per send_commands() call of servers which send commands in batches
+    BATCH_SIZE = 100
+
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
@@ -285,8 +577,10 @@ class RecheckAll(threading.Thread):
 
         if RecheckingAll == False:
             RecheckingAll = True
-            # put all rechecking threads into one dictionary
-            rechecks_dict = dict()
+            # workers report every finished recheck here
+            events = Queue.Queue()
+            # done and total rechecks per server
+            progress = dict()
             try:
                 # debug
                 if str(self.conf.debug_mode) == "True":
@@ -299,45 +593,65 @@ class RecheckAll(threading.Thread):
                         server.status = "Rechecking all started"
                         gobject.idle_add(self.output.popwin.UpdateStatus, server)
 
-                        # special treatment for Check_MK Multisite because there is only one URL call necessary
-                        if server.type != "Check_MK Multisite":
-                            for host in server.hosts.values():
-                                # construct an unique key which refers to rechecking thread in dictionary
-                                rechecks_dict[server.get_name() + ": " + host.get_name()] = Recheck(server=server, host=host.get_name(), service="")
-                                rechecks_dict[server.get_name() + ": " + host.get_name()].start()
+                        # some monitors like Check_MK Multisite need only one URL call for all
+                        if server.recheck_all() == True:
+                            continue
+
+                        # all rechecks of a server get queued for its workers
+                        items = list()
+                        for host in server.hosts.values():
+                            items.append((host.get_name(), ""))
+                            # debug
+                            if str(self.conf.debug_mode) == "True":
+                                server.Debug(server=server.get_name(), host=host.get_name(), debug="Rechecking...")
+                            for service in host.services.values():
+                                # dito
+                                if service.is_passive_only() == True:
+                                    continue
+                                items.append((host.get_name(), service.get_name()))
                                 # debug
                                 if str(self.conf.debug_mode) == "True":
-                                    server.Debug(server=server.get_name(), host=host.get_name(), debug="Rechecking...")
-                                for service in host.services.values():
-                                    # dito
-                                    if service.is_passive_only() == True:
-                                        continue
-                                    rechecks_dict[server.get_name() + ": " + host.get_name() + ": " + service.get_name()] = Recheck(server=server, host=host.get_name(), service=service.get_name())
-                                    rechecks_dict[server.get_name() + ": " + host.get_name() + ": " + service.get_name()].start()
-                                    # debug
-                                    if str(self.conf.debug_mode) == "True":
-                                        server.Debug(server=server.get_name(), host=host.get_name(), service=service.get_name(), debug="Rechecking...")
+                                    server.Debug(server=server.get_name(), host=host.get_name(), service=service.get_name(), debug="Rechecking...")
+
+                        progress[server.get_name()] = [0, len(items), 0]
+                        queue = Queue.Queue()
+                        if server.RECHECK_BY_COMMANDS == True:
+                            # batches are sent one after another by one worker - send_commands() already
+                            # uses bulk commands or parallel requests where possible
+                            for i in range(0, len(items), self.BATCH_SIZE):
+                                queue.put(items[i:i + self.BATCH_SIZE])
+                            workers = 1
                         else:
-                            # Check_MK Multisite does it its own way
-                            server.recheck_all()
-                # wait until all rechecks have been done
-                while len(rechecks_dict) > 0:
+                            for item in items:
+                                queue.put([item])
+                            # not more workers than needed
+                            workers = int(self.conf.recheck_all_workers)
+                        for i in range(min(workers, queue.qsize())):
+                            RecheckWorker(server=server, queue=queue, events=events).start()
+
+                # wait until all rechecks have been done - every finished one sends an event
+                remaining = sum([p[1] for p in progress.values()])
+                while remaining > 0:
+                    server, host, service, failed = events.get()
+                    remaining -= 1
+                    done = progress[server.get_name()]
+                    done[0] += 1
+                    if failed:
+                        done[2] += 1
+                    # do not flood GUI with status updates
+                    if done[0] == done[1] or done[0] % 10 == 0:
+                        server.status = "Rechecking all: %s of %s done" % (done[0], done[1])
+                        if done[2] > 0:
+                            server.status += ", %s failed" % (done[2])
+                        gobject.idle_add(self.output.popwin.UpdateStatus, server)
                     # debug
                     if str(self.conf.debug_mode) == "True":
-                        # once again taking .Debug() from first server
-                        self.servers.values()[0].Debug(server=server.get_name(), debug="Recheck all: # of checks which still need to be done: " + str(len(rechecks_dict)))
-
-                    for i in rechecks_dict.copy():
-                        # if a thread is stopped pop it out of the dictionary
-                        if rechecks_dict[i].isAlive() == False:
-                            rechecks_dict.pop(i)
-                    # wait a second
-                    time.sleep(1)
+                        server.Debug(server=server.get_name(), debug="Recheck all: # of checks which still need to be done: " + str(remaining))
 
                 # debug
                 if str(self.conf.debug_mode) == "True":
                     # once again taking .Debug() from first server
-                    self.servers.values()[0].Debug(server=server.get_name(), debug="Recheck all: All servers, hosts and services are rechecked.")
+                    self.servers.values()[0].Debug(debug="Recheck all: All servers, hosts and services are rechecked.")
                 # reset global flag
                 RecheckingAll = False
 
@@ -345,7 +659,7 @@ class RecheckAll(threading.Thread):
                 time.sleep(5)
                 RefreshAllServers(servers=self.servers, output=self.output, conf=self.conf)
                 # do some cleanup
-                del rechecks_dict
+                del events, progress
 
             except:
                 RecheckingAll = False
@@ -361,13 +675,14 @@ class Acknowledge(threading.Thread):
     exceute remote cgi command with parameters from acknowledge dialog
     """
     def __init__(self, **kwds):
+        self.output = None
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
         threading.Thread.__init__(self)
         self.setDaemon(1)
 
     def run(self):
-        self.server.set_acknowledge(self)
+        ReportFailedCommands(self.server, self.server.set_acknowledge(self), self.output)
 
 
 class Downtime(threading.Thread):
@@ -375,13 +690,14 @@ class Downtime(threading.Thread):
     exceute remote cgi command with parameters from acknowledge dialog
     """
     def __init__(self, **kwds):
+        self.output = None
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
         threading.Thread.__init__(self)
         self.setDaemon(1)
 
     def run(self):
-        self.server.set_downtime(self)
+        ReportFailedCommands(self.server, self.server.set_downtime(self), self.output)
 
 
 def Downtime_get_start_end(server, host):
@@ -735,9 +1051,32 @@ def register_server(server):
         REGISTERED_SERVERS.append((server.TYPE, server))
 
 
+def register_server_module(server_type, class_path):
+    """ Registers server type by name of its class like
+    "Nagstamon.Server.Zabbix.ZabbixServer" - its module
+    gets imported only if the server type is used.
+    """
+    if server_type not in [x[0] for x in REGISTERED_SERVERS]:
+        REGISTERED_SERVERS.append((server_type, class_path))
+
+
+def get_registered_server(server_type):
+    """ Returns server class of server type, imports its
+    module at first use or None if type is unknown.
+    """
+    for i, (registered_type, server) in enumerate(REGISTERED_SERVERS):
+        if registered_type == server_type:
+            if isinstance(server, basestring):
+                module_name, class_name = server.rsplit(".", 1)
+                server = getattr(__import__(module_name, fromlist=[class_name]), class_name)
+                REGISTERED_SERVERS[i] = (registered_type, server)
+            return server
+    return None
+
+
 def get_registered_servers():
-    """ Returns available server classes dict """
-    return dict(REGISTERED_SERVERS)
+    """ Returns available server classes dict - imports all of them """
+    return dict((x[0], get_registered_server(x[0])) for x in list(REGISTERED_SERVERS))
 
 
 def get_registered_server_type_list():
@@ -746,13 +1085,13 @@ def get_registered_server_type_list():
 
 
 def CreateServer(server=None, conf=None, debug_queue=None, resources=None):
-    # create Server from config
-    registered_servers = get_registered_servers()
-    if server.type not in registered_servers:
+    # create Server from config - only modules of used server types get imported
+    server_class = get_registered_server(server.type)
+    if server_class == None:
         print 'Server type not supported: %s' % server.type
         return
     # give argument servername so CentreonServer could use it for initializing MD5 cache
-    new_server = registered_servers[server.type](conf=conf, name=server.name)
+    new_server = server_class(conf=conf, name=server.name)
     new_server.type = server.type
     new_server.monitor_url = server.monitor_url
     new_server.monitor_cgi_url = server.monitor_cgi_url
@@ -800,9 +1139,13 @@ def CreateServer(server=None, conf=None, debug_queue=None, resources=None):
 
     # create permanent urlopener for server to avoid memory leak with millions of openers
     new_server.urlopener = BuildURLOpener(new_server)
-    # server's individual preparations for HTTP connections (for example cookie creation), version of monitor
+    # server's individual preparations for HTTP connections (for example cookie creation or login) might take
+    # long for unreachable monitors - they are done by refresh workers in background so GUI starts immediately
     if str(server.enabled) == "True":
-        new_server.init_HTTP()
+        new_server.status = "Connecting"
+        # show status of last run until first poll
+        if str(conf.status_cache) == "True":
+            new_server.load_status_cache()
 
     # debug
     if str(conf.debug_mode) == "True":
@@ -822,6 +1165,7 @@ def BuildURLOpener(server):
     where IE proxy settings are used automatically if available
     In UNIX $HTTP_PROXY will be used
     The MultipartPostHandler is needed for submitting multipart forms from Opsview
+    HTTP and HTTPS handlers of server keep connections alive in its connection pool
     """
     # trying with changed digest/basic auth order as some digest auth servers do not
     # seem to work the previous way
@@ -830,6 +1174,7 @@ def BuildURLOpener(server):
         urlopener = urllib2.build_opener(server.digest_handler,
                                          server.basic_handler,
                                          server.proxy_handler,
+                                         server.http_handler,
                                          server.https_handler,
                                          urllib2.HTTPCookieProcessor(server.Cookie),
                                          MultipartPostHandler)
@@ -837,6 +1182,7 @@ def BuildURLOpener(server):
         if str(server.use_proxy_from_os) == "True":
             urlopener = urllib2.build_opener(server.digest_handler,
                                              server.basic_handler,
+                                             server.http_handler,
                                              server.https_handler,
                                              urllib2.HTTPCookieProcessor(server.Cookie),
                                              MultipartPostHandler)
@@ -849,6 +1195,7 @@ def BuildURLOpener(server):
                                             server.proxy_auth_handler,
                                             server.digest_handler,
                                             server.basic_handler,
+                                            server.http_handler,
                                             server.https_handler,
                                             urllib2.HTTPCookieProcessor(server.Cookie),
                                             MultipartPostHandler)
@@ -937,6 +1284,160 @@ def CriticalityIsFilteredOutByRE(criticality, conf=None):
         traceback.print_exc(file=sys.stdout)
 
 
+class CompiledFilter(object):
+    """
+        filter settings of config compiled once for Generic.GetStatus() - flags become
+        real booleans and RE patterns get compiled, so every host/service needs only one call
+        which returns the reason why it was filtered out or an empty string
+    """
+
+    FLAGS = ["filter_all_down_hosts", "filter_all_unreachable_hosts", "filter_all_flapping_hosts",
+             "filter_all_unknown_services", "filter_all_warning_services", "filter_all_critical_services",
+             "filter_all_flapping_services", "filter_acknowledged_hosts_services",
+             "filter_hosts_services_disabled_notifications", "filter_hosts_services_disabled_checks",
+             "filter_hosts_services_maintenance", "filter_services_on_acknowledged_hosts",
+             "filter_services_on_down_hosts", "filter_services_on_hosts_in_maintenance",
+             "filter_services_on_unreachable_hosts", "filter_hosts_in_soft_state",
+             "filter_services_in_soft_state"]
+
+    RE_FILTERS = ["host", "service", "status_information", "criticality"]
+
+
+    def __init__(self, conf=None):
+        self.signature = CompiledFilter.Signature(conf)
+
+        for flag in self.FLAGS:
+            self.__dict__[flag] = str(getattr(conf, flag)) == "True"
+
+        # None means RE filter is disabled
+        for r in self.RE_FILTERS:
+            self.__dict__["re_" + r] = None
+            self.__dict__["re_" + r + "_reverse"] = str(getattr(conf, "re_" + r + "_reverse")) == "True"
+            if str(getattr(conf, "re_" + r + "_enabled")) == "True":
+                try:
+                    self.__dict__["re_" + r] = re.compile(getattr(conf, "re_" + r + "_pattern"))
+                except:
+                    # an invalid pattern does not filter anything, like before
+                    traceback.print_exc(file=sys.stdout)
+
+
+    @staticmethod
+    def Signature(conf):
+        """
+            all filter related config values - if they differ the filter has to be compiled again
+        """
+        keys = CompiledFilter.FLAGS[:]
+        for r in CompiledFilter.RE_FILTERS:
+            keys += ["re_" + r + "_enabled", "re_" + r + "_pattern", "re_" + r + "_reverse"]
+        return tuple([str(getattr(conf, k)) for k in keys])
+
+
+    def _IsFilteredOutByRE(self, r, string):
+        """
+            same logic as IsFoundByRE() but with precompiled pattern
+        """
+        pattern = self.__dict__["re_" + r]
+        if pattern == None:
+            return False
+        try:
+            return (pattern.search(string) != None) != self.__dict__["re_" + r + "_reverse"]
+        except:
+            return False
+
+
+    def IsHostFilteredOut(self, host, criticality=False):
+        """
+            returns reason why host is filtered out or "" if it stays visible
+            criticality is only available for Centreon
+        """
+        if host.acknowledged == True and self.filter_acknowledged_hosts_services:
+            return "ACKNOWLEDGED"
+        if host.notifications_disabled == True and self.filter_hosts_services_disabled_notifications:
+            return "NOTIFICATIONS"
+        if host.passiveonly == True and self.filter_hosts_services_disabled_checks:
+            return "PASSIVEONLY"
+        if host.scheduled_downtime == True and self.filter_hosts_services_maintenance:
+            return "DOWNTIME"
+        if host.flapping == True and self.filter_all_flapping_hosts:
+            return "FLAPPING HOST"
+        # Check_MK and OP5 do not show the status_type so their host.status_type will be empty
+        if host.status_type == "soft" and self.filter_hosts_in_soft_state:
+            return "SOFT STATE"
+        if self._IsFilteredOutByRE("host", host.name):
+            return "REGEXP"
+        if self._IsFilteredOutByRE("status_information", host.status_information):
+            return "REGEXP"
+        if criticality and self._IsFilteredOutByRE("criticality", host.criticality):
+            return "REGEXP Criticality"
+        # finegrain for the specific state
+        if host.status == "DOWN" and self.filter_all_down_hosts:
+            return "DOWN"
+        if host.status == "UNREACHABLE" and self.filter_all_unreachable_hosts:
+            return "UNREACHABLE"
+        return ""
+
+
+    def IsServiceFilteredOut(self, host, service, criticality=False):
+        """
+            returns reason why service is filtered out or "" if it stays visible
+            host is needed for filters depending on the state of the host
+        """
+        if service.acknowledged == True and self.filter_acknowledged_hosts_services:
+            return "ACKNOWLEDGED"
+        if service.notifications_disabled == True and self.filter_hosts_services_disabled_notifications:
+            return "NOTIFICATIONS"
+        if service.passiveonly == True and self.filter_hosts_services_disabled_checks:
+            return "PASSIVEONLY"
+        if service.scheduled_downtime == True and self.filter_hosts_services_maintenance:
+            return "DOWNTIME"
+        if service.flapping == True and self.filter_all_flapping_services:
+            return "FLAPPING SERVICE"
+        if host.scheduled_downtime == True and self.filter_services_on_hosts_in_maintenance:
+            return "Service on host in DOWNTIME"
+        if host.acknowledged == True and self.filter_services_on_acknowledged_hosts:
+            return "Service on acknowledged host"
+        if host.status == "DOWN" and self.filter_services_on_down_hosts:
+            return "Service on host in DOWN"
+        if host.status == "UNREACHABLE" and self.filter_services_on_unreachable_hosts:
+            return "Service on host in UNREACHABLE"
+        if self.filter_services_in_soft_state:
+            # Check_MK and OP5 do not show the status_type so their service.status_type will be empty
+            if service.status_type != "":
+                if service.status_type == "soft":
+                    return "SOFT STATE"
+            else:
+                # the old, actually wrong, behaviour
+                real_attempt, max_attempt = service.attempt.split("/")
+                if real_attempt <> max_attempt:
+                    return "SOFT STATE"
+        if self._IsFilteredOutByRE("host", host.name):
+            return "REGEXP"
+        if self._IsFilteredOutByRE("service", service.get_name()):
+            return "REGEXP"
+        if self._IsFilteredOutByRE("status_information", service.status_information):
+            return "REGEXP"
+        if criticality and self._IsFilteredOutByRE("criticality", service.criticality):
+            return "REGEXP Criticality " + str(service.criticality)
+        # finegrain for the specific state
+        if service.status == "CRITICAL" and self.filter_all_critical_services:
+            return "CRITICAL"
+        if service.status == "WARNING" and self.filter_all_warning_services:
+            return "WARNING"
+        if service.status == "UNKNOWN" and self.filter_all_unknown_services:
+            return "UNKNOWN"
+        return ""
+
+
+def CompileFilter(conf=None, compiled_filter=None):
+    """
+        gives back compiled_filter if still valid for conf or a freshly compiled one
+        if filter settings have been changed in the meantime
+    """
+    if compiled_filter == None or compiled_filter.signature != CompiledFilter.Signature(conf):
+        return CompiledFilter(conf)
+    return compiled_filter
+
+
 def HumanReadableDurationFromSeconds(seconds):
     """
     convert seconds given by Opsview to the form Nagios gives them
@@ -0,0 +1,251 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+headless collector - started by "nagstamon.py --collector" it polls the configured servers
+without any GUI and publishes their status as JSON via HTTP at /status.json
+many desktops might use this single collector by configuring a "Nagstamon aggregator" server
+instead of each of them polling every monitor server themselves
+"""
+
+import sys
+import time
+import socket
+import threading
+import Queue
+import hashlib
+import BaseHTTPServer
+import SocketServer
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from Nagstamon.Config import Config
+from Nagstamon import Actions
+# registers all server types
+from Nagstamon import Custom
+
+
+# attributes of hosts and services which get published
+ATTRIBUTES = ["status", "status_information", "status_type", "last_check", "duration", "attempt",\
+              "passiveonly", "acknowledged", "notifications_disabled", "flapping", "scheduled_downtime", "site"]
+
+
+class Snapshot(object):
+    """
+        JSON status of all servers as last collected, ETag allows clients to only fetch changes
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers = dict()
+        self.content = "{}"
+        self.etag = '"%s"' % (hashlib.md5(self.content).hexdigest())
+
+
+    def update(self, server, status):
+        """
+        store status of server after it has been polled
+        """
+        hosts = dict()
+        if status.error == "":
+            for host in server.hosts.values():
+                services = dict()
+                for service in host.services.values():
+                    if service.visible:
+                        services[service.name] = dict((a, getattr(service, a, "")) for a in ATTRIBUTES)
+                # UP hosts only come along as container of their services
+                if (host.visible and host.status != "UP") or len(services) > 0:
+                    hosts[host.name] = dict((a, getattr(host, a, "")) for a in ATTRIBUTES)
+                    hosts[host.name]["services"] = services
+
+        self.lock.acquire()
+        try:
+            self.servers[server.get_name()] = {"status":server.status, "error":status.error, "hosts":hosts}
+            content = json.dumps({"time":time.time(), "servers":self.servers}, sort_keys=True)
+            # the time changes with every poll so the ETag only depends on the servers
+            self.etag = '"%s"' % (hashlib.md5(json.dumps(self.servers, sort_keys=True)).hexdigest())
+            self.content = content
+        finally:
+            self.lock.release()
+
+
+    def get(self):
+        """
+        gives back content and its ETag
+        """
+        self.lock.acquire()
+        try:
+            return self.content, self.etag
+        finally:
+            self.lock.release()
+
+
+class SnapshotHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+        answers requests of aggregator servers
+    """
+
+    # keep connections of clients open
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ["/", "/status.json"]:
+            self.send_error(404)
+            return
+
+        content, etag = self.server.snapshot.get()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+    def log_message(self, format, *args):
+        # no access log on console
+        pass
+
+
+class SnapshotServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        HTTP server with one thread per client connection
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CollectorWorker(threading.Thread):
+    """
+    polls servers from queue, stores their status in snapshot and reschedules every server on its own
+    so slow servers do not delay the others
+    """
+
+    def __init__(self, **kwds):
+        # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
+        for k in kwds: self.__dict__[k] = kwds[k]
+        threading.Thread.__init__(self, name="CollectorWorker")
+        self.setDaemon(1)
+
+
+    def run(self):
+        while True:
+            server = self.queue.get()
+            try:
+                if not server in self.configured:
+                    server.init_HTTP()
+                    server.init_config()
+                    self.configured.add(server)
+                server.status = "Refreshing (last updated %s)" % time.ctime()
+                status = server.GetStatus()
+                if status.error != "":
+                    server.status = "ERROR"
+                else:
+                    server.status = "Connected (last updated %s)" % time.ctime()
+                self.snapshot.update(server, status)
+                error = status.error != ""
+            except:
+                server.Error(sys.exc_info())
+                error = True
+            self.condition.acquire()
+            try:
+                if error == True:
+                    self.due[server] = time.time() + Actions.RefreshScheduler.ERROR_RETRY_SECONDS
+                else:
+                    self.due[server] = time.time() + Actions.RefreshInterval(server, self.conf)
+                self.condition.notify()
+            finally:
+                self.condition.release()
+
+
+def Run():
+    """
+    run collector until it gets interrupted
+    """
+    conf = Config()
+    # same conversions as for GUI
+    conf.Convert_Conf_to_Multiple_Servers()
+    conf.Convert_Conf_to_Custom_Actions()
+
+    debug_queue = Queue.Queue()
+    if str(conf.debug_mode) == "True":
+        debugloop = Actions.DebugLoop(conf=conf, debug_queue=debug_queue, output=None)
+        debugloop.start()
+
+    # fix/patch for https://bugs.launchpad.net/ubuntu/+source/nagstamon/+bug/732544
+    socket.setdefaulttimeout(30)
+
+    servers = dict()
+    for server in conf.servers.values():
+        if server.enabled != "True":
+            continue
+        # without GUI there is nobody to ask for a password
+        if ( server.use_autologin == "False" and server.save_password == "False" ) or ( server.use_autologin == "True" and server.autologin_key == "" ):
+            print "Server %s needs a saved password to be collected." % (server.name)
+            continue
+        created_server = Actions.CreateServer(server, conf, debug_queue)
+        if created_server is not None:
+            created_server.refresh_authentication = False
+            servers[server.name] = created_server
+
+    snapshot = Snapshot()
+    httpd = SnapshotServer((conf.collector_address, int(conf.collector_port)), SnapshotHandler)
+    httpd.snapshot = snapshot
+    serving = threading.Thread(target=httpd.serve_forever, name="CollectorHTTP")
+    serving.setDaemon(1)
+    serving.start()
+    print "Collecting %s servers, status at http://%s:%s/status.json" % (len(servers), conf.collector_address, conf.collector_port)
+
+    queue = Queue.Queue()
+    configured = set()
+    # server -> time of next poll, guarded by condition which also wakes up loop below
+    due = dict((server, time.time()) for server in servers.values())
+    condition = threading.Condition()
+    for i in range(min(max(int(conf.refresh_workers), 1), max(len(servers), 1))):
+        CollectorWorker(queue=queue, snapshot=snapshot, configured=configured, due=due, condition=condition, conf=conf).start()
+
+    try:
+        while True:
+            condition.acquire()
+            try:
+                now = time.time()
+                for server, when in due.items():
+                    if when <= now:
+                        # due again only after worker rescheduled it
+                        due[server] = now + 86400
+                        queue.put(server)
+                # wake up at least every second - waiting without timeout could not be interrupted by Ctrl-C
+                timeout = 1
+                if len(due) > 0:
+                    timeout = max(0, min(min(due.values()) - now, 1))
+                condition.wait(timeout)
+            finally:
+                condition.release()
+    except KeyboardInterrupt:
+        httpd.shutdown()
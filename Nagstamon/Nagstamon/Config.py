@@ -153,6 +153,28 @@ class Config(object):
         # internal flag to determine if keyring is available at all - defaults to False
         # use_system_keyring is checked and defined some lines later after config file was read
         self.keyring_available = False
+        # maximum of idle keep-alive HTTP connections kept per monitor server
+        self.connection_pool_size = 4
+        # number of threads per monitor server used by "Recheck all"
+        self.recheck_all_workers = 4
+        # number of threads refreshing servers
+        self.refresh_workers = 4
+        # percent of update interval by which refreshs vary to not refresh all servers at once
+        self.update_interval_jitter = 10
+        # address and port the headless collector (nagstamon.py --collector) publishes status at
+        self.collector_address = "127.0.0.1"
+        self.collector_port = 8989
+        # fetch only changes since last poll if monitor supports it, every n-th poll is a full one
+        # delta polls see state changes and checks since last poll but not acknowledgements or downtimes
+        # set by others - these show up with the next full poll, own ones force a full poll at once
+        self.delta_polling = False
+        self.delta_polling_full_every = 10
+        # seconds metadata of monitors like Zabbix hosts or API version is cached before fetching it again
+        self.metadata_cache_ttl = 300
+        # save status of last poll in config directory to show it at next start before first poll finished
+        self.status_cache = True
+        # maximum of rows per server in popwin, the others are summarized as "+N more" - 0 shows all
+        self.popwin_max_rows = 1000
 
         # Special FX
         # Centreon
@@ -164,16 +186,19 @@ class Config(object):
         # would not find a config file
         self.unconfigured = True
 
+        # options like --collector are no config file
+        arguments = [a for a in sys.argv[1:] if not a.startswith("--")]
+
         # try to use a given config file - there must be one given
         # if sys.argv is larger than 1
-        if len(sys.argv) > 1:
+        if len(arguments) > 0:
             # MacOSX related -psn argument by launchd
-            if sys.argv[1].find("-psn") != -1:
+            if arguments[0].find("-psn") != -1:
                 # new configdir approach
                 self.configdir = os.path.expanduser('~') + os.sep + ".nagstamon"
             else:
                 # allow to give a config file
-                self.configdir = sys.argv[1]
+                self.configdir = arguments[0]
 
         # otherwise if there exits a configfile in current working directory it should be used
         elif os.path.exists(os.getcwd() + os.sep + "nagstamon.config"):
@@ -406,14 +431,17 @@ class Config(object):
         # default negative setting
         legacyconfigfile = False
 
+        # options like --collector are no config file
+        arguments = [a for a in sys.argv[1:] if not a.startswith("--")]
+
         # try to use a given config file - there must be one given
         # if sys.argv is larger than 1
-        if len(sys.argv) > 1:
-            if sys.argv[1].find("-psn") != -1:
+        if len(arguments) > 0:
+            if arguments[0].find("-psn") != -1:
                 legacyconfigfile = os.path.expanduser('~') + os.sep + ".nagstamon.conf"
             else:
                 # allow to give a config file
-                legacyconfigfile = sys.argv[1]
+                legacyconfigfile = arguments[0]
         # otherwise if there exits a configfile in current working directory it should be used
         elif os.path.exists(os.getcwd() + os.sep + "nagstamon.conf"):
             legacyconfigfile = os.getcwd() + os.sep + "nagstamon.conf"
@@ -867,6 +895,8 @@ class Server(object):
         self.proxy_address = ""
         self.proxy_username = ""
         self.proxy_password = ""
+        # own update interval of this server, empty for global one
+        self.update_interval_seconds = ""
 
         # special FX
         # Centreon autologin
@@ -21,26 +21,19 @@
 columns and other stuff.
 Imported in GUI module.
 """
-from Nagstamon.Actions import register_server
-
-from Nagstamon.Server.Nagios import NagiosServer
-from Nagstamon.Server.Centreon import CentreonServer
-from Nagstamon.Server.Icinga import IcingaServer
-from Nagstamon.Server.Multisite import MultisiteServer
-from Nagstamon.Server.op5Monitor import Op5MonitorServer
-from Nagstamon.Server.Opsview import OpsviewServer
-from Nagstamon.Server.Thruk import ThrukServer
-from Nagstamon.Server.Zabbix import ZabbixServer
+from Nagstamon.Actions import register_server_module
 
 
 # moved registration process because of circular dependencies
 # order of registering affects sorting in server type list in add new server dialog
-register_server(NagiosServer)
-register_server(CentreonServer)
-register_server(MultisiteServer)
-register_server(IcingaServer)
-register_server(Op5MonitorServer)
-register_server(OpsviewServer)
-register_server(ThrukServer)
-register_server(ZabbixServer)
+# server modules are imported only when their type is used - see Actions.get_registered_server()
+register_server_module("Nagios", "Nagstamon.Server.Nagios.NagiosServer")
+register_server_module("Centreon", "Nagstamon.Server.Centreon.CentreonServer")
+register_server_module("Check_MK Multisite", "Nagstamon.Server.Multisite.MultisiteServer")
+register_server_module("Icinga", "Nagstamon.Server.Icinga.IcingaServer")
+register_server_module("op5Monitor", "Nagstamon.Server.op5Monitor.Op5MonitorServer")
+register_server_module("Opsview", "Nagstamon.Server.Opsview.OpsviewServer")
+register_server_module("Thruk", "Nagstamon.Server.Thruk.ThrukServer")
+register_server_module("Zabbix", "Nagstamon.Server.Zabbix.ZabbixServer")
+register_server_module("Nagstamon aggregator", "Nagstamon.Server.Aggregator.AggregatorServer")
 
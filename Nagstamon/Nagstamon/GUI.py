@@ -34,7 +34,7 @@ import gobject
 import os
 import platform
 import sys
-import copy
+import threading
 
 # testing pynotify support
 try:
@@ -53,6 +53,7 @@ except:
 from Nagstamon import Config
 from Nagstamon import Actions
 from Nagstamon import Custom
+from Nagstamon.Objects import EventComparison
 
 
 class Sorting(object):
@@ -84,6 +85,9 @@ class GUI(object):
         class which organizes the GUI
     """
 
+    # polls finished within this time lead to only one display refresh
+    REFRESH_COALESCE_MILLISECONDS = 250
+
     def __init__(self, **kwds):
         """
             some fundamental preliminaries
@@ -117,8 +121,7 @@ class GUI(object):
         self.current_monitor = 0
 
         # define colors for detailed status table in dictionaries
-        self.TAB_BG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_background), "CRITICAL":str(self.conf.color_critical_background), "WARNING":str(self.conf.color_warning_background), "DOWN":str(self.conf.color_down_background), "UNREACHABLE":str(self.conf.color_unreachable_background)  }
-        self.TAB_FG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_text), "CRITICAL":str(self.conf.color_critical_text), "WARNING":str(self.conf.color_warning_text), "DOWN":str(self.conf.color_down_text), "UNREACHABLE":str(self.conf.color_unreachable_text) }
+        self.SetTabColors()
 
         # define popwin table liststore types
         self.LISTSTORE_COLUMNS = [gobject.TYPE_STRING, gobject.TYPE_STRING, gobject.TYPE_STRING,\
@@ -247,6 +250,16 @@ class GUI(object):
         # reverse mapping of column names and IDs for settings dialog
         self.IDS_COLUMNS_MAP = dict((id, column) for column, id in self.COLUMNS_IDS_MAP.iteritems())
 
+        # hidden integer sort keys of columns with customized sorting, one for every column, so
+        # GTK can sort them natively instead of calling a Python compare function for every comparison
+        self.LISTSTORE_SORT_KEYS_OFFSET = len(self.LISTSTORE_COLUMNS)
+        self.LISTSTORE_COLUMNS.extend([gobject.TYPE_INT64] * len(self.COLUMNS_IDS_MAP))
+
+        # filtered items in popwin, most severe first - if there are more than popwin_max_rows
+        # the least severe ones get cut
+        self.POPWIN_ROWS_ORDER = [("hosts", "DOWN"), ("hosts", "UNREACHABLE"), ("services", "CRITICAL"),\
+                                  ("services", "UNKNOWN"), ("services", "WARNING")]
+
         # use configured default sorting order
         if str(self.conf.default_sort_order) == "Ascending":
             self.startup_sort_order = gtk.SORT_ASCENDING
@@ -272,6 +285,18 @@ class GUI(object):
         self.events_history = {}
         # events to be given to custom notification, maybe to desktop notification too
         self.events_notification = {}
+        # finds new and vanished events of current refresh in linear time
+        self.events_comparison = EventComparison()
+        # events of status cache keep the freshness they had at last run
+        for server in self.servers.values():
+            self.events_history.update(server.cached_events_history)
+        # events of every server as of its last refresh, only rebuilt for dirty servers
+        self.events_by_server = {}
+
+        # names of servers polled since last display refresh - see ScheduleRefresh()
+        self.dirty_servers = set()
+        self.dirty_lock = threading.Lock()
+        self.refresh_scheduled = False
 
 
     def _get_display_dimensions(self, monitor):
@@ -313,10 +338,17 @@ class GUI(object):
         self.rows_reordered_handler[server.get_name()] = handler
 
 
+    def get_sort_column_id(self, server, id):
+        """ ListStore column to sort by for column id - its hidden sort key if it has customized sorting """
+        if id < len(server.COLUMNS) and server.COLUMNS[id].has_customized_sorting():
+            return self.LISTSTORE_SORT_KEYS_OFFSET + id
+        return id
+
+
     def set_sorting(self, liststore, server):
         """ Restores sorting after refresh """
         for id, order in self.get_last_sorting(server).iteritems():
-            liststore.set_sort_column_id(id, order)
+            liststore.set_sort_column_id(self.get_sort_column_id(server, id), order)
             # this makes sorting arrows visible according to
             # sort order after refresh
             column = self.popwin.ServerVBoxes[server.get_name()].TreeView.get_column(id)
@@ -329,7 +361,7 @@ class GUI(object):
 
         # makes column headers sortable by first time click (hack)
         order = model.get_sort_order()
-        liststore.set_sort_column_id(id, order)
+        liststore.set_sort_column_id(self.get_sort_column_id(server, id), order)
 
         rows_reordered_handler = self.get_rows_reordered_handler(server)
         if rows_reordered_handler is not None:
@@ -340,7 +372,7 @@ class GUI(object):
             new_rows_reordered_handler = liststore.connect_after('rows-reordered', self.on_sorting_order_change, id, model, server, False)
             self.set_rows_reordered_handler(server, new_rows_reordered_handler)
             self.on_sorting_order_change(liststore, None, None, None, id, model, server)
-        model.set_sort_column_id(id)
+        model.set_sort_column_id(self.get_sort_column_id(server, id))
 
 
     def on_sorting_order_change(self, liststore, path, iter, new_order, id, model, server, do_action=True):
@@ -351,13 +383,128 @@ class GUI(object):
             last_sorting.add(id, order)
 
 
+    def _GetListStoreLine(self, server, item):
+        """
+            build row of server's ListStore for host or service item
+        """
+        line = list(server.get_columns(item))
+
+        line.append("%s: %s\n%s" %((line[0], line[1], line[6])))
+
+        # apart from status informations there we need two columns which
+        # hold the color information, which is derived from status which
+        # is used as key at the above color dictionaries
+        line.append(self.TAB_FG_COLORS[item.status])
+        line.append(self.TAB_BG_COLORS[item.status])
+        line.append(self.TAB_ALTERNATE_BG_COLORS[item.status])
+
+        # Update: new columns added which contain pixbufs of flag indicators if needed
+        # icons for hosts
+        if item.is_host():
+            host = item
+            # fill line with dummmy values because there will
+            # be none for services if this is a host
+            service_icons = [None, None, None, None, None]
+        else:
+            # if the hosting host of a service has any flags display them too
+            host = server.hosts[server.get_host_key(item)]
+            service_icons = self._GetStateIcons(item)
+
+        host_icons = self._GetStateIcons(host)
+        # a fresh service's host does not need a freshness icon
+        if not item.is_host():
+            host_icons[0] = None
+
+        line.extend(host_icons)
+        line.extend(service_icons)
+
+        # hidden sort keys
+        line.extend(server.get_sort_keys(item))
+
+        return line
+
+
+    def _GetStateIcons(self, item):
+        """
+            flag indicator pixbufs of host or service
+        """
+        icons = [None, None, None, None, None]
+        if self.events_history.get(item.get_hash()) == True:
+            icons[0] = self.STATE_ICONS["fresh"]
+        if item.is_acknowledged():
+            icons[1] = self.STATE_ICONS["acknowledged"]
+        if item.is_in_scheduled_downtime():
+            icons[2] = self.STATE_ICONS["downtime"]
+        if item.is_flapping():
+            icons[3] = self.STATE_ICONS["flapping"]
+        if item.is_passive_only():
+            icons[4] = self.STATE_ICONS["passive"]
+        return icons
+
+
+    def _UpdateListStore(self, server, rows):
+        """
+            apply rows, a dictionary (host, service) -> line, to server's ListStore by only removing,
+            changing and appending rows which differ from last refresh
+            ListStore keeps its TreeIters valid as long as their rows exist, so they are kept in
+            server.ListStoreIndex together with the line values
+        """
+        index = server.ListStoreIndex
+        for key in index.keys():
+            if not key in rows:
+                server.ListStore.remove(index.pop(key)[0])
+
+        for key, line in rows.iteritems():
+            if key in index:
+                iter, old_line = index[key]
+                if line != old_line:
+                    values = list()
+                    for column, value in enumerate(line):
+                        values.extend((column, value))
+                    server.ListStore.set(iter, *values)
+                    index[key] = (iter, line)
+            else:
+                index[key] = (server.ListStore.append(line), line)
+
+
+    def ScheduleRefresh(self, server=None):
+        """
+            mark server as dirty and refresh display once for all servers polled within
+            REFRESH_COALESCE_MILLISECONDS - without server all servers are dirty
+            might be called by any thread
+        """
+        self.dirty_lock.acquire()
+        try:
+            if server == None:
+                self.dirty_servers.update(self.servers.keys())
+            else:
+                self.dirty_servers.add(server.get_name())
+            if self.refresh_scheduled == False:
+                self.refresh_scheduled = True
+                gobject.timeout_add(self.REFRESH_COALESCE_MILLISECONDS, self.RefreshDisplayStatus)
+        finally:
+            self.dirty_lock.release()
+
+
     def RefreshDisplayStatus(self):
         """
             load current nagios status and refresh trayicon and detailed treeview
             add only services which are not on maintained or acknowledged hosts
             this way applying the nagios filter more comfortably because in
             nagios one had to schedule/acknowledge every single service
+            only rows and events of servers marked dirty by ScheduleRefresh() are rebuilt, if
+            none is marked all are
         """
+        self.dirty_lock.acquire()
+        try:
+            dirty = self.dirty_servers
+            self.dirty_servers = set()
+            self.refresh_scheduled = False
+        finally:
+            self.dirty_lock.release()
+        if len(dirty) == 0:
+            dirty = set(self.servers.keys())
+
         # refresh statusbar
         # flag for overall status, needed by popwin.popup to decide if popup in case all is OK
         self.status_ok = False
@@ -374,6 +521,43 @@ class GUI(object):
         # display "ERROR" in case of startup connection trouble
         errors = ""
 
+        # calculate freshness of hosts - once for all servers
+        # new dictionary because the last one is kept by events_comparison
+        self.events_current = {}
+
+        # run through all hosts and services of dirty servers
+        for s in self.servers.values():
+            if s.get_name() in dirty or not s.get_name() in self.events_by_server:
+                events = {}
+                for host in s.hosts.values():
+                    if not host.status == "UP":
+                        # only if host is not filtered out add it to current events
+                        if host.visible:
+                            events[host.get_hash()] = host.status
+                    for service in host.services.values():
+                        # same for services of host
+                        if service.visible:
+                            events[service.get_hash()] = service.status
+                self.events_by_server[s.get_name()] = events
+            self.events_current.update(self.events_by_server[s.get_name()])
+
+        # status is part of the hash so changed items appear as new and recovered event
+        self.events_comparison.compare(self.events_current)
+
+        # check if some cached event still is relevant - kick it out if not
+        for event in self.events_comparison.recovered:
+            self.events_history.pop(event, None)
+            self.events_notification.pop(event, None)
+
+        # if some current event is not yet in event cache add it and mark it as fresh (=True)
+        if str(self.conf.highlight_new_events) == "True":
+            for event in self.events_comparison.new:
+                # events restored from status cache are no news
+                if event in self.events_history:
+                    continue
+                self.events_history[event] = True
+                self.events_notification[event] = True
+
         # walk through all servers, RefreshDisplayStatus their hosts and their services
         for server in self.servers.values():
             # only refresh monitor server output if enabled and only once every server loop
@@ -427,161 +611,44 @@ class GUI(object):
                         self.popwin.ServerVBoxes[server.get_name()].show_all()
                         self.status_ok = False
 
-                    # calculate freshness of hosts
-                    # first reset all events
-                    self.events_current.clear()
-
-                    # run through all servers and hosts and services
-                    for s in self.servers.values():
-                        for host in s.hosts.values():
-                            if not host.status == "UP":
-                                # only if host is not filtered out add it to current events
-                                # the boolean is meaningless for current events
-                                if host.visible:
-                                    self.events_current[host.get_hash()] = True
-                            for service in host.services.values():
-                                # same for services of host
-                                if service.visible:
-                                    self.events_current[service.get_hash()] = True
-
-                    # check if some cached event still is relevant - kick it out if not
-                    for event in self.events_history.keys():
-                        if not event in self.events_current.keys():
-                            self.events_history.pop(event)
-                            self.events_notification.pop(event)
-
-                    # if some current event is not yet in event cache add it and mark it as fresh (=True)
-                    for event in self.events_current.keys():
-                        if not event in self.events_history.keys() and str(self.conf.highlight_new_events) == "True":
-                            self.events_history[event] = True
-                            self.events_notification[event] = True
-
-                    # use a liststore for treeview where the table headers all are strings - first empty it
+                    # use a liststore for treeview where the table headers all are strings
                     # now added with some simple repair after settings dialog has been used
                     # because sometimes after settings changes ListStore and TreeView become NoneType
                     # would be more logical to do this in Actions.CreateServer() but this gives a segfault :-(
-                    if not type(server.ListStore) == type(None):
-                        server.ListStore.clear()
-                    else:
+                    if type(server.ListStore) == type(None):
                         server.ListStore = gtk.ListStore(*self.LISTSTORE_COLUMNS)
+                        server.ListStoreIndex = dict()
+                        # new ListStore needs all rows
+                        dirty.add(server.get_name())
                     if type(server.TreeView) == type(None):
                         # if treeview got lost recycle the one in servervbox
                         server.TreeView = self.popwin.ServerVBoxes[server.get_name()].TreeView
 
-                    # apart from status informations there we need two columns which
-                    # hold the color information, which is derived from status which
-                    # is used as key at the above color dictionaries
-                    # Update: new columns added which contain pixbufs of flag indicators if needed
-                    for item_type, status_dict in server.nagitems_filtered.iteritems():
-                        for status, item_list in status_dict.iteritems():
-                            for single_item in list(item_list):
-                                # use copy to fight memory leak
-                                item = copy.deepcopy(single_item)
-
-                                line = list(server.get_columns(item))
-
-                                line.append("%s: %s\n%s" %((line[0], line[1], line[6])))
-
-                                line.append(self.TAB_FG_COLORS[item.status])
-                                line.append(self.TAB_BG_COLORS[item.status])
-
-                                # add a slightly changed version of bg_color for better recognition in treeview
-                                color = gtk.gdk.color_parse(self.TAB_BG_COLORS[item.status])
-                                color = gtk.gdk.Color(red = self._GetAlternateColor(color.red),\
-                                                      green = self._GetAlternateColor(color.green),\
-                                                      blue = self._GetAlternateColor(color.blue),\
-                                                      pixel = color.pixel)
-                                line.append(color.to_string())
-
-                                # icons for hosts
-                                if item.is_host():
-                                    if item.get_hash() in self.events_history and self.events_history[item.get_hash()] == True:
-                                        line.append(self.STATE_ICONS["fresh"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_acknowledged():
-                                        line.append(self.STATE_ICONS["acknowledged"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_in_scheduled_downtime():
-                                        line.append(self.STATE_ICONS["downtime"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_flapping():
-                                        line.append(self.STATE_ICONS["flapping"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_passive_only():
-                                        line.append(self.STATE_ICONS["passive"])
-                                    else:
-                                        line.append(None)
-
-                                    # fill line with dummmy values because there will
-                                    # be none for services if this is a host
-                                    line.extend([None, None, None, None, None])
-
-                                # icons for services
-                                else:
-                                    # if the hosting host of a service has any flags display them too
-                                    # a fresh service's host does not need a freshness icon
-                                    line.append(None)
-
-                                    if server.hosts[item.host].is_acknowledged():
-                                        line.append(self.STATE_ICONS["acknowledged"])
-                                    else:
-                                        line.append(None)
-
-                                    if server.hosts[item.host].is_in_scheduled_downtime():
-                                        line.append(self.STATE_ICONS["downtime"])
-                                    else:
-                                        line.append(None)
-
-                                    if server.hosts[item.host].is_flapping():
-                                        line.append(self.STATE_ICONS["flapping"])
-                                    else:
-                                        line.append(None)
-
-                                    if server.hosts[item.host].is_passive_only():
-                                        line.append(self.STATE_ICONS["passive"])
-                                    else:
-                                        line.append(None)
-
-                                    # now the service...
-                                    if item.get_hash() in self.events_history and self.events_history[item.get_hash()] == True:
-                                        line.append(self.STATE_ICONS["fresh"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_acknowledged():
-                                        line.append(self.STATE_ICONS["acknowledged"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_in_scheduled_downtime():
-                                        line.append(self.STATE_ICONS["downtime"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_flapping():
-                                        line.append(self.STATE_ICONS["flapping"])
-                                    else:
-                                        line.append(None)
-
-                                    if item.is_passive_only():
-                                        line.append(self.STATE_ICONS["passive"])
-                                    else:
-                                        line.append(None)
-
-                                server.ListStore.append(line)
-
-                                del item, line
-
-                    # give new ListStore to the view, overwrites the old one automatically - theoretically
-                    server.TreeView.set_model(server.ListStore)
+                    # rows of servers which have not been polled since last refresh stay as they are
+                    if server.get_name() in dirty:
+                        # rows of filtered items, keyed by (host, service) - huge lists get cut because
+                        # building and measuring tens of thousands of rows freezes GUI
+                        items = list()
+                        for item_type, status in self.POPWIN_ROWS_ORDER:
+                            items.extend(server.nagitems_filtered[item_type][status])
+                        more = 0
+                        if int(self.conf.popwin_max_rows) > 0 and len(items) > int(self.conf.popwin_max_rows):
+                            more = len(items) - int(self.conf.popwin_max_rows)
+                            del items[int(self.conf.popwin_max_rows):]
+                        rows = dict()
+                        for item in items:
+                            if item.is_host():
+                                rows[(item.name, "")] = self._GetListStoreLine(server, item)
+                            else:
+                                rows[(item.host, item.name)] = self._GetListStoreLine(server, item)
+                        # only touch rows which differ from last refresh
+                        self._UpdateListStore(server, rows)
+                        self.popwin.ServerVBoxes[server.get_name()].set_more_rows(more)
+                        del items, rows
+
+                    # give ListStore to the view if it is a new one
+                    if server.TreeView.get_model() != server.ListStore:
+                        server.TreeView.set_model(server.ListStore)
 
                     # restore sorting order from previous refresh
                     self.set_sorting(server.ListStore, server)
@@ -742,15 +809,16 @@ class GUI(object):
             for server in self.servers.values():
                 if not server.WorstStatus == "UP":
                     # switch server status back because it has been recognized
-                    if server.States.index(server.WorstStatus) > worst:
+                    if self.events_comparison.rank.get(server.WorstStatus, 0) > worst:
+                        worst = self.events_comparison.rank[server.WorstStatus]
                         worst_status = server.WorstStatus
                     # reset status of the server for only processing it once
                     server.WorstStatus = "UP"
-                if not worst_status == "UP" and str(self.conf.notification) == "True":
-                    self.NotificationOn(status=worst_status, ducuw=(downs, unreachables, criticals, unknowns, warnings))
-                    # store latst worst status for decide if there has to be notification action
-                    # when all is OK some lines later
-                    self.last_worst_status = worst_status
+            if not worst_status == "UP" and str(self.conf.notification) == "True":
+                self.NotificationOn(status=worst_status, ducuw=(downs, unreachables, criticals, unknowns, warnings))
+                # store latst worst status for decide if there has to be notification action
+                # when all is OK some lines later
+                self.last_worst_status = worst_status
 
             # set self.showPopwin to True because there is something to show
             self.popwin.showPopwin = True
@@ -762,7 +830,7 @@ class GUI(object):
             self.last_worst_status = "UP"
 
         # if failures have gone and nobody took notice switch notification off again
-        if len([k for k,v in self.events_history.items() if v == True]) == 0 and self.Notifying == True:
+        if not True in self.events_history.itervalues() and self.Notifying == True:
             self.NotificationOff()
 
         # if only one monitor cannot be reached show popwin to inform about its trouble
@@ -882,7 +950,7 @@ class GUI(object):
         # let thread execute POST request
         acknowledge = Actions.Acknowledge(server=server, host=host,\
                                           service=service, author=author, comment=comment, acknowledge_all_services=acknowledge_all_services,\
-                                          all_services=all_services, sticky=sticky, notify=notify, persistent=persistent)
+                                          all_services=all_services, sticky=sticky, notify=notify, persistent=persistent, output=self)
         acknowledge.start()
 
 
@@ -995,7 +1063,7 @@ class GUI(object):
         minutes = self.downtime_xml.get_object("input_spinbutton_duration_minutes").get_value()
 
         # execute POST request with cgi_data, in this case threaded
-        downtime = Actions.Downtime(server=server, host=host, service=service, author=author, comment=comment, fixed=fixed, start_time=start_time, end_time=end_time, hours=int(hours), minutes=int(minutes))
+        downtime = Actions.Downtime(server=server, host=host, service=service, author=author, comment=comment, fixed=fixed, start_time=start_time, end_time=end_time, hours=int(hours), minutes=int(minutes), output=self)
         downtime.start()
 
 
@@ -1199,6 +1267,24 @@ class GUI(object):
         self.dialog.destroy()
 
 
+    def CommandsFailedDialog(self, server, failed):
+        """
+            tell which commands could not be sent to monitor, failed is a list of (command, host, service)
+        """
+        lines = list()
+        for command, host, service in failed[:10]:
+            if service == "":
+                lines.append("%s %s" % (command, host))
+            else:
+                lines.append("%s %s: %s" % (command, host, service))
+        if len(failed) > 10:
+            lines.append("...")
+        self.Dialog(type=gtk.MESSAGE_ERROR, buttons=gtk.BUTTONS_OK,\
+                    message="%s command(s) could not be sent to %s:\n\n%s" % (len(failed), server.get_name(), "\n".join(lines)))
+        # return False to get removed as gobject idle source
+        return False
+
+
     def CheckForNewVersionDialog(self, version_status=None, version=None):
         """
             Show results of Settings.CheckForNewVersion()
@@ -1300,14 +1386,15 @@ class GUI(object):
                 # Custom event notification
                 if str(self.conf.notification_actions) == "True" and str(self.conf.notification_custom_action) == "True":
                     events = ""
+                    # list comprehension only considers events which are new, ergo True - collected only once
+                    events_new = [k for k,v in self.events_notification.iteritems() if v == True]
                     # if no single notifications should be used (default) put all events into one string, separated by separator
                     if str(self.conf.notification_custom_action_single) == "False":
-                        # list comprehension only considers events which are new, ergo True
-                        events = self.conf.notification_custom_action_separator.join([k for k,v in self.events_notification.items() if v == True])
+                        events = self.conf.notification_custom_action_separator.join(events_new)
                         # clear already notified events setting them to False
-                        for event in [k for k,v in self.events_notification.items() if v == True]: self.events_notification[event] = False
+                        for event in events_new: self.events_notification[event] = False
                     else:
-                        for event in [k for k,v in self.events_notification.items() if v == True]:
+                        for event in events_new:
                             custom_action_string = self.conf.notification_custom_action_string.replace("$EVENTS$", event)
                             Actions.RunNotificationAction(custom_action_string)
                             # clear already notified events setting them to False
@@ -1359,6 +1446,23 @@ class GUI(object):
         recheckall.start()
 
 
+    def SetTabColors(self):
+        """
+            (re)build colors for status table once instead of for every row with every refresh
+        """
+        self.TAB_BG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_background), "CRITICAL":str(self.conf.color_critical_background), "WARNING":str(self.conf.color_warning_background), "DOWN":str(self.conf.color_down_background), "UNREACHABLE":str(self.conf.color_unreachable_background)  }
+        self.TAB_FG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_text), "CRITICAL":str(self.conf.color_critical_text), "WARNING":str(self.conf.color_warning_text), "DOWN":str(self.conf.color_down_text), "UNREACHABLE":str(self.conf.color_unreachable_text) }
+        # a slightly changed version of bg_color for better recognition in treeview
+        self.TAB_ALTERNATE_BG_COLORS = dict()
+        for status, bg_color in self.TAB_BG_COLORS.items():
+            color = gtk.gdk.color_parse(bg_color)
+            color = gtk.gdk.Color(red = self._GetAlternateColor(color.red),\
+                                  green = self._GetAlternateColor(color.green),\
+                                  blue = self._GetAlternateColor(color.blue),\
+                                  pixel = color.pixel)
+            self.TAB_ALTERNATE_BG_COLORS[status] = color.to_string()
+
+
     def _GetAlternateColor(self, color, diff=2048):
         """
             helper for treeview table colors to get a slightly different color
@@ -2041,8 +2145,7 @@ class Popwin(object):
         # define colors for detailed status table in dictionaries
         # need to be redefined here for MacOSX because there it is not
         # possible to reinitialize the whole GUI after config changes without a crash
-        self.output.TAB_BG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_background), "CRITICAL":str(self.conf.color_critical_background), "WARNING":str(self.conf.color_warning_background), "DOWN":str(self.conf.color_down_background), "UNREACHABLE":str(self.conf.color_unreachable_background)  }
-        self.output.TAB_FG_COLORS = { "UNKNOWN":str(self.conf.color_unknown_text), "CRITICAL":str(self.conf.color_critical_text), "WARNING":str(self.conf.color_warning_text), "DOWN":str(self.conf.color_down_text), "UNREACHABLE":str(self.conf.color_unreachable_text) }
+        self.output.SetTabColors()
 
         # create a scrollable area for the treeview in case it is larger than the screen
         # in case there are too many failed services and hosts
@@ -2371,6 +2474,19 @@ class Popwin(object):
             self.output.UnfreshEventHistory()
 
 
+    def get_scrolled_size(self):
+        """
+        size of all shown server vboxes, estimated from their row counts
+        """
+        width = height = 0
+        for vbox in self.ServerVBoxes.values():
+            if vbox.get_visible():
+                vboxwidth, vboxheight = vbox.get_size_estimate()
+                width = max(width, vboxwidth)
+                height += vboxheight
+        return width, height
+
+
     def Resize(self):
         """
             calculate popwin dimensions depending on the amount of information displayed in scrollbox
@@ -2444,7 +2560,7 @@ class Popwin(object):
         screenx0, screeny0, screenwidth, screenheight = self.output.monitors[self.output.current_monitor]
 
         # limit size of treeview
-        treeviewwidth, treeviewheight = self.ScrolledVBox.size_request()
+        treeviewwidth, treeviewheight = self.get_scrolled_size()
 
         if treeviewwidth > screenwidth: treeviewwidth = screenwidth
 
@@ -2720,6 +2836,8 @@ class ServerVBox(gtk.VBox):
 
         # Liststore
         self.server.ListStore = gtk.ListStore(*self.output.LISTSTORE_COLUMNS)
+        # TreeIters of rows in new ListStore
+        self.server.ListStoreIndex = dict()
 
         # offset to access host and service flag icons separately, stored in grand liststore
         # may grow with more supported flags
@@ -2798,10 +2916,6 @@ class ServerVBox(gtk.VBox):
                                 treeview.set_size_request(0,-1)
                     self.connect_after('size-allocate', resize_wrap, self.server.TreeView, tab_column, cell_txt)
 
-            # set customized sorting
-            if column.has_customized_sorting():
-                self.server.ListStore.set_sort_func(s, column.sort_function, s)
-
             # make table sortable by clicking on column headers
             tab_column.set_clickable(True)
             tab_column.connect('clicked', self.output.on_column_header_click, s, self.server.ListStore, self.server)
@@ -2812,6 +2926,16 @@ class ServerVBox(gtk.VBox):
 
         self.add(self.TreeView)
 
+        # summary of rows which did not fit into popwin_max_rows
+        self.LabelMore = gtk.Label()
+        self.LabelMore.set_alignment(0, 0)
+        self.LabelMore.set_padding(5, 2)
+        self.LabelMore.set_no_show_all(True)
+        self.add(self.LabelMore)
+
+        # height of one TreeView row, measured once at first for sizing popwin
+        self.row_height = None
+
 
     def initialize(self, server):
         """
@@ -2829,6 +2953,47 @@ class ServerVBox(gtk.VBox):
             self.server.TreeView.set_grid_lines(gtk.TREE_VIEW_GRID_LINES_BOTH)
         else:
             self.server.TreeView.set_grid_lines(gtk.TREE_VIEW_GRID_LINES_NONE)
+        # grid lines might change row height
+        self.row_height = None
+
+
+    def set_more_rows(self, more):
+        """
+        show how many rows did not fit into popwin
+        """
+        if more > 0:
+            self.LabelMore.set_markup("<i>+%s more</i>" % (more))
+            self.LabelMore.show()
+        else:
+            self.LabelMore.hide()
+
+
+    def get_size_estimate(self):
+        """
+        size of server vbox for popwin - height is row count times row height instead of letting
+        GTK measure every single row
+        """
+        rows = len(self.server.ListStore)
+        if rows == 0:
+            return self.size_request()
+
+        if self.row_height == None:
+            column = self.server.TreeView.get_column(0)
+            column.cell_set_cell_data(self.server.ListStore, self.server.ListStore.get_iter_first(), False, False)
+            self.row_height = column.cell_get_size()[-1] + self.server.TreeView.style_get_property("vertical-separator")
+
+        # columns have no width before they were shown once
+        columns_width = sum([c.get_width() for c in self.server.TreeView.get_columns() if c.get_visible()])
+        if columns_width == 0:
+            return self.size_request()
+
+        headerwidth, headerheight = self.Server_EventBox.size_request()
+        width = max(headerwidth, columns_width)
+        # one more row for the column headers
+        height = headerheight + (rows + 1) * self.row_height
+        if self.LabelMore.get_visible():
+            height += self.LabelMore.size_request()[1]
+        return width, height
 
 
     def TreeviewPopupMenu(self, widget, event, treeview, server):
@@ -2986,7 +3151,8 @@ class ServerVBox(gtk.VBox):
                 self.output.GetDialog(dialog="Settings", servers=self.output.servers, output=self.output, conf=self.output.conf, first_page="Actions")
             elif remoteservice == "Recheck":
                 # start new rechecking thread
-                recheck = Actions.Recheck(server=self.miserable_server, host=self.miserable_host, service=self.miserable_service)
+                recheck = Actions.Recheck(server=self.miserable_server, host=self.miserable_host, service=self.miserable_service,\
+                                          output=self.output)
                 recheck.start()
             elif remoteservice == "Acknowledge":
                 self.output.AcknowledgeDialogShow(server=self.miserable_server, host=self.miserable_host, service=self.miserable_service)
@@ -3501,9 +3667,8 @@ class Settings(object):
         for state in ["ok", "warning", "critical", "unknown", "unreachable", "down", "error"]:
             self.conf.__dict__["color_" + state + "_text"] = self.builder.get_object("input_colorbutton_" + state + "_text").get_color().to_string()
             self.conf.__dict__["color_" + state + "_background"] = self.builder.get_object("input_colorbutton_" + state + "_background").get_color().to_string()
-            # add new color information to color dictionaries for cells to render
-            self.output.TAB_FG_COLORS[state.upper()] = self.builder.get_object("input_colorbutton_" + state + "_text").get_color().to_string()
-            self.output.TAB_BG_COLORS[state.upper()] = self.builder.get_object("input_colorbutton_" + state + "_background").get_color().to_string()
+        # add new color information to color dictionaries for cells to render
+        self.output.SetTabColors()
 
         # evaluate comboboxes
         self.conf.default_sort_field = self.combo_default_sort_field.get_active_text()
@@ -3633,10 +3798,9 @@ class Settings(object):
             if dialog.run() == gtk.RESPONSE_YES:
                 # delete server configuration entry
                 self.conf.servers.pop(server)
-                # stop thread
+                # stop refreshing
                 try:
-                    if self.servers[server].thread:
-                        self.servers[server].thread.Stop()
+                    Actions.Scheduler.Remove(self.servers[server])
                 except:
                     # most probably server has been disabled and that's why there is no thread running
                     # debug
@@ -4102,7 +4266,7 @@ class GenericServer(object):
         model = combobox.get_model()
         if not model:
             return
-        server = Actions.get_registered_servers()[model.get_value(active, 0)]
+        server = Actions.get_registered_server(model.get_value(active, 0))
 
         # make everything visible
         for item_id in ["label_monitor_cgi_url",
@@ -4160,7 +4324,7 @@ class GenericServer(object):
         new_server.__dict__["type"] = model.get_value(active, 0)
 
         # workaround for cgi-url not needed by certain monitor types
-        server = Actions.get_registered_servers()[new_server.type]
+        server = Actions.get_registered_server(new_server.type)
         if "input_entry_monitor_cgi_url" in server.DISABLED_CONTROLS:
             new_server.monitor_cgi_url = new_server.monitor_url
 
@@ -4180,9 +4344,8 @@ class GenericServer(object):
                 self.servers[new_server.name] = created_server
 
                 if str(self.conf.servers[new_server.name].enabled) == "True":
-                    # start new thread (should go to Actions!)
-                    self.servers[new_server.name].thread = Actions.RefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
-                    self.servers[new_server.name].thread.start()
+                    # start refreshing
+                    Actions.Scheduler.Add(self.servers[new_server.name])
 
             # fill settings dialog treeview
             self.settingsdialog.FillTreeView("servers_treeview", self.conf.servers, "Servers", "selected_server")
@@ -4404,7 +4567,7 @@ class EditServer(GenericServer):
         new_server.__dict__["type"] = model.get_value(active, 0)
 
         # workaround for cgi-url not needed by certain monitor types
-        server = Actions.get_registered_servers()[new_server.type]
+        server = Actions.get_registered_server(new_server.type)
         if "input_entry_monitor_cgi_url" in server.DISABLED_CONTROLS:
             new_server.monitor_cgi_url = new_server.monitor_url
 
@@ -4419,9 +4582,8 @@ class EditServer(GenericServer):
             # delete old server configuration entry
             self.conf.servers.pop(self.server)
             try:
-                # stop thread - only if it is yet initialized as such
-                if self.servers[self.server].thread:
-                    self.servers[self.server].thread.Stop()
+                # stop refreshing
+                Actions.Scheduler.Remove(self.servers[self.server])
             except:
                 import traceback
                 traceback.print_exc(file=sys.stdout)
@@ -4435,9 +4597,8 @@ class EditServer(GenericServer):
             if created_server is not None:
                 self.servers[new_server.name] = created_server
                 if str(self.conf.servers[new_server.name].enabled) == "True":
-                    # start new thread (should go to Actions)
-                    self.servers[new_server.name].thread = Actions.RefreshLoopOneServer(server=self.servers[new_server.name], output=self.output, conf=self.conf)
-                    self.servers[new_server.name].thread.start()
+                    # start refreshing
+                    Actions.Scheduler.Add(self.servers[new_server.name])
 
             # fill settings dialog treeview
             self.settingsdialog.FillTreeView("servers_treeview", self.conf.servers, "Servers", "selected_server")
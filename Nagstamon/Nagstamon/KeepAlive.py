@@ -0,0 +1,210 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+HTTP keep-alive for urllib2 - connections of a server are kept in a pool and reused
+instead of doing a TCP and TLS handshake for every request
+"""
+
+import httplib
+import socket
+import threading
+import time
+import urllib2
+
+
+class ConnectionPool(object):
+    """
+        idle connections of one server, keyed by host (and proxy tunnel target)
+        size limits the number of idle connections kept per key
+    """
+
+    # connections idle longer than this will most probably have been closed by the server
+    MAX_IDLE_SECONDS = 30
+
+    def __init__(self, size=4):
+        self.size = size
+        self.connections = dict()
+        self.lock = threading.Lock()
+
+
+    def get(self, key):
+        """
+        gives back an idle connection for key or None
+        """
+        self.lock.acquire()
+        try:
+            while len(self.connections.get(key, [])) > 0:
+                connection, idle_since = self.connections[key].pop()
+                if time.time() - idle_since < self.MAX_IDLE_SECONDS:
+                    return connection
+                connection.close()
+            return None
+        finally:
+            self.lock.release()
+
+
+    def put(self, key, connection):
+        """
+        give connection back for reuse or close it if pool is full
+        """
+        self.lock.acquire()
+        try:
+            idle = self.connections.setdefault(key, [])
+            if len(idle) < int(self.size):
+                idle.append((connection, time.time()))
+                return
+        finally:
+            self.lock.release()
+        connection.close()
+
+
+    def clear(self):
+        """
+        close all idle connections, e.g. after authentication has been reset
+        """
+        self.lock.acquire()
+        try:
+            for idle in self.connections.values():
+                for connection, idle_since in idle:
+                    connection.close()
+            self.connections.clear()
+        finally:
+            self.lock.release()
+
+
+class PooledResponse(object):
+    """
+        wraps httplib.HTTPResponse for socket._fileobject - when closed after being read
+        completely its connection goes back into the pool
+    """
+
+    def __init__(self, response, pool, key, connection):
+        self.response = response
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+
+
+    def recv(self, amt=None):
+        return self.response.read(amt)
+
+
+    def close(self):
+        if self.connection == None:
+            return
+        # HTTPResponse closes itself when all content has been read - responses without body like
+        # "304 Not Modified" or fully read error responses are complete too
+        complete = self.response.isclosed() or self.response.length == 0
+        self.response.close()
+        if complete and not self.response.will_close:
+            self.pool.put(self.key, self.connection)
+        else:
+            self.connection.close()
+        self.connection = None
+
+
+class KeepAliveHandlerMixin(object):
+    """
+        replaces urllib2.AbstractHTTPHandler.do_open() with a version using pooled connections
+        cookies, authentication and proxies are still handled by the other handlers of the opener
+    """
+
+    def do_open(self, http_class, req, **http_conn_args):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError("no host given")
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        tunnel_headers = {}
+        if req._tunnel_host:
+            if "Proxy-Authorization" in headers:
+                tunnel_headers["Proxy-Authorization"] = headers["Proxy-Authorization"]
+                del headers["Proxy-Authorization"]
+
+        key = (http_class.__name__, host, req._tunnel_host)
+
+        # a reused connection might have been closed by the server meanwhile - then try once again with a new one
+        # requests with data like commands sent by POST cannot be tried again as they might have been executed
+        # already, so they always get a new connection - it goes back into the pool afterwards nevertheless
+        if req.data == None:
+            connection = self.pool.get(key)
+        else:
+            connection = None
+        reused = connection != None
+        while True:
+            if connection == None:
+                connection = http_class(host, timeout=req.timeout, **http_conn_args)
+                connection.set_debuglevel(self._debuglevel)
+                if req._tunnel_host:
+                    connection.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+            try:
+                connection.request(req.get_method(), req.get_selector(), req.data, headers)
+                try:
+                    response = connection.getresponse(buffering=True)
+                except TypeError:
+                    response = connection.getresponse()
+                break
+            except (socket.error, httplib.HTTPException), err:
+                connection.close()
+                connection = None
+                if not reused:
+                    raise urllib2.URLError(err)
+                reused = False
+
+        fp = socket._fileobject(PooledResponse(response, self.pool, key, connection), close=True)
+        resp = urllib2.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+
+class KeepAliveHTTPHandler(KeepAliveHandlerMixin, urllib2.HTTPHandler):
+    """
+        HTTP handler using pool
+    """
+
+    def __init__(self, pool, debuglevel=0):
+        urllib2.HTTPHandler.__init__(self, debuglevel)
+        self.pool = pool
+
+
+    def http_open(self, req):
+        return self.do_open(httplib.HTTPConnection, req)
+
+
+class KeepAliveHTTPSHandler(KeepAliveHandlerMixin, urllib2.HTTPSHandler):
+    """
+        HTTPS handler using pool, context is only known since Python 2.7.9
+    """
+
+    def __init__(self, pool, debuglevel=0, context=None):
+        urllib2.HTTPSHandler.__init__(self, debuglevel)
+        self.pool = pool
+        self._context = context
+
+
+    def https_open(self, req):
+        if self._context != None:
+            return self.do_open(httplib.HTTPSConnection, req, context=self._context)
+        return self.do_open(httplib.HTTPSConnection, req)
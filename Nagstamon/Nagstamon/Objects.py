@@ -23,7 +23,7 @@ import Actions
 class Column(object):
     ATTR_NAME = 'name'
     DEFAULT_VALUE = ''
-    SORT_FUNCTION_NAME = 'sort_function'
+    SORT_KEY_NAME = 'sort_key'
 
     def __init__(self, row):
         self.value = self._get_value(row)
@@ -44,29 +44,21 @@ class Column(object):
 
     @classmethod
     def has_customized_sorting(cls):
-        return hasattr(cls, cls.SORT_FUNCTION_NAME)
+        return hasattr(cls, cls.SORT_KEY_NAME)
 
 
 class CustomSortingColumn(Column):
     CHOICES = [] # list of expected values with expected order
 
     @classmethod
-    def sort_function(cls, model, iter1, iter2, column):
-        """ Overrides default sorting behaviour """
-        data1, data2 = [model.get_value(x, column) for x in (iter1, iter2)]
-        # this happens since liststore (aka tab_model) is an attribute of server and not created every time
-        # new, so sometimes data2 is simply "None"
-        if data2 == None: return cls.CHOICES.index(data1)
-        try:
-            return cls.CHOICES.index(data1) - cls.CHOICES.index(data2)
-        except ValueError, err: # value not in CHOICES
-            try:
-                return cmp(cls.CHOICES.index(data1), cls.CHOICES.index(data2))
-            except ValueError, err:
-                try:
-                    return cls.CHOICES.index(data1)
-                except:
-                    return cls.CHOICES.index(data2)
+    def sort_key(cls, value):
+        """ Overrides default sorting behaviour - integer computed once per row and stored
+            in a hidden ListStore column which is sorted by instead
+        """
+        if value in cls.CHOICES:
+            return cls.CHOICES.index(value)
+        # value not in CHOICES
+        return -1
 
 
 class StatusColumn(CustomSortingColumn):
@@ -98,16 +90,13 @@ class DurationColumn(CustomSortingColumn):
     ATTR_NAME = 'duration'
 
     @classmethod
-    def sort_function(cls, model, iter1, iter2, column):
+    def sort_key(cls, value):
         """ Overrides default sorting behaviour """
-        data1, data2 = [model.get_value(x, column) for x in (iter1, iter2)]
         try:
-            first = Actions.MachineSortableDate(data1)
-            second = Actions.MachineSortableDate(data2)
-        except ValueError, err:
-            print err
-            return cmp(first, second)
-        return first - second
+            return Actions.MachineSortableDate(value)
+        except ValueError:
+            # durations like "n/a"
+            return 0
 
 
 class AttemptColumn(Column):
@@ -118,30 +107,74 @@ class StatusInformationColumn(Column):
     ATTR_NAME = 'status_information'
 
 
+def intern_status(status):
+    """
+    the same few status strings are used by thousands of items so they share one string object
+    """
+    try:
+        return intern(str(status))
+    except:
+        return status
+
+
 class GenericObject(object):
     """
     template for hosts and services
+    as there might be ten thousands of them every poll their fields are declared in __slots__
+    instead of an instance dictionary - fields needed by single server types have to be declared
+    here too
     """
 
-    def __init__(self):
-        self.name = ""
-        self.status = ""
-        self.status_information = ""
-        # default state is soft, to be changed by to-be-written status_type check
-        self.status_type = ""
-        self.last_check = ""
-        self.duration = ""
-        self.attempt = ""
-        self.passiveonly = False
-        self.acknowledged = False
-        self.notifications_disabled = False
-        self.flapping = False
-        self.scheduled_downtime = False
-        self.visible = True
-        # Check_MK also has site info
-        self.site = ""
-        # server to be added to hash
-        self.server = ""
+    # fields and their defaults
+    FIELDS = (("name", ""),
+              ("status_information", ""),
+              # default state is soft, to be changed by to-be-written status_type check
+              ("status_type", ""),
+              ("last_check", ""),
+              ("duration", ""),
+              ("attempt", ""),
+              ("passiveonly", False),
+              ("acknowledged", False),
+              ("notifications_disabled", False),
+              ("flapping", False),
+              ("scheduled_downtime", False),
+              ("visible", True),
+              # Check_MK also has site info
+              ("site", ""),
+              # server to be added to hash
+              ("server", ""),
+              # Centreon
+              ("criticality", ""),
+              # Check_MK and Zabbix
+              ("address", ""),
+              ("command", ""),
+              # Zabbix
+              ("triggerid", ""),
+              # Opsview
+              ("service_object_id", ""))
+
+    __slots__ = tuple([f[0] for f in FIELDS]) + ("_status", "_hash")
+
+    def __init__(self, **kwds):
+        for field, default in self.FIELDS:
+            setattr(self, field, default)
+        self._status = ""
+        self._hash = None
+        # fields might be given directly when creating items
+        for k in kwds: setattr(self, k, kwds[k])
+
+
+    def _get_status(self):
+        return self._status
+
+
+    def _set_status(self, status):
+        self._status = intern_status(status)
+        # hash depends on status
+        self._hash = None
+
+
+    status = property(_get_status, _set_status)
 
 
     def is_passive_only(self):
@@ -201,10 +234,12 @@ class GenericHost(GenericObject):
         one host which is monitored by a Nagios server, gets populated with services
     """
 
-    def __init__(self):
-        GenericObject.__init__(self)
+    __slots__ = ("services",)
+
+    def __init__(self, **kwds):
         # take all the faulty services on host
         self.services = dict()
+        GenericObject.__init__(self, **kwds)
 
 
     def get_host_name(self):
@@ -220,9 +255,11 @@ class GenericHost(GenericObject):
 
     def get_hash(self):
         """
-        return hash for event history tracking
+        return hash for event history tracking - computed once as long as status does not change
         """
-        return " ".join((self.server, self.site, self.name, self.status))
+        if self._hash == None:
+            self._hash = " ".join((self.server, self.site, self.name, self.status))
+        return self._hash
 
 
 class GenericService(GenericObject):
@@ -230,8 +267,11 @@ class GenericService(GenericObject):
         one service which runs on a host
     """
 
-    def __init__(self):
-        GenericObject.__init__(self)
+    __slots__ = ("host",)
+
+    def __init__(self, **kwds):
+        self.host = ""
+        GenericObject.__init__(self, **kwds)
 
 
     def get_host_name(self):
@@ -251,9 +291,121 @@ class GenericService(GenericObject):
 
     def get_hash(self):
         """
-        return hash for event history tracking
+        return hash for event history tracking - computed once as long as status does not change
         """
-        return " ".join((self.server, self.site, self.host, self.name, self.status))
+        if self._hash == None:
+            self._hash = " ".join((self.server, self.site, self.host, self.name, self.status))
+        return self._hash
+
+
+def flag(value):
+    """
+    converter for flags delivered as 0/1 or "0"/"1"
+    """
+    return bool(int(value))
+
+
+def inverted_flag(value):
+    """
+    converter for flags like active_checks_enabled which mean the opposite of our passiveonly
+    """
+    return not bool(int(value))
+
+
+def one_line(value):
+    """
+    converter for plugin output - UTF-8 encoded and without line breaks
+    """
+    if isinstance(value, unicode):
+        value = value.encode("utf-8")
+    return value.replace("\n", " ").strip()
+
+
+def attempts(current, maximum):
+    """
+    converter for attempts given in two columns
+    """
+    return "%s/%s" % (current, maximum)
+
+
+def mapped(mapping):
+    """
+    gives back converter which maps values by dictionary mapping, unknown values stay as they are
+    """
+    return lambda value: mapping.get(value, value)
+
+
+class RowMapping(object):
+    """
+    declarative mapping of rows as delivered by monitors - dictionaries, lists or whatever get()
+    understands - to host or service objects, built in one pass without intermediate dictionaries
+    fields is a sequence of (field, source, converter) with source being the key of the value in
+    the row or a tuple of keys whose values are all given to converter, converter might be None
+    to take the value as it is
+    optional fields are the same but left at their defaults if the row does not contain them
+    """
+
+    def __init__(self, record_class, fields, optional=(), get=None):
+        self.record_class = record_class
+        self.fields = tuple(fields)
+        self.optional = tuple(optional)
+        if get != None:
+            self.get = get
+
+
+    @staticmethod
+    def get(row, source):
+        """
+        value of source in row, has to raise KeyError or IndexError if row does not contain it
+        """
+        return row[source]
+
+
+    def value(self, row, source, converter):
+        if type(source) == tuple:
+            values = [self.get(row, s) for s in source]
+            return converter(*values)
+        if converter == None:
+            return self.get(row, source)
+        return converter(self.get(row, source))
+
+
+    def indexed(self, columns):
+        """
+        gives back mapping for rows which are lists of values in order of columns, like tables with a
+        header row - positions of sources are looked up once instead of for every row
+        optional fields whose sources are not in columns are left out
+        """
+        index = dict((column, position) for position, column in enumerate(columns))
+
+        def position(source):
+            if type(source) == tuple:
+                return tuple([index[s] for s in source])
+            return index[source]
+
+        fields = [(field, position(source), converter) for field, source, converter in self.fields]
+        optional = list()
+        for field, source, converter in self.optional:
+            try:
+                optional.append((field, position(source), converter))
+            except KeyError:
+                pass
+        return RowMapping(self.record_class, fields, optional)
+
+
+    def build(self, row, **kwds):
+        """
+        create object from row - keywords are fields not contained in row, like server or status_type
+        """
+        item = self.record_class(**kwds)
+        for field, source, converter in self.fields:
+            setattr(item, field, self.value(row, source, converter))
+        for field, source, converter in self.optional:
+            try:
+                setattr(item, field, self.value(row, source, converter))
+            except (KeyError, IndexError):
+                pass
+        return item
 
 
 class Result(object):
@@ -262,7 +414,120 @@ class Result(object):
     """
     result = ""
     error = ""
+    # set by conditional FetchURL() if content did not change since last request
+    not_modified = False
 
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
         for k in kwds: self.__dict__[k] = kwds[k]
+
+
+class StatusStore(object):
+    """
+    status of all miserable hosts/services of one server, keyed by (server, host, service) with
+    service being "" for hosts
+    after every poll update() applies new, changed and recovered items in place and publishes
+    the freshly polled hosts dictionary as snapshot without copying it - the snapshot must not
+    be modified afterwards, the next poll brings a new one
+    """
+
+    # attributes which make an item count as changed if they differ from last poll
+    STATE_ATTRIBUTES = ("status", "status_type", "status_information", "acknowledged",
+                        "scheduled_downtime", "flapping", "passiveonly", "notifications_disabled",
+                        "visible")
+
+    def __init__(self, server=""):
+        self.server = server
+        # key -> GenericHost/GenericService of last poll
+        self.items = dict()
+        # hosts dictionary as used by GUI
+        self.snapshot = dict()
+        # change set of last update(), lists of keys
+        self.new = list()
+        self.changed = list()
+        self.recovered = list()
+
+
+    def get_state(self, item):
+        return tuple([getattr(item, a) for a in self.STATE_ATTRIBUTES])
+
+
+    def update(self, hosts):
+        """
+        apply freshly polled hosts dictionary and compute change set
+        """
+        current = dict()
+        for host in hosts.itervalues():
+            # UP hosts are only containers for their services
+            if host.status != "UP":
+                current[(self.server, host.name, "")] = host
+            for service in host.services.itervalues():
+                current[(self.server, host.name, service.name)] = service
+
+        self.new = list()
+        self.changed = list()
+        self.recovered = list()
+
+        for key, item in current.iteritems():
+            if not key in self.items:
+                self.new.append(key)
+            elif self.get_state(self.items[key]) != self.get_state(item):
+                self.changed.append(key)
+            self.items[key] = item
+
+        for key in self.items.keys():
+            if not key in current:
+                self.recovered.append(key)
+                del self.items[key]
+
+        # just swap reference - no deepcopy anymore
+        self.snapshot = hosts
+
+
+class EventComparison(object):
+    """
+    compares events of consecutive refreshs in linear time - events are given as
+    dictionary with hashable key and status as value
+    after compare() the lists new, escalated and recovered contain the respective keys
+    """
+
+    # states ordered by severity, same as in GenericServer.States
+    STATES = ["UP", "UNKNOWN", "WARNING", "CRITICAL", "UNREACHABLE", "DOWN"]
+
+    def __init__(self, states=None):
+        if states == None:
+            states = self.STATES
+        # severity of every state for comparison without list.index()
+        self.rank = dict([(state, rank) for rank, state in enumerate(states)])
+        self.states = states
+        self.events = dict()
+        self.new = list()
+        self.escalated = list()
+        self.recovered = list()
+
+
+    def compare(self, events):
+        """
+        compare events with the ones of last call and keep them for the next one
+        """
+        self.new = list()
+        self.escalated = list()
+        for key, status in events.iteritems():
+            if not key in self.events:
+                self.new.append(key)
+            elif self.rank.get(status, 0) > self.rank.get(self.events[key], 0):
+                self.escalated.append(key)
+        self.recovered = [key for key in self.events if not key in events]
+        self.events = events
+
+
+    def get_worst_status(self):
+        """
+        worst status of new and escalated events, "UP" if there are none
+        """
+        worst = 0
+        for key in self.new + self.escalated:
+            rank = self.rank.get(self.events[key], 0)
+            if rank > worst:
+                worst = rank
+        return self.states[worst]
@@ -0,0 +1,144 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+import sys
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from Nagstamon.Objects import *
+from Nagstamon.Server.Generic import GenericServer
+
+
+class AggregatorServer(GenericServer):
+    """
+        status of all servers polled by a headless collector (nagstamon.py --collector)
+        monitor URL is the one of the collector like http://collector:8989
+        as the collector only publishes status it is read-only - no recheck, acknowledge or downtime
+        hosts of the same name on several collected servers stay apart - their site tells the server
+    """
+
+    TYPE = 'Nagstamon aggregator'
+
+    # collector only needs its URL
+    DISABLED_CONTROLS = ["label_monitor_cgi_url",
+                         "input_entry_monitor_cgi_url",
+                         "input_checkbutton_use_autologin",
+                         "label_autologin_key",
+                         "input_entry_autologin_key",
+                         "input_checkbutton_use_display_name_host",
+                         "input_checkbutton_use_display_name_service"]
+
+    # nothing to do on collected items
+    MENU_ACTIONS = []
+
+
+    def init_config(self):
+        """
+        URL of collector status
+        """
+        self.url_status = self.monitor_url.rstrip("/") + "/status.json"
+
+
+    def recheck_all(self):
+        """
+        rechecking is up to the collector
+        """
+        return True
+
+
+    def _get_status(self):
+        """
+        get status of all servers of collector - only fetched again if it changed since last poll
+        """
+        self.new_hosts = dict()
+
+        try:
+            result = self.FetchURL(self.url_status, giveback="raw", conditional=True)
+            if result.error != "":
+                return Result(result=result.result, error=result.error)
+            collected = json.loads(result.result)
+
+            errors = list()
+            for server_name, server in collected.get("servers", {}).items():
+                if server["error"] != "":
+                    errors.append("%s: %s" % (server_name, server["error"]))
+                server_name = server_name.encode("utf-8")
+                for host_name, h in server["hosts"].items():
+                    host_name = host_name.encode("utf-8")
+                    new_host = GenericHost()
+                    new_host.name = host_name
+                    new_host.server = self.name
+                    self._set_attributes(new_host, h)
+                    new_host.site = self._site(server_name, new_host.site)
+
+                    for service_name, s in h["services"].items():
+                        service_name = service_name.encode("utf-8")
+                        new_service = GenericService()
+                        new_service.host = host_name
+                        new_service.name = service_name
+                        new_service.server = self.name
+                        self._set_attributes(new_service, s)
+                        new_service.site = new_host.site
+                        new_host.services[service_name] = new_service
+
+                    self.new_hosts[self.get_host_key(new_host)] = new_host
+
+            # failures of collected servers are no failure of the collector but should not get lost
+            if len(errors) > 0 and str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), debug="Collector errors: " + "; ".join(errors))
+
+        except:
+            # set checking flag back to False
+            self.isChecking = False
+            result, error = self.Error(sys.exc_info())
+            return Result(result=result, error=error)
+
+        return Result()
+
+
+    def _site(self, server_name, site):
+        """
+        collected server as site, together with site of Check_MK servers
+        """
+        if site == "":
+            return server_name
+        return "%s/%s" % (server_name, site)
+
+
+    def get_host_key(self, item):
+        """
+        hosts are kept apart by collected server which is part of their site
+        """
+        return (item.site, item.get_host_name())
+
+
+    def _set_attributes(self, item, attributes):
+        """
+        copy collected attributes to host or service
+        """
+        for key, value in attributes.items():
+            # only known fields - host or service object might not have others
+            if key == "services" or not hasattr(item, key):
+                continue
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            setattr(item, str(key), value)
@@ -22,16 +22,39 @@ import socket
 import sys
 import re
 import copy
+import time
 
 from Nagstamon.Objects import *
 from Nagstamon.Server.Generic import GenericServer
 
+
+def tag_text(row, source):
+    """
+    text of child tag of XML row
+    """
+    tag = row.find(source)
+    if tag == None:
+        raise KeyError(source)
+    return str(tag.text)
+
+
+def attempt_of(text):
+    return text.split(" ")[0]
+
+
+def status_type_of(text):
+    return CentreonServer.HARD_SOFT[text.split(" ")[1]]
+
+
 class CentreonServer(GenericServer):
     TYPE = 'Centreon'
+
+    # own _set_recheck() instead of send_commands() - Actions.RecheckAll rechecks item by item
+    RECHECK_BY_COMMANDS = False
     # centreon generic web interface uses a sid which is needed to ask for news
     SID = None
-    # count for SID regeneration
-    SIDcount = 0
+    # time of last SID regeneration
+    SIDtime = 0
 
     # A Monitor CGI URL is not necessary so hide it in settings
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
@@ -54,6 +77,38 @@ class CentreonServer(GenericServer):
                     "INCONNU": "UNKNOWN",
                     "ALERTE": "WARNING"}
 
+    HOST_ROWS = RowMapping(GenericHost, (("name", "hn", None),
+                                         # disgusting workaround for https://github.com/HenriWahl/Nagstamon/issues/91
+                                         ("status", "cs", mapped(TRANSLATIONS)),
+                                         ("attempt", "tr", attempt_of),
+                                         ("status_type", "tr", status_type_of),
+                                         ("last_check", "lc", None),
+                                         ("duration", "lsc", None),
+                                         ("status_information", "ou", None),
+                                         ("acknowledged", "ha", flag),
+                                         ("scheduled_downtime", "hdtm", flag),
+                                         ("notifications_disabled", "ne", inverted_flag),
+                                         ("passiveonly", "ace", inverted_flag)),
+                           optional=(("criticality", "cih", None),
+                                     ("flapping", "is", flag)),
+                           get=tag_text)
+
+    SERVICE_ROWS = RowMapping(GenericService, (("host", "hn", None),
+                                               ("name", "sd", None),
+                                               ("status", "cs", mapped(TRANSLATIONS)),
+                                               ("attempt", "ca", attempt_of),
+                                               ("status_type", "ca", status_type_of),
+                                               ("last_check", "lc", None),
+                                               ("duration", "d", None),
+                                               ("status_information", "po", one_line),
+                                               ("acknowledged", "pa", flag),
+                                               ("scheduled_downtime", "dtm", flag),
+                                               ("flapping", "is", flag),
+                                               ("notifications_disabled", "ne", inverted_flag),
+                                               ("passiveonly", "ac", inverted_flag)),
+                              optional=(("criticality", "cih", None),),
+                              get=tag_text)
+
 
     def __init__(self, **kwds):
         # add all keywords to object, every mode searchs inside for its favorite arguments/keywords
@@ -81,7 +136,7 @@ class CentreonServer(GenericServer):
         """
         self.HTTPheaders = {}
         self.SID = None
-        self.SIDcount = 0
+        self.SIDtime = time.time()
         self._get_sid()
 
 
@@ -221,7 +276,42 @@ class CentreonServer(GenericServer):
         del result, error
 
 
+    def _remember_ids(self, host, service, row):
+        """
+        store IDs of host or service found in status XML row so actions do not need to scrape them
+        from HTML - not every Centreon version delivers them
+        """
+        try:
+            if service == "":
+                ids = tag_text(row, "hid")
+            else:
+                ids = (tag_text(row, "hid"), tag_text(row, "svc_id"))
+        except KeyError:
+            return
+        self.metadata_cache[("ids", host, service)] = (time.time(), ids)
+
+
     def _get_host_id(self, host):
+        """
+        get host_id - known from status XML or parsed from HTML, failures are not cached
+        """
+        host_id = self.cached(("ids", host, ""), lambda: self._scrape_host_id(host))
+        if host_id == "":
+            del self.metadata_cache[("ids", host, "")]
+        return host_id
+
+
+    def _get_host_and_service_id(self, host, service):
+        """
+        get host and service id - known from status XML or parsed from HTML, failures are not cached
+        """
+        ids = self.cached(("ids", host, service), lambda: tuple(self._scrape_host_and_service_id(host, service)))
+        if len(ids) != 2 or "" in ids:
+            del self.metadata_cache[("ids", host, service)]
+        return ids
+
+
+    def _scrape_host_id(self, host):
         """
         get host_id via parsing raw html
         """
@@ -252,7 +342,7 @@ class CentreonServer(GenericServer):
             return ""
 
 
-    def _get_host_and_service_id(self, host, service):
+    def _scrape_host_and_service_id(self, host, service):
         """
         parse a ton of html to get a host and a service id...
         """
@@ -327,30 +417,8 @@ class CentreonServer(GenericServer):
                 try:
                     # host objects contain service objects
                     if not self.new_hosts.has_key(str(l.hn.text)):
-                        self.new_hosts[str(l.hn.text)] = GenericHost()
-                        self.new_hosts[str(l.hn.text)].name =  str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].server = self.name
-                        self.new_hosts[str(l.hn.text)].status = str(l.cs.text)
-                        # disgusting workaround for https://github.com/HenriWahl/Nagstamon/issues/91
-                        if self.new_hosts[str(l.hn.text)].status in self.TRANSLATIONS:
-                            self.new_hosts[str(l.hn.text)].status = self.TRANSLATIONS[self.new_hosts[str(l.hn.text)].status]
-                        self.new_hosts[str(l.hn.text)].attempt, self.new_hosts[str(l.hn.text)].status_type  = str(l.tr.text).split(" ")
-                        self.new_hosts[str(l.hn.text)].status_type = self.HARD_SOFT[self.new_hosts[str(l.hn.text)].status_type]
-                        self.new_hosts[str(l.hn.text)].last_check = str(l.lc.text)
-                        self.new_hosts[str(l.hn.text)].duration = str(l.lsc.text)
-                        self.new_hosts[str(l.hn.text)].status_information= str(l.ou.text)
-                        if l.find("cih") != None:
-                            self.new_hosts[str(l.hn.text)].criticality = str(l.cih.text)
-                        else:
-                            self.new_hosts[str(l.hn.text)].criticality = ""
-                        self.new_hosts[str(l.hn.text)].acknowledged = bool(int(str(l.ha.text)))
-                        self.new_hosts[str(l.hn.text)].scheduled_downtime = bool(int(str(l.hdtm.text)))
-                        if l.find("is") != None:
-                            self.new_hosts[str(l.hn.text)].flapping = bool(int(str(l.find("is").text)))
-                        else:
-                            self.new_hosts[str(l.hn.text)].flapping = False
-                        self.new_hosts[str(l.hn.text)].notifications_disabled = not bool(int(str(l.ne.text)))
-                        self.new_hosts[str(l.hn.text)].passiveonly = not bool(int(str(l.ace.text)))
+                        self.new_hosts[str(l.hn.text)] = self.HOST_ROWS.build(l, server=self.name)
+                        self._remember_ids(str(l.hn.text), "", l)
                 except:
                     # set checking flag back to False
                     self.isChecking = False
@@ -406,44 +474,19 @@ class CentreonServer(GenericServer):
                 try:
                     # host objects contain service objects
                     if not self.new_hosts.has_key(str(l.hn.text)):
-                        self.new_hosts[str(l.hn.text)] = GenericHost()
-                        self.new_hosts[str(l.hn.text)].name = str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].status = "UP"
+                        self.new_hosts[str(l.hn.text)] = GenericHost(name=str(l.hn.text), status="UP")
                     # if a service does not exist create its object
                     if not self.new_hosts[str(l.hn.text)].services.has_key(str(l.sd.text)):
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)] = GenericService()
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].host = str(l.hn.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].name = str(l.sd.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].server = self.name
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status = str(l.cs.text)
+                        new_service = self.SERVICE_ROWS.build(l, server=self.name)
                         # //----- META SERVICES -----
                         # if it is a meta-service, add the "sdl" fild in parenthesis after the service name. ( used in _set_acknowledge() and _set_recheck() ) :
-                        if self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].host == '_Module_Meta':
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].name = '{} ({})'.format(
-                                                                                                                    self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].name,
-                                                                                                                    l.sdl.text
-                            )
+                        if new_service.host == '_Module_Meta':
+                            new_service.name = '{} ({})'.format(new_service.name, l.sdl.text)
                         # ----- META SERVICES -----//
-                        # disgusting workaround for https://github.com/HenriWahl/Nagstamon/issues/91
-                        if self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status in self.TRANSLATIONS:
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status = self.TRANSLATIONS[\
-                                self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status]
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].attempt, \
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type = str(l.ca.text).split(" ")
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type =\
-                            self.HARD_SOFT[self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_type]
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].last_check = str(l.lc.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].duration = str(l.d.text)
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].status_information = str(l.po.text).replace("\n", " ").strip()
-                        if l.find("cih") != None:
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = str(l.cih.text)
-                        else:
-                            self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].criticality = ""
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].acknowledged = bool(int(str(l.pa.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].scheduled_downtime = bool(int(str(l.dtm.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].flapping = bool(int(str(l.find("is").text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].notifications_disabled = not bool(int(str(l.ne.text)))
-                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)].passiveonly = not bool(int(str(l.ac.text)))
+                        self.new_hosts[str(l.hn.text)].services[str(l.sd.text)] = new_service
+                        # service rows know the ID of their host too
+                        self._remember_ids(new_service.host, "", l)
+                        self._remember_ids(new_service.host, new_service.name, l)
                 except:
                     # set checking flag back to False
                     self.isChecking = False
@@ -522,7 +565,7 @@ class CentreonServer(GenericServer):
         """
         host and service ids are needed to tell Centreon what whe want
         """
-        # yes this procedure IS resource waste... suggestions welcome!
+        # ids mostly come from the cache filled by _get_status() so only one request is needed
         try:
         # decision about host or service - they have different URLs
             if host == '_Module_Meta':
@@ -608,12 +651,12 @@ class CentreonServer(GenericServer):
         """
         # renewing the SID once an hour might be enough
         # maybe this is unnecessary now that we authenticate via login/password, no md5
-        if self.SIDcount >= 3600:
+        if self.SIDtime == 0:
+            self.SIDtime = time.time()
+        elif time.time() - self.SIDtime >= 3600:
             if str(self.conf.debug_mode) == "True":
                 self.Debug(server=self.get_name(), debug="Old SID: " + self.SID + " " + str(self.Cookie))
             self.SID = self._get_sid().result
             if str(self.conf.debug_mode) == "True":
                 self.Debug(server=self.get_name(), debug="New SID: " + self.SID + " " + str(self.Cookie))
-            self.SIDcount = 0
-        else:
-            self.SIDcount += 1
+            self.SIDtime = time.time()
@@ -28,24 +28,66 @@ import time
 import traceback
 import base64
 import re
+try:
+    import json
+except ImportError:
+    import simplejson as json
+import Queue
+import os
+import platform
+import tempfile
+import codecs
 import gobject
 # necessary for Python-2.7.9-ssl-support-fix https://github.com/HenriWahl/Nagstamon/issues/126
 if sys.version_info >= (2, 7, 9):
     import ssl
 
-# to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
-# see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
-try:
-    from BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
-except:
-    from Nagstamon.thirdparty.BeautifulSoup import BeautifulSoup,\
-                                                   BeautifulStoneSoup
-from Nagstamon.Actions import HostIsFilteredOutByRE,\
-                              ServiceIsFilteredOutByRE,\
-                              StatusInformationIsFilteredOutByRE,\
-                              CriticalityIsFilteredOutByRE,\
+from Nagstamon.Actions import CommandWorker,\
+                              CompileFilter,\
                               not_empty
 from Nagstamon.Objects import *
+from Nagstamon.KeepAlive import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+from Nagstamon.Server.StatusCGI import StatusCGIParser, first_text, first_stripped, first_line, first_duration
+
+
+def import_soup():
+    """
+    BeautifulSoup is only needed by monitors which still parse objectified HTML or XML so it gets
+    imported at first use and not at startup
+    to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
+    see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
+    """
+    try:
+        from BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
+    except:
+        from Nagstamon.thirdparty.BeautifulSoup import BeautifulSoup,\
+                                                       BeautifulStoneSoup
+    return BeautifulSoup, BeautifulStoneSoup
+
+
+def load_json(stream, encoding="utf-8"):
+    """
+    JSON from file-like stream with undecodable bytes replaced - json.load() decodes strictly so a
+    single plugin output in another encoding would make the whole status unreadable
+    control characters like \n in plugin output are allowed by strict=False
+    """
+    return json.load(codecs.getreader(encoding)(stream, errors="replace"), strict=False)
+
+
+def replace_objects(fields, objects):
+    """
+    fields of a single object cmd.cgi command with its host and service fields replaced by objects,
+    a list of field pairs for monitors which accept several objects per command
+    """
+    replaced = list()
+    for key, value in fields:
+        if key in ("host", "service"):
+            if objects != None:
+                replaced.extend(objects)
+                objects = None
+        else:
+            replaced.append((key, value))
+    return replaced
 
 
 class GenericServer(object):
@@ -56,6 +98,10 @@ class GenericServer(object):
 
     TYPE = 'Generic'
 
+    # rechecks are sent by send_commands() so Actions.RecheckAll hands them over in batches - monitors
+    # with their own _set_recheck() set it to False and get rechecked item by item
+    RECHECK_BY_COMMANDS = True
+
     # GUI sortable columns stuff
     HOST_COLUMN_ID = 0
     SERVICE_COLUMN_ID = 1
@@ -88,6 +134,28 @@ class GenericServer(object):
                        "downtime.gif" : "scheduled_downtime",\
                        "flapping.gif" : "flapping"}
 
+    # columns of status.cgi tables - hosts without attempts in Nagios, with attempts in Icinga
+    CGI_HOST_ROWS = RowMapping(GenericHost, (("name", 0, first_text),
+                                             ("status", 1, first_text),
+                                             ("last_check", 2, first_text),
+                                             ("duration", 3, first_duration),
+                                             ("status_information", 4, first_line)))
+
+    CGI_HOST_ROWS_WITH_ATTEMPT = RowMapping(GenericHost, (("name", 0, first_text),
+                                                          ("status", 1, first_text),
+                                                          ("last_check", 2, first_text),
+                                                          ("duration", 3, first_duration),
+                                                          ("attempt", 4, first_stripped),
+                                                          ("status_information", 5, first_line)))
+
+    CGI_SERVICE_ROWS = RowMapping(GenericService, (("host", 0, first_text),
+                                                   ("name", 1, first_text),
+                                                   ("status", 2, first_text),
+                                                   ("last_check", 3, first_text),
+                                                   ("duration", 4, first_duration),
+                                                   ("attempt", 5, first_stripped),
+                                                   ("status_information", 6, first_text)))
+
     # Entries for monitor default actions in context menu
     MENU_ACTIONS = ["Monitor", "Recheck", "Acknowledge", "Submit check result", "Downtime"]
 
@@ -111,12 +179,14 @@ class GenericServer(object):
         self.proxy_password = ""
         self.hosts = dict()
         self.new_hosts = dict()
-        self.thread = None
+        # Actions.RefreshScheduler which refreshs this server
+        self.scheduler = None
         self.isChecking = False
         self.CheckingForNewVersion = False
         self.WorstStatus = "UP"
         self.States = ["UP", "UNKNOWN", "WARNING", "CRITICAL", "UNREACHABLE", "DOWN"]
-        self.nagitems_filtered_list = list()
+        # filtered items of last poll for deciding about notification
+        self.event_comparison = EventComparison(states=self.States)
         self.nagitems_filtered = {"services":{"CRITICAL":[], "WARNING":[], "UNKNOWN":[]}, "hosts":{"DOWN":[], "UNREACHABLE":[]}}
         self.downs = 0
         self.unreachables = 0
@@ -125,8 +195,6 @@ class GenericServer(object):
         self.warnings = 0
         self.status = ""
         self.status_description = ""
-        # needed for looping server thread
-        self.count = 0
         # needed for RecheckAll - save start_time once for not having to get it for every recheck
         self.start_time = None
         self.Cookie = cookielib.CookieJar()
@@ -137,14 +205,17 @@ class GenericServer(object):
         self.proxy_handler = None
         self.proxy_auth_handler = None
         self.urlopener = None
+        # keep-alive connections to monitor are reused by all requests of this server
+        self.connection_pool = ConnectionPool(size=self.conf.connection_pool_size)
+        self.http_handler = KeepAliveHTTPHandler(self.connection_pool)
         # necessary for Python-2.7.9-ssl-support-fix https://github.com/HenriWahl/Nagstamon/issues/126
         if sys.version_info >= (2, 7, 9):
             try:
-                self.https_handler = urllib2.HTTPSHandler(context=ssl._create_unverified_context())
+                self.https_handler = KeepAliveHTTPSHandler(self.connection_pool, context=ssl._create_unverified_context())
             except:
-                self.https_handler = urllib2.HTTPSHandler()
+                self.https_handler = KeepAliveHTTPSHandler(self.connection_pool)
         else:
-            self.https_handler = urllib2.HTTPSHandler()
+            self.https_handler = KeepAliveHTTPSHandler(self.connection_pool)
 
         # headers for HTTP requests, might be needed for authorization on Nagios/Icinga Hosts
         self.HTTPheaders = dict()
@@ -153,10 +224,31 @@ class GenericServer(object):
         self.TreeViewColumns = list()
         self.ListStore = None
         self.ListStoreColumns = list()
+        # (host, service) -> (TreeIter, row values) of ListStore rows for updating only changed ones
+        self.ListStoreIndex = dict()
         # flag which decides if authentication has to be renewed
         self.refresh_authentication = False
         # to handle Icinga versions this information is necessary, might be of future use for others too
         self.version = ""
+        # filter settings compiled by Actions.CompileFilter(), rebuilt if config changes
+        self.compiled_filter = None
+        # status of last poll, self.hosts is its snapshot
+        self.status_store = StatusStore(server=self.name)
+        # validators and content of last responses for conditional requests, keyed by URL
+        self.validators = dict()
+        # delta polling - number of delta polls since last full one and local time of last poll
+        self.delta_polls = 0
+        self.last_poll_time = 0
+        # a full poll is needed at start, after errors and after own actions like acknowledging
+        self.full_poll_needed = True
+        # rarely changing metadata as (fetch time, value), keyed by name - see cached()
+        self.metadata_cache = dict()
+        # freshness of events as saved in status cache at last run, taken over by GUI at start
+        self.cached_events_history = dict()
+        # status cache gets written after first poll and whenever status changed
+        self.status_cache_saved = False
+        # time of status loaded from status cache as long as no poll succeeded, otherwise None
+        self.stale_since = None
 
         # Special FX
         # Centreon
@@ -207,6 +299,8 @@ class GenericServer(object):
         if authentication fails try to reset any HTTP session stuff - might be different for different monitors
         """
         self.HTTPheaders = dict()
+        self.connection_pool.clear()
+        self.validators = dict()
 
 
     def get_name(self):
@@ -238,6 +332,16 @@ class GenericServer(object):
             yield str(column_class(row))
 
 
+    @classmethod
+    def get_sort_keys(cls, row):
+        """ Gets integer sort keys of columns with customized sorting, 0 for the others """
+        for column_class in cls.COLUMNS:
+            if column_class.has_customized_sorting():
+                yield column_class.sort_key(column_class(row).value)
+            else:
+                yield 0
+
+
     def get_server_version(self):
         """
         dummy function, at the moment only used by Icinga
@@ -246,7 +350,18 @@ class GenericServer(object):
 
 
     def set_recheck(self, thread_obj):
-        self._set_recheck(thread_obj.host, thread_obj.service)
+        """
+        gives back Results of sent commands as given by send_commands() or None if the monitor does not tell
+        """
+        return self._set_recheck(thread_obj.host, thread_obj.service)
+
+
+    def recheck_all(self):
+        """
+        monitors which can recheck all problems with one request do it here and give back True,
+        otherwise Actions.RecheckAll rechecks every host and service on its own
+        """
+        return False
 
 
     def _set_recheck(self, host, service):
@@ -254,26 +369,7 @@ class GenericServer(object):
             if self.hosts[host].services[service].is_passive_only():
                 # Do not check passive only checks
                 return
-        # get start time from Nagios as HTML to use same timezone setting like the locally installed Nagios
-        result = self.FetchURL(self.monitor_cgi_url + "/cmd.cgi?" + urllib.urlencode({"cmd_typ":"96", "host":host}))
-        self.start_time = dict(result.result.find(attrs={"name":"start_time"}).attrs)["value"]
-        # decision about host or service - they have different URLs
-        if service == "":
-            # host
-            cmd_typ = "96"
-        else:
-            # service @ host
-            cmd_typ = "7"
-        # ignore empty service in case of rechecking a host
-        cgi_data = urllib.urlencode([("cmd_typ", cmd_typ),\
-                                     ("cmd_mod", "2"),\
-                                     ("host", host),\
-                                     ("service", service),\
-                                     ("start_time", self.start_time),\
-                                     ("force_check", "on"),\
-                                     ("btnSubmit", "Commit")])
-        # execute POST request
-        self.FetchURL(self.monitor_cgi_url + "/cmd.cgi", giveback="raw", cgi_data=cgi_data)
+        return self.send_commands([("recheck", host, service, {})])
 
 
     def set_acknowledge(self, thread_obj):
@@ -281,129 +377,190 @@ class GenericServer(object):
             all_services = thread_obj.all_services
         else:
             all_services = []
-        self._set_acknowledge(thread_obj.host, thread_obj.service, thread_obj.author, thread_obj.comment,\
-                              thread_obj.sticky, thread_obj.notify, thread_obj.persistent, all_services)
+        results = self._set_acknowledge(thread_obj.host, thread_obj.service, thread_obj.author, thread_obj.comment,\
+                                        thread_obj.sticky, thread_obj.notify, thread_obj.persistent, all_services)
+        # delta polls would not see acknowledgement
+        self.full_poll_needed = True
         # resfresh immediately according to https://github.com/HenriWahl/Nagstamon/issues/86
-        self.thread.doRefresh = True
+        self.scheduler.Trigger(self)
+        return results
 
 
     def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services=[]):
-        url = self.monitor_cgi_url + "/cmd.cgi"
-
-        # decision about host or service - they have different URLs
-        # do not care about the doube %s (%s%s) - its ok, "flags" cares about the necessary "&"
-        if service == "":
-            # host
-            # according to sf.net bug #3304098 (https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3304098&group_id=236865)
-            # the send_notification-flag must not exist if it is set to "off", otherwise
-            # the Nagios core interpretes it as set, regardless its real value
-            if notify == True:
-                send_notification = "&send_notification=on"
-            else:
-                send_notification = ""
-            # dito for persistence...
-            if persistent == True:
-                persistent_comment = "&persistent=on"
-            else:
-                persistent_comment = ""
-            # ...and sticky acks too?
-            if sticky == True:
-                sticky_ack = "&sticky_ack=on"
-            else:
-                sticky_ack = ""
-            cgi_data = urllib.urlencode([("cmd_typ","33"), ("cmd_mod","2"), ("host",host), ("com_author",author),\
-                                         ("com_data",comment), ("btnSubmit","Commit")])\
-                                         + send_notification + persistent_comment + sticky_ack
-            self.FetchURL(url, giveback="raw", cgi_data=cgi_data)
-
-        # if host is acknowledged and all services should be to or if a service is acknowledged
-        # (and all other on this host too)
-        if service != "":
-            # service @ host
-            # the same applies here as with the host and send_notification
-            if notify == True:
-                send_notification = "&send_notification=on"
-            else:
-                send_notification = ""
-            # dito for persistence...
-            if persistent == True:
-                persistent_comment = "&persistent=on"
-            else:
-                persistent_comment = ""
-            # ...and sticky acks too?
-            if sticky == True:
-                sticky_ack = "&sticky_ack=on"
-            else:
-                sticky_ack = ""
-            # for whatever silly reason Icinga depends on the correct order of submitted form items...
-            # see sf.net bug 3428844
-            # so whe cannot use a dictionary with urllib but a tuple full of tuples
-            cgi_data = urllib.urlencode([("cmd_typ","34"), ("cmd_mod","2"), ("host",host), ("service",service),\
-                                         ("com_author",author), ("com_data",comment), ("btnSubmit","Commit")])\
-                                         + send_notification + persistent_comment + sticky_ack
-            # running remote cgi command
-            self.FetchURL(url, giveback="raw", cgi_data=cgi_data)
-
-        # acknowledge all services on a host
-        if len(all_services) > 0:
-            for s in all_services:
-                # services @ host
-                # the same applies here as with the host and send_notification
-                if notify == True:
-                    send_notification = "&send_notification=on"
-                else:
-                    send_notification = ""
-                # dito for persistence...
-                if persistent == True:
-                    persistent_comment = "&persistent=on"
-                else:
-                    persistent_comment = ""
-                # ...and sticky acks too?
-                if sticky == True:
-                    sticky_ack = "&sticky_ack=on"
-                else:
-                    sticky_ack = ""
-                    cgi_data = urllib.urlencode([("cmd_typ","34"), ("cmd_mod","2"), ("host",host), ("service",s),\
-                                                 ("com_author",author), ("com_data",comment), ("btnSubmit","Commit")])\
-                                                 + send_notification + persistent_comment + sticky_ack
-                    #running remote cgi command
-                    self.FetchURL(url, giveback="raw", cgi_data=cgi_data)
+        params = {"author":author, "comment":comment, "sticky":sticky, "notify":notify, "persistent":persistent}
+        # host or service and if wanted all other services on this host too - all in one batch
+        commands = [("acknowledge", host, service, params)]
+        for s in all_services:
+            commands.append(("acknowledge", host, s, params))
+        return self.send_commands(commands)
 
 
     def set_downtime(self, thread_obj):
-        self._set_downtime(thread_obj.host, thread_obj.service, thread_obj.author, thread_obj.comment, thread_obj.fixed,
-                           thread_obj.start_time, thread_obj.end_time, thread_obj.hours, thread_obj.minutes)
+        results = self._set_downtime(thread_obj.host, thread_obj.service, thread_obj.author, thread_obj.comment, thread_obj.fixed,
+                                     thread_obj.start_time, thread_obj.end_time, thread_obj.hours, thread_obj.minutes)
+        # delta polls would not see downtime
+        self.full_poll_needed = True
         # resfresh immediately according to https://github.com/HenriWahl/Nagstamon/issues/86
-        self.thread.doRefresh = True
+        self.scheduler.Trigger(self)
+        return results
 
 
     def _set_downtime(self, host, service, author, comment, fixed, start_time, end_time, hours, minutes):
-        # decision about host or service - they have different URLs
-        if service == "":
-            # host
-            cmd_typ = "55"
-        else:
-            # service @ host
-            cmd_typ = "56"
-
-        # for some reason Icinga is very fastidiuos about the order of CGI arguments, so please
-        # here we go... it took DAYS :-(
-        cgi_data = urllib.urlencode([("cmd_typ", cmd_typ),\
-                                     ("cmd_mod", "2"),\
-                                     ("trigger", "0"),\
-                                     ("childoptions", "0"),\
-                                     ("host", host),\
-                                     ("service", service),\
-                                     ("com_author", author),\
-                                     ("com_data", comment),\
-                                     ("fixed", fixed),\
-                                     ("start_time", start_time),\
-                                     ("end_time", end_time),\
-                                     ("hours", hours),\
-                                     ("minutes", minutes),\
-                                     ("btnSubmit","Commit")])
+        params = {"author":author, "comment":comment, "fixed":fixed, "start_time":start_time,\
+                  "end_time":end_time, "hours":hours, "minutes":minutes}
+        return self.send_commands([("downtime", host, service, params)])
+
+
+    def send_commands(self, commands):
+        """
+        send list of (command, host, service, params) tuples - commands with same parameters
+        are grouped to one batch for _send_command_batch()
+        gives back dictionary of Results keyed by (command, host, service)
+        """
+        batches = list()
+        batch_index = dict()
+        for command, host, service, params in commands:
+            key = (command, tuple(sorted(params.items())))
+            if not key in batch_index:
+                batch_index[key] = len(batches)
+                batches.append((command, params, list()))
+            batches[batch_index[key]][2].append((host, service))
+
+        results = dict()
+        for command, params, items in batches:
+            results.update(self._send_command_batch(command, params, items))
+
+        # report every failed item
+        for (command, host, service), result in results.items():
+            if result.error != "" and str(self.conf.debug_mode) == "True":
+                self.Debug(server=self.get_name(), host=host, service=service,\
+                           debug="Command %s failed: %s" % (command, result.error))
+        return results
+
+
+    def _send_command_batch(self, command, params, items):
+        """
+        send one command for list of (host, service) items - Nagios cmd.cgi knows only one object per
+        request so every item gets its own one, monitors with multi-object commands override this
+        """
+        self._prepare_command_batch(command, items)
+        return self._send_command_items(command, params, items)
+
+
+    def _send_command_items(self, command, params, items):
+        """
+        send every item of batch with its own request, in parallel by at most connection_pool_size
+        workers reusing keep-alive connections
+        """
+        queue = Queue.Queue()
+        for item in items:
+            queue.put(item)
+        results = dict()
+        workers = list()
+        for i in range(max(1, min(int(self.conf.connection_pool_size), len(items)))):
+            worker = CommandWorker(server=self, command=command, params=params, queue=queue, results=results)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        return results
+
+
+    def _prepare_command_batch(self, command, items):
+        """
+        called once before sending a batch
+        """
+        if command == "recheck":
+            # get start time from Nagios as HTML to use same timezone setting like the locally installed Nagios
+            result = self.FetchURL(self.monitor_cgi_url + "/cmd.cgi?" + urllib.urlencode({"cmd_typ":"96", "host":items[0][0]}))
+            self.start_time = dict(result.result.find(attrs={"name":"start_time"}).attrs)["value"]
+
+
+    def _send_command(self, command, host, service, params):
+        """
+        send one command for host or service @ host via cmd.cgi, gives back Result
+        """
+        fields = self._command_fields(command, host, service, params)
+        if fields == None:
+            return Result(result="ERROR", error="Unknown command %s" % (command))
         # running remote cgi command
-        self.FetchURL(self.monitor_cgi_url + "/cmd.cgi", giveback="raw", cgi_data=cgi_data)
+        return self.FetchURL(self.monitor_cgi_url + "/cmd.cgi", giveback="raw", cgi_data=urllib.urlencode(fields))
+
+
+    def _command_fields(self, command, host, service, params):
+        """
+        cmd.cgi form fields of command as list of pairs, None for unknown commands
+        """
+        if command == "recheck":
+            # decision about host or service - they have different URLs
+            if service == "":
+                # host
+                cmd_typ = "96"
+            else:
+                # service @ host
+                cmd_typ = "7"
+            # ignore empty service in case of rechecking a host
+            return [("cmd_typ", cmd_typ),\
+                    ("cmd_mod", "2"),\
+                    ("host", host),\
+                    ("service", service),\
+                    ("start_time", self.start_time),\
+                    ("force_check", "on"),\
+                    ("btnSubmit", "Commit")]
+
+        elif command == "acknowledge":
+            # according to sf.net bug #3304098 (https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3304098&group_id=236865)
+            # the send_notification-flag must not exist if it is set to "off", otherwise
+            # the Nagios core interpretes it as set, regardless its real value
+            flags = []
+            if params["notify"] == True:
+                flags.append(("send_notification", "on"))
+            # dito for persistence...
+            if params["persistent"] == True:
+                flags.append(("persistent", "on"))
+            # ...and sticky acks too
+            if params["sticky"] == True:
+                flags.append(("sticky_ack", "on"))
+            # for whatever silly reason Icinga depends on the correct order of submitted form items...
+            # see sf.net bug 3428844
+            # so whe cannot use a dictionary with urllib but a tuple full of tuples
+            if service == "":
+                # host
+                return [("cmd_typ","33"), ("cmd_mod","2"), ("host",host),\
+                        ("com_author",params["author"]), ("com_data",params["comment"]),\
+                        ("btnSubmit","Commit")] + flags
+            else:
+                # service @ host
+                return [("cmd_typ","34"), ("cmd_mod","2"), ("host",host), ("service",service),\
+                        ("com_author",params["author"]), ("com_data",params["comment"]),\
+                        ("btnSubmit","Commit")] + flags
+
+        elif command == "downtime":
+            # decision about host or service - they have different URLs
+            if service == "":
+                # host
+                cmd_typ = "55"
+            else:
+                # service @ host
+                cmd_typ = "56"
+            # for some reason Icinga is very fastidiuos about the order of CGI arguments, so please
+            # here we go... it took DAYS :-(
+            return [("cmd_typ", cmd_typ),\
+                    ("cmd_mod", "2"),\
+                    ("trigger", "0"),\
+                    ("childoptions", "0"),\
+                    ("host", host),\
+                    ("service", service),\
+                    ("com_author", params["author"]),\
+                    ("com_data", params["comment"]),\
+                    ("fixed", params["fixed"]),\
+                    ("start_time", params["start_time"]),\
+                    ("end_time", params["end_time"]),\
+                    ("hours", params["hours"]),\
+                    ("minutes", params["minutes"]),\
+                    ("btnSubmit","Commit")]
+
+        return None
 
 
     def set_submit_check_result(self, thread_obj):
@@ -455,11 +612,6 @@ class GenericServer(object):
         """
         Get status from Nagios Server
         """
-        # create Nagios items dictionary with to lists for services and hosts
-        # every list will contain a dictionary for every failed service/host
-        # this dictionary is only temporarily
-        nagitems = {"services":[], "hosts":[]}
-
         # new_hosts dictionary
         self.new_hosts = dict()
 
@@ -467,122 +619,40 @@ class GenericServer(object):
         # unfortunately the hosts status page has a different structure so
         # hosts must be analyzed separately
         try:
+            # the resulting table of Nagios status.cgi table omits the hostname if it is the same as
+            # in the row before so it has to be remembered
+            last_host = ""
             for status_type in "hard", "soft":
-                result = self.FetchURL(self.cgiurl_hosts[status_type])
-                htobj, error = result.result, result.error
-
-                if error != "": return Result(result=copy.deepcopy(htobj), error=copy.deepcopy(error))
-
-                # put a copy of a part of htobj into table to be able to delete htobj
-                # too mnuch copy.deepcopy()s here give recursion crashs
-                table = htobj('table', {'class': 'status'})[0]
-
-                # access table rows
-                # some Icinga versions have a <tbody> tag in cgi output HTML which
-                # omits the <tr> tags being found
-                if len(table('tbody')) == 0:
-                    trs = table('tr', recursive=False)
-                else:
-                    tbody = table('tbody')[0]
-                    trs = tbody('tr', recursive=False)
-
-                # do some cleanup
-                del result, error
+                result = self.FetchURL(self.cgiurl_hosts[status_type], giveback="stream")
+                if result.error != "": return Result(result=result.result, error=result.error)
 
-                # kick out table heads
-                trs.pop(0)
-
-                # dummy tds to be deleteable
-                tds = []
-
-                for tr in trs:
+                # rows of status table are parsed while reading from server, table heads are already kicked out
+                for tds in StatusCGIParser().parse(result.result):
                     try:
                         # ignore empty <tr> rows
-                        if len(tr('td', recursive=False)) > 1:
-                            n = dict()
-                            # get tds in one tr
-                            tds = tr('td', recursive=False)
-                            # host
-                            try:
-                                n["host"] = str(tds[0].table.tr.td.table.tr.td.a.string)
-                            except:
-                                n["host"] = str(nagitems[len(nagitems)-1]["host"])
-                            # status
-                            n["status"] = str(tds[1].string)
-                            # last_check
-                            n["last_check"] = str(tds[2].string)
-                            # duration
-                            n["duration"] = str(tds[3].string)
-                            for entity in n["duration"].split():
-                                if int(entity[:-1]) > 0:
-                                    n["duration"] = entity
-                                    break
+                        if len(tds) > 1:
                             # division between Nagios and Icinga in real life... where
                             # Nagios has only 5 columns there are 7 in Icinga 1.3...
                             # ... and 6 in Icinga 1.2 :-)
                             if len(tds) < 7:
-                                # the old Nagios table
-                                # status_information
-                                if len(tds[4](text=not_empty)) == 0:
-                                    n["status_information"] = ""
-                                else:
-                                    n["status_information"] = str(tds[4].string).encode("utf-8").replace("\n", " ").strip()
                                 # attempts are not shown in case of hosts so it defaults to "N/A"
-                                n["attempt"] = "N/A"
+                                new_host = self.CGI_HOST_ROWS.build(tds, server=self.name, status_type=status_type, attempt="N/A")
                             else:
-                                # attempts are shown for hosts
-                                # to fix http://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3280961&group_id=236865 .attempt needs
-                                # to be stripped
-                                n["attempt"] = str(tds[4].string).strip()
-                                # status_information
-                                if len(tds[5](text=not_empty)) == 0:
-                                    n["status_information"] = ""
-                                else:
-                                    n["status_information"] = str(tds[5].string).encode("utf-8").replace("\n", " ").strip()
-
-                            # status flags
-                            n["passiveonly"] = False
-                            n["notifications_disabled"] = False
-                            n["flapping"] = False
-                            n["acknowledged"] = False
-                            n["scheduled_downtime"] = False
-
-                            # map status icons to status flags
-                            icons = tds[0].findAll('img')
-                            for i in icons:
-                                icon = i["src"].split("/")[-1]
-                                if icon in self.STATUS_MAPPING:
-                                    n[self.STATUS_MAPPING[icon]] = True
-                            # cleaning
-                            del icons
-
-                            # add dictionary full of information about this host item to nagitems
-                            nagitems["hosts"].append(n)
-                            # after collection data in nagitems create objects from its informations
+                                new_host = self.CGI_HOST_ROWS_WITH_ATTEMPT.build(tds, server=self.name, status_type=status_type)
+                            if new_host.name == "":
+                                new_host.name = last_host
+                            last_host = new_host.name
+                            self.set_flags_from_icons(new_host, tds[0])
+
                             # host objects contain service objects
-                            if not self.new_hosts.has_key(n["host"]):
-                                new_host = n["host"]
-                                self.new_hosts[new_host] = GenericHost()
-                                self.new_hosts[new_host].name = n["host"]
-                                self.new_hosts[new_host].server = self.name
-                                self.new_hosts[new_host].status = n["status"]
-                                self.new_hosts[new_host].last_check = n["last_check"]
-                                self.new_hosts[new_host].duration = n["duration"]
-                                self.new_hosts[new_host].attempt = n["attempt"]
-                                self.new_hosts[new_host].status_information= n["status_information"].encode("utf-8")
-                                self.new_hosts[new_host].passiveonly = n["passiveonly"]
-                                self.new_hosts[new_host].notifications_disabled = n["notifications_disabled"]
-                                self.new_hosts[new_host].flapping = n["flapping"]
-                                self.new_hosts[new_host].acknowledged = n["acknowledged"]
-                                self.new_hosts[new_host].scheduled_downtime = n["scheduled_downtime"]
-                                self.new_hosts[new_host].status_type = status_type
-                            del tds, n
+                            if not self.new_hosts.has_key(new_host.name):
+                                self.new_hosts[new_host.name] = new_host
+                            del tds, new_host
                     except:
                         self.Error(sys.exc_info())
 
                 # do some cleanup
-                htobj.decompose()
-                del htobj, trs, table
+                del result
 
         except:
             # set checking flag back to False
@@ -592,124 +662,44 @@ class GenericServer(object):
 
         # services
         try:
+            last_host = ""
             for status_type in "hard", "soft":
-                result = self.FetchURL(self.cgiurl_services[status_type])
-                htobj, error = result.result, result.error
-                if error != "": return Result(result=copy.deepcopy(htobj), error=copy.deepcopy(error))
-
-                # too much copy.deepcopy()s here give recursion crashs
-                table = htobj('table', {'class': 'status'})[0]
-
-                # some Icinga versions have a <tbody> tag in cgi output HTML which
-                # omits the <tr> tags being found
-                if len(table('tbody')) == 0:
-                    trs = table('tr', recursive=False)
-                else:
-                    tbody = table('tbody')[0]
-                    trs = tbody('tr', recursive=False)
-
-                del result, error
+                result = self.FetchURL(self.cgiurl_services[status_type], giveback="stream")
+                if result.error != "": return Result(result=result.result, error=result.error)
 
-                # kick out table heads
-                trs.pop(0)
-
-                # dummy tds to be deleteable
-                tds = []
-
-                for tr in trs:
+                # rows of status table are parsed while reading from server, table heads are already kicked out
+                for tds in StatusCGIParser().parse(result.result):
                     try:
                         # ignore empty <tr> rows - there are a lot of them - a Nagios bug?
-                        tds = tr('td', recursive=False)
                         if len(tds) > 1:
-                            n = dict()
-                            # host
+                            new_service = self.CGI_SERVICE_ROWS.build(tds, server=self.name, status_type=status_type)
                             # the resulting table of Nagios status.cgi table omits the
                             # hostname of a failing service if there are more than one
                             # so if the hostname is empty the nagios status item should get
-                            # its hostname from the previuos item - one reason to keep "nagitems"
-                            try:
-                                n["host"] = str(tds[0](text=not_empty)[0])
-                            except:
-                                n["host"] = str(nagitems["services"][len(nagitems["services"])-1]["host"])
-                            # service
-                            n["service"] = str(tds[1](text=not_empty)[0])
-                            # status
-                            n["status"] = str(tds[2](text=not_empty)[0])
-                            # last_check
-                            n["last_check"] = str(tds[3](text=not_empty)[0])
-                            # duration
-                            n["duration"] = str(tds[4](text=not_empty)[0])
-                            for entity in n["duration"].split():
-                                if int(entity[:-1]) > 0:
-                                    n["duration"] = entity
-                                    break
-                            # attempt
-                            # to fix http://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3280961&group_id=236865 .attempt needs
-                            # to be stripped
-                            n["attempt"] = str(tds[5](text=not_empty)[0]).strip()
-                            # status_information
-                            if len(tds[6](text=not_empty)) == 0:
-                                n["status_information"] = ""
-                            else:
-                                n["status_information"] = str(tds[6](text=not_empty)[0]).encode("utf-8")
-                            # status flags
-                            n["passiveonly"] = False
-                            n["notifications_disabled"] = False
-                            n["flapping"] = False
-                            n["acknowledged"] = False
-                            n["scheduled_downtime"] = False
-
-                            # map status icons to status flags
-                            icons = tds[1].findAll('img')
-                            for i in icons:
-                                icon = i["src"].split("/")[-1]
-                                if icon in self.STATUS_MAPPING:
-                                    n[self.STATUS_MAPPING[icon]] = True
-                            # cleaning
-                            del icons
-
-                            # add dictionary full of information about this service item to nagitems - only if service
-                            nagitems["services"].append(n)
-                            # after collection data in nagitems create objects of its informations
+                            # its hostname from the previuos item
+                            if new_service.host == "":
+                                if last_host == "":
+                                    continue
+                                new_service.host = last_host
+                            last_host = new_service.host
+                            self.set_flags_from_icons(new_service, tds[1])
+
                             # host objects contain service objects
-                            if not self.new_hosts.has_key(n["host"]):
-                                self.new_hosts[n["host"]] = GenericHost()
-                                self.new_hosts[n["host"]].name = n["host"]
-                                self.new_hosts[n["host"]].status = "UP"
+                            if not self.new_hosts.has_key(new_service.host):
+                                self.new_hosts[new_service.host] = GenericHost(name=new_service.host, status="UP")
                                 # trying to fix https://sourceforge.net/tracker/index.php?func=detail&aid=3299790&group_id=236865&atid=1101370
                                 # if host is not down but in downtime or any other flag this should be evaluated too
-                                # map status icons to status flags
-                                icons = tds[0].findAll('img')
-                                for i in icons:
-                                    icon = i["src"].split("/")[-1]
-                                    if icon in self.STATUS_MAPPING:
-                                        self.new_hosts[n["host"]].__dict__[self.STATUS_MAPPING[icon]] = True
+                                self.set_flags_from_icons(self.new_hosts[new_service.host], tds[0])
 
                             # if a service does not exist create its object
-                            if not self.new_hosts[n["host"]].services.has_key(n["service"]):
-                                new_service = n["service"]
-                                self.new_hosts[n["host"]].services[new_service] = GenericService()
-                                self.new_hosts[n["host"]].services[new_service].host = n["host"]
-                                self.new_hosts[n["host"]].services[new_service].name = n["service"]
-                                self.new_hosts[n["host"]].services[new_service].server = self.name
-                                self.new_hosts[n["host"]].services[new_service].status = n["status"]
-                                self.new_hosts[n["host"]].services[new_service].last_check = n["last_check"]
-                                self.new_hosts[n["host"]].services[new_service].duration = n["duration"]
-                                self.new_hosts[n["host"]].services[new_service].attempt = n["attempt"]
-                                self.new_hosts[n["host"]].services[new_service].status_information = n["status_information"].encode("utf-8")
-                                self.new_hosts[n["host"]].services[new_service].passiveonly = n["passiveonly"]
-                                self.new_hosts[n["host"]].services[new_service].notifications_disabled = n["notifications_disabled"]
-                                self.new_hosts[n["host"]].services[new_service].flapping = n["flapping"]
-                                self.new_hosts[n["host"]].services[new_service].acknowledged = n["acknowledged"]
-                                self.new_hosts[n["host"]].services[new_service].scheduled_downtime = n["scheduled_downtime"]
-                                self.new_hosts[n["host"]].services[new_service].status_type = status_type
-                            del tds, n
+                            if not self.new_hosts[new_service.host].services.has_key(new_service.name):
+                                self.new_hosts[new_service.host].services[new_service.name] = new_service
+                            del tds, new_service
                     except:
                         self.Error(sys.exc_info())
 
                 # do some cleanup
-                htobj.decompose()
-                del htobj, trs, table
+                del result
 
         except:
             # set checking flag back to False
@@ -717,13 +707,118 @@ class GenericServer(object):
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
-        # some cleanup
-        del nagitems
-
         #dummy return in case all is OK
         return Result()
 
 
+    def set_flags_from_icons(self, item, cell):
+        """
+        map status icons of a status.cgi table cell to status flags of host or service
+        """
+        for icon in cell["icons"]:
+            if icon in self.STATUS_MAPPING:
+                setattr(item, self.STATUS_MAPPING[icon], True)
+
+
+    def is_delta_poll(self):
+        """
+        decide if only changes since last poll are to be fetched - needs a full poll before and
+        every delta_polling_full_every polls a full one catches up with what delta queries cannot see,
+        like acknowledgements done by others
+        """
+        if str(self.conf.delta_polling) != "True" or self.full_poll_needed == True:
+            return False
+        return self.delta_polls < int(self.conf.delta_polling_full_every)
+
+
+    def get_host_key(self, item):
+        """
+        key of host or of host of service item in self.hosts - its name by default
+        """
+        return item.get_host_name()
+
+
+    def merge_delta(self, changed, changed_hosts):
+        """
+        build self.new_hosts from hosts of last poll and changed hosts/services in dictionary changed,
+        as delivered by a delta poll in self.new_hosts
+        changed_hosts contains the names of hosts whose own state was part of the delta - other hosts in
+        changed only serve as containers for their services
+        hosts being UP and services being OK have recovered and get removed
+        self.hosts stays untouched as snapshot - hosts of last poll untouched by the delta are taken over as
+        they are, every host the delta touches and all of its services of last poll get shallow copies with
+        visibility reset to let _apply_status() filter them again, e.g. services on a host that recovered
+        if filters changed all objects are copied that way
+        """
+        refilter = CompileFilter(self.conf, self.compiled_filter) is not self.compiled_filter
+
+        def copy_service(service):
+            new_service = copy.copy(service)
+            new_service.visible = True
+            return new_service
+
+        def copy_host(host):
+            new_host = copy.copy(host)
+            new_host.visible = True
+            new_host.services = dict([(s, copy_service(service)) for s, service in host.services.iteritems()])
+            return new_host
+
+        if refilter:
+            merged = dict([(name, copy_host(host)) for name, host in self.hosts.iteritems()])
+        else:
+            merged = dict(self.hosts)
+
+        for name, host in changed.iteritems():
+            if name in changed_hosts or not name in merged:
+                if name in merged:
+                    host.services.update(dict([(s, copy_service(service)) for s, service in merged[name].services.iteritems()\
+                                               if not s in host.services]))
+                merged[name] = host
+            else:
+                if merged[name] is self.hosts.get(name):
+                    merged[name] = copy_host(merged[name])
+                merged[name].services.update(host.services)
+
+        for name, host in merged.items():
+            if host.status == "UP":
+                recovered = [s for s, service in host.services.iteritems() if service.status == "OK"]
+                if len(recovered) > 0 and host is self.hosts.get(name):
+                    host = merged[name] = copy_host(host)
+                for service_name in recovered:
+                    del host.services[service_name]
+                if len(host.services) == 0:
+                    del merged[name]
+
+        self.new_hosts = merged
+
+
+    def cached(self, key, fetch):
+        """
+        value of key as fetched by fetch() before if it is younger than metadata_cache_ttl seconds,
+        otherwise fetch() is called again - for metadata like IDs or versions which cost requests
+        but rarely change
+        """
+        if key in self.metadata_cache:
+            fetch_time, value = self.metadata_cache[key]
+            if time.time() - fetch_time < int(self.conf.metadata_cache_ttl):
+                return value
+        value = fetch()
+        self.metadata_cache[key] = (time.time(), value)
+        return value
+
+
+    def delta_poll_done(self, delta, poll_time):
+        """
+        to be called by _get_status() after a successful full or delta poll started at local poll_time
+        """
+        if delta == True:
+            self.delta_polls += 1
+        else:
+            self.delta_polls = 0
+            self.full_poll_needed = False
+        self.last_poll_time = poll_time
+
+
     def GetStatus(self, output=None):
         """
         get nagios status information from cgiurl and give it back
@@ -751,30 +846,42 @@ class GenericServer(object):
                "bad session id" in status.error.lower() or \
                "login failed" in status.error.lower():
 
-                if str(self.conf.servers[self.name].enabled) == "True":
-                    # needed to get valid credentials
-                    self.refresh_authentication = True
-                    while status.error != "":
-                        gobject.idle_add(output.RefreshDisplayStatus)
-                        # clean existent authentication
-                        self.reset_HTTP()
-                        self.init_HTTP()
-                        status = self._get_status()
-                        self.status, self.status_description = status.result, status.error
-                        # take a break not to DOS the monitor...
-                        time.sleep(10)
-                        # if monitor has been disabled do not try to connect to it
-                        if str(self.conf.servers[self.name].enabled) == "False":
-                            break
-                        # if reauthentication did not work already try again to get correct credentials
-                        self.refresh_authentication = True
-            else:
+                # needed to get valid credentials
+                self.refresh_authentication = True
+                # headless collector has no output
+                if output != None:
+                    output.ScheduleRefresh(self)
+                # clean existent authentication and try once again - if it still fails the error is given
+                # back and the scheduler retries later instead of blocking a refresh worker here
+                self.reset_HTTP()
+                self.init_HTTP()
+                status = self._get_status()
+                self.status, self.status_description = status.result, status.error
+
+            if status.error != "":
+                # after failures only a full poll brings certainty
+                self.full_poll_needed = True
                 self.isChecking = False
                 return Result(result=self.status, error=self.status_description)
 
         # no rew authentication needed
         self.refresh_authentication = False
 
+        self._apply_status()
+        # cached status has been replaced by a real one
+        self.stale_since = None
+
+        # after all checks are done unset checking flag
+        self.isChecking = False
+
+        # return True if all worked well
+        return Result()
+
+
+    def _apply_status(self):
+        """
+        filter freshly polled self.new_hosts, count their states and publish them as self.hosts
+        """
         # this part has been before in GUI.RefreshDisplay() - wrong place, here it needs to be reset
         self.nagitems_filtered = {"services":{"CRITICAL":[], "WARNING":[], "UNKNOWN":[]}, "hosts":{"DOWN":[], "UNREACHABLE":[]}}
 
@@ -786,257 +893,197 @@ class GenericServer(object):
         self.criticals = 0
         self.warnings = 0
 
+        # filter settings get compiled only if they changed since last run
+        self.compiled_filter = CompileFilter(self.conf, self.compiled_filter)
+        # the Criticality filter can be used only with centreon objects. Other objects don't have the criticality attribute.
+        criticality = (str(self.type) == "Centreon")
+        debug = (str(self.conf.debug_mode) == "True")
+
         for host in self.new_hosts.values():
             # Don't enter the loop if we don't have a problem. Jump down to your problem services
             if not host.status == "UP":
-                # Some generic filters
-                if host.acknowledged == True and str(self.conf.filter_acknowledged_hosts_services) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: ACKNOWLEDGED " + str(host.name))
-                    host.visible = False
-
-                if host.notifications_disabled == True and str(self.conf.filter_hosts_services_disabled_notifications) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: NOTIFICATIONS " + str(host.name))
-                    host.visible = False
-
-                if host.passiveonly == True and str(self.conf.filter_hosts_services_disabled_checks) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: PASSIVEONLY " + str(host.name))
-                    host.visible = False
-
-                if host.scheduled_downtime == True and str(self.conf.filter_hosts_services_maintenance) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: DOWNTIME " + str(host.name))
-                    host.visible = False
-
-                if host.flapping == True and str(self.conf.filter_all_flapping_hosts) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: FLAPPING HOST " + str(host.name))
-                    host.visible = False
-
-                # Check_MK and OP5 do not show the status_type so their host.status_type will be empty
-                if host.status_type != "":
-                    if str(self.conf.filter_hosts_in_soft_state) == "True" and host.status_type == "soft":
-                        if str(self.conf.debug_mode) == "True":
-                            self.Debug(server=self.get_name(), debug="Filter: SOFT STATE " + str(host.name))
-                        host.visible = False
-
-                if HostIsFilteredOutByRE(host.name, self.conf) == True:
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP " + str(host.name))
-                    host.visible = False
-
-                if StatusInformationIsFilteredOutByRE(host.status_information, self.conf) == True:
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP " + str(host.name))
-                    host.visible = False
-
-                #The Criticality filter can be used only with centreon objects. Other objects don't have the criticality attribute.
-                if (str(self.type) == "Centreon") and (CriticalityIsFilteredOutByRE(host.criticality, self.conf) == True):
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP Criticality " + str(host.name))
-                    host.visible = False
-
-                # Finegrain for the specific state
-                if host.status == "DOWN":
-                    if str(self.conf.filter_all_down_hosts) == "True":
-                        if str(self.conf.debug_mode) == "True":
-                            self.Debug(server=self.get_name(), debug="Filter: DOWN " + str(host.name))
+                reason = self.compiled_filter.IsHostFilteredOut(host, criticality)
+                if reason != "":
+                    if debug:
+                        self.Debug(server=self.get_name(), debug="Filter: " + reason + " " + str(host.name))
+                    # hosts taken over unchanged by merge_delta() are still part of published self.hosts
+                    # and have been filtered out before already - do not touch them
+                    if host.visible:
                         host.visible = False
 
-                    if host.visible:
+                if host.visible:
+                    if host.status == "DOWN":
                         self.nagitems_filtered["hosts"]["DOWN"].append(host)
                         self.downs += 1
 
-                if host.status == "UNREACHABLE":
-                    if str(self.conf.filter_all_unreachable_hosts) == "True":
-                        if str(self.conf.debug_mode) == "True":
-                            self.Debug(server=self.get_name(), debug="Filter: UNREACHABLE " + str(host.name))
-                        host.visible = False
-
-                    if host.visible:
+                    if host.status == "UNREACHABLE":
                         self.nagitems_filtered["hosts"]["UNREACHABLE"].append(host)
                         self.unreachables += 1
 
             for service in host.services.values():
-                # Some generic filtering
-                if service.acknowledged == True and str(self.conf.filter_acknowledged_hosts_services) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: ACKNOWLEDGED " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
-
-                if service.notifications_disabled == True and str(self.conf.filter_hosts_services_disabled_notifications) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: NOTIFICATIONS " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+                reason = self.compiled_filter.IsServiceFilteredOut(host, service, criticality)
+                if reason != "":
+                    if debug:
+                        self.Debug(server=self.get_name(), debug="Filter: " + reason + " " + str(host.name) + ";" + str(service.name))
+                    # same for services
+                    if service.visible:
+                        service.visible = False
 
-                if service.passiveonly == True and str(self.conf.filter_hosts_services_disabled_checks) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: PASSIVEONLY " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+                if service.visible:
+                    if service.status == "CRITICAL":
+                        self.nagitems_filtered["services"]["CRITICAL"].append(service)
+                        self.criticals += 1
 
-                if service.scheduled_downtime == True and str(self.conf.filter_hosts_services_maintenance) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: DOWNTIME " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+                    if service.status == "WARNING":
+                        self.nagitems_filtered["services"]["WARNING"].append(service)
+                        self.warnings += 1
 
-                if service.flapping == True and str(self.conf.filter_all_flapping_services) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: FLAPPING SERVICE " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+                    if service.status == "UNKNOWN":
+                        self.nagitems_filtered["services"]["UNKNOWN"].append(service)
+                        self.unknowns += 1
 
-                if host.scheduled_downtime == True and str(self.conf.filter_services_on_hosts_in_maintenance) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: Service on host in DOWNTIME " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+    # find out if there has been some status change to notify user
+        # compare filtered nagios items with the ones of last poll - new or escalated ones notify
+        events = dict()
+        for i in self.nagitems_filtered["hosts"].values():
+            for h in i:
+                events[(h.name, "")] = h.status
 
-                if host.acknowledged == True and str(self.conf.filter_services_on_acknowledged_hosts) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: Service on acknowledged host" + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+        for i in self.nagitems_filtered["services"].values():
+            for s in i:
+                events[(s.host, s.name)] = s.status
 
-                if host.status == "DOWN" and str(self.conf.filter_services_on_down_hosts) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: Service on host in DOWN " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+        self.event_comparison.compare(events)
+        self.WorstStatus = self.event_comparison.get_worst_status()
+        del events
 
-                if host.status == "UNREACHABLE" and str(self.conf.filter_services_on_unreachable_hosts) == "True":
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: Service on host in UNREACHABLE " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
-
-                # Check_MK and OP5 do not show the status_type so their host.status_type will be empty
-                if service.status_type != "":
-                    if str(self.conf.filter_services_in_soft_state) == "True" and service.status_type == "soft":
-                        if str(self.conf.debug_mode) == "True":
-                            self.Debug(server=self.get_name(), debug="Filter: SOFT STATE " + str(host.name) + ";" + str(service.name))
-                        service.visible = False
-                else:
-                    # the old, actually wrong, behaviour
-                    real_attempt, max_attempt = service.attempt.split("/")
-                    if real_attempt <> max_attempt and str(self.conf.filter_services_in_soft_state) == "True":
-                        if str(self.conf.debug_mode) == "True":
-                            self.Debug(server=self.get_name(), debug="Filter: SOFT STATE " + str(host.name) + ";" + str(service.name))
-                        service.visible = False
+    # put new informations into status store which publishes them as self.hosts
+        self.status_store.update(self.new_hosts)
+        self.hosts = self.status_store.snapshot
+        # next poll fills a fresh dictionary so the published one stays untouched
+        self.new_hosts = dict()
 
-                if HostIsFilteredOutByRE(host.name, self.conf) == True:
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), debug="Status changes: %s new, %s changed, %s recovered" %\
+                       (len(self.status_store.new), len(self.status_store.changed), len(self.status_store.recovered)))
 
-                if ServiceIsFilteredOutByRE(service.get_name(), self.conf) == True:
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
 
-                if StatusInformationIsFilteredOutByRE(service.status_information, self.conf) == True:
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP " + str(host.name) + ";" + str(service.name))
-                    service.visible = False
+    def get_status_cache_file(self):
+        return self.conf.configdir + os.sep + "status" + os.sep + self.get_name() + ".json"
 
-                #The Criticality filter can be used only with centreon objects. Other objects don't have the criticality attribute.
-                if (str(self.type) == "Centreon") and (CriticalityIsFilteredOutByRE(service.criticality, self.conf) == True):
-                    if str(self.conf.debug_mode) == "True":
-                        self.Debug(server=self.get_name(), debug="Filter: REGEXP Criticality %s;%s %s"  % ((str(host.name), str(service.name), str(service.criticality))))
-                    service.visible = False
 
-                # Finegrain for the specific state
-                if service.visible:
-                    if service.status == "CRITICAL":
-                        if str(self.conf.filter_all_critical_services) == "True":
-                            if str(self.conf.debug_mode) == "True":
-                                self.Debug(server=self.get_name(), debug="Filter: CRITICAL " + str(host.name) + ";" + str(service.name))
-                            service.visible = False
-                        else:
-                            self.nagitems_filtered["services"]["CRITICAL"].append(service)
-                            self.criticals += 1
+    def save_status_cache(self, events_history=None):
+        """
+        write hosts of last poll to status cache file, atomically by renaming a temporary file
+        so a crash never leaves a half written one - only if something changed since last save
+        events_history of GUI is saved for items of this server
+        """
+        if self.status_cache_saved and len(self.status_store.new) == 0 and\
+           len(self.status_store.changed) == 0 and len(self.status_store.recovered) == 0:
+            return
+
+        # visibility depends on filters at next start
+        fields = ["status"] + [f for f, default in GenericObject.FIELDS if f != "visible"]
+        if events_history == None:
+            events_history = dict()
+        hosts = list()
+        events = dict()
+        for host in self.hosts.values():
+            h = dict((f, getattr(host, f)) for f in fields)
+            if host.get_hash() in events_history:
+                events[host.get_hash()] = events_history[host.get_hash()]
+            h["services"] = list()
+            for service in host.services.values():
+                h["services"].append(dict((f, getattr(service, f)) for f in fields))
+                if service.get_hash() in events_history:
+                    events[service.get_hash()] = events_history[service.get_hash()]
+            hosts.append(h)
 
-                    if service.status == "WARNING":
-                        if str(self.conf.filter_all_warning_services) == "True":
-                            if str(self.conf.debug_mode) == "True":
-                                self.Debug(server=self.get_name(), debug="Filter: WARNING " + str(host.name) + ";" + str(service.name))
-                            service.visible = False
-                        else:
-                            self.nagitems_filtered["services"]["WARNING"].append(service)
-                            self.warnings += 1
+        try:
+            directory = os.path.dirname(self.get_status_cache_file())
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            f = os.fdopen(fd, "w")
+            try:
+                json.dump({"time":time.time(), "hosts":hosts, "events_history":events}, f, separators=(",", ":"))
+            finally:
+                f.close()
+            # Windows cannot rename to an existing file
+            if platform.system() == "Windows" and os.path.exists(self.get_status_cache_file()):
+                os.remove(self.get_status_cache_file())
+            os.rename(temp, self.get_status_cache_file())
+            self.status_cache_saved = True
+        except:
+            self.Error(sys.exc_info())
 
-                    if service.status == "UNKNOWN":
-                        if str(self.conf.filter_all_unknown_services) == "True":
-                            if str(self.conf.debug_mode) == "True":
-                                self.Debug(server=self.get_name(), debug="Filter: UNKNOWN " + str(host.name) + ";" + str(service.name))
-                            service.visible = False
-                        else:
-                            self.nagitems_filtered["services"]["UNKNOWN"].append(service)
-                            self.unknowns += 1
 
-    # find out if there has been some status change to notify user
-        # compare sorted lists of filtered nagios items
-        new_nagitems_filtered_list = []
+    def load_status_cache(self):
+        """
+        publish hosts of status cache file as if they were polled, marked as stale until first poll
+        finished - this one only applies the differences then
+        """
+        try:
+            f = open(self.get_status_cache_file())
+            try:
+                cache = json.load(f)
+            finally:
+                f.close()
+        except:
+            # no cache yet or unreadable one
+            return
 
-        for i in self.nagitems_filtered["hosts"].values():
-            for h in i:
-                new_nagitems_filtered_list.append((h.name, h.status))
+        def utf8(fields):
+            return dict((str(k), v.encode("utf-8") if isinstance(v, unicode) else v) for k, v in fields.items())
 
-        for i in self.nagitems_filtered["services"].values():
-            for s in i:
-                new_nagitems_filtered_list.append((s.host, s.name, s.status))
+        try:
+            self.new_hosts = dict()
+            for h in cache["hosts"]:
+                services = h.pop("services")
+                host = GenericHost(**utf8(h))
+                for s in services:
+                    service = GenericService(**utf8(s))
+                    host.services[service.name] = service
+                self.new_hosts[self.get_host_key(host)] = host
+            self.cached_events_history = dict((k.encode("utf-8"), v) for k, v in cache["events_history"].items())
+            self._apply_status()
+            self.stale_since = cache["time"]
+            self.status = "Stale (last updated %s)" % time.ctime(self.stale_since)
+        except:
+            self.new_hosts = dict()
+            self.Error(sys.exc_info())
 
-        # sort for better comparison
-        new_nagitems_filtered_list.sort()
 
-        # if both lists are identical there was no status change
-        if (self.nagitems_filtered_list == new_nagitems_filtered_list):
-            self.WorstStatus = "UP"
-        else:
-            # if the new list is shorter than the first and there are no different hosts
-            # there one host/service must have been recovered, which is not worth a notification
-            diff = []
-            for i in new_nagitems_filtered_list:
-                if not i in self.nagitems_filtered_list:
-                    # collect differences
-                    diff.append(i)
-            if len(diff) == 0:
-                self.WorstStatus = "UP"
-            else:
-                # if there are different hosts/services in list of new hosts there must be a notification
-                # get list of states for comparison
-                diff_states = []
-                for d in diff:
-                    diff_states.append(d[-1])
-                # temporary worst state index
-                worst = 0
-                for d in diff_states:
-                    # only check worst state if it is valid
-                    if d in self.States:
-                        if self.States.index(d) > worst:
-                            worst = self.States.index(d)
-
-                # final worst state is one of the predefined states
-                self.WorstStatus = self.States[worst]
-
-        # copy of listed nagitems for next comparison
-        self.nagitems_filtered_list = copy.deepcopy(new_nagitems_filtered_list)
-        del new_nagitems_filtered_list
-
-    # put new informations into respective dictionaries
-        self.hosts = copy.deepcopy(self.new_hosts)
-        self.new_hosts.clear()
+    def get_stale_status(self, status):
+        """
+        status text telling that shown hosts and services are still the ones of the status cache
+        """
+        if self.stale_since == None:
+            return status
+        return "%s (showing stale status of %s)" % (status, time.ctime(self.stale_since))
 
-        # after all checks are done unset checking flag
-        self.isChecking = False
 
-        # return True if all worked well
-        return Result()
+    def clear_stale_status(self):
+        """
+        drop hosts and services of status cache if the first poll failed - they would look current otherwise
+        """
+        if self.stale_since == None:
+            return
+        self.new_hosts = dict()
+        self._apply_status()
+        self.stale_since = None
 
 
-    def FetchURL(self, url, giveback="obj", cgi_data=None, no_auth=False):
+    def FetchURL(self, url, giveback="obj", cgi_data=None, no_auth=False, conditional=False):
         """
         get content of given url, cgi_data only used if present
         "obj" FetchURL gives back a dict full of miserable hosts/services,
         "xml" giving back as objectified xml
         "raw" it gives back pure HTML - useful for finding out IP or new version
+        "stream" gives back the still open file-like response for parsing while reading, to be closed by caller
         existence of cgi_data forces urllib to use POST instead of GET requests
+        conditional "raw" GET requests send ETag and Last-Modified of the last response - if the monitor
+        answers "304 Not Modified" the last content is given back with not_modified set to True
         NEW: gives back a list containing result and, if necessary, a more clear error description
         """
 
@@ -1050,15 +1097,46 @@ class GenericServer(object):
             HTTPheaders = dict()
             HTTPheaders["raw"] = HTTPheaders["obj"] = HTTPheaders["xml"] =  dict()
 
+        # only GET requests for raw content might be conditional
+        validator_url = None
+        if conditional == True and cgi_data == None and giveback == "raw":
+            validator_url = url
+
         try:
             try:
                 # debug
                 if str(self.conf.debug_mode) == "True":
                     self.Debug(server=self.get_name(), debug="FetchURL: " + url + " CGI Data: " + str(cgi_data))
-                request = urllib2.Request(url, cgi_data, HTTPheaders[giveback])
+                # streaming needs the same headers as objectified HTML
+                if giveback == "stream":
+                    request = urllib2.Request(url, cgi_data, HTTPheaders["obj"])
+                else:
+                    request = urllib2.Request(url, cgi_data, HTTPheaders[giveback])
+                if validator_url in self.validators:
+                    etag, last_modified, content = self.validators[validator_url]
+                    if etag != None:
+                        request.add_header("If-None-Match", etag)
+                    if last_modified != None:
+                        request.add_header("If-Modified-Since", last_modified)
                 # use opener - if cgi_data is not empty urllib uses a POST request
                 urlcontent = self.urlopener.open(request)
                 del url, cgi_data, request
+            except urllib2.HTTPError, err:
+                # nothing changed since last request - no need to transfer content again
+                if err.code == 304 and validator_url in self.validators:
+                    err.close()
+                    if str(self.conf.debug_mode) == "True":
+                        self.Debug(server=self.get_name(), debug="FetchURL: not modified " + validator_url)
+                    return Result(result=self.validators[validator_url][2], not_modified=True)
+                del url, cgi_data, request
+                result, error = self.Error(sys.exc_info())
+                # error page read completely gives its keep-alive connection back to pool
+                try:
+                    err.read()
+                except:
+                    pass
+                err.close()
+                return Result(result=result, error=error)
             except:
                 del url, cgi_data, request
                 result, error = self.Error(sys.exc_info())
@@ -1067,12 +1145,24 @@ class GenericServer(object):
             # give back pure HTML or XML in case giveback is "raw"
             if giveback == "raw":
                 result = Result(result=urlcontent.read().decode("utf8", errors="ignore"))
+                if validator_url != None:
+                    etag = urlcontent.info().getheader("ETag")
+                    last_modified = urlcontent.info().getheader("Last-Modified")
+                    if etag != None or last_modified != None:
+                        self.validators[validator_url] = (etag, last_modified, result.result)
+                    elif validator_url in self.validators:
+                        del self.validators[validator_url]
                 urlcontent.close()
                 del urlcontent
                 return result
 
+            # response as it is, e.g. for StatusCGIParser
+            if giveback == "stream":
+                return Result(result=urlcontent)
+
             # objectified HTML
             if giveback == "obj":
+                BeautifulSoup, BeautifulStoneSoup = import_soup()
                 yummysoup = BeautifulSoup(urlcontent.read().decode("utf8", errors="ignore"), convertEntities=BeautifulSoup.ALL_ENTITIES)
                 urlcontent.close()
                 del urlcontent
@@ -1081,6 +1171,7 @@ class GenericServer(object):
 
             # objectified generic XML, valid at least for Opsview and Centreon
             elif giveback == "xml":
+                BeautifulSoup, BeautifulStoneSoup = import_soup()
                 xmlobj = BeautifulStoneSoup(urlcontent.read().decode("utf8", errors="ignore"), convertEntities=BeautifulStoneSoup.XML_ENTITIES)
                 urlcontent.close()
                 del urlcontent
@@ -28,13 +28,53 @@
 import sys
 import urllib
 import time
-import copy
+import json
 
 from Nagstamon import Actions
 from Nagstamon.Objects import *
 from Nagstamon.Server.Generic import GenericServer
 
 
+# Check_MK short states
+STATEMAP = {
+    'UNREACH': 'UNREACHABLE',
+    'CRIT':    'CRITICAL',
+    'WARN':    'WARNING',
+    'UNKN':    'UNKNOWN',
+    'PEND':    'PENDING',
+}
+
+
+def utf8(value):
+    return value.encode("utf-8")
+
+
+def yes(value):
+    return value == 'yes'
+
+
+def no(value):
+    return value == 'no'
+
+
+def hard_or_soft(attempt):
+    """
+    hard/soft state for later filter evaluation
+    """
+    real_attempt, max_attempt = attempt.split("/")
+    if real_attempt <> max_attempt:
+        return "soft"
+    else:
+        return "hard"
+
+
+def passive_only(is_active, check_command):
+    """
+    Check_MK passive services can be re-scheduled by using the Check_MK service
+    """
+    return is_active == 'no' and not check_command.startswith('check_mk')
+
+
 class MultisiteError(Exception):
     def __init__(self, terminate, result):
         self.terminate = terminate
@@ -52,36 +92,26 @@ class LastCheckColumnMultisite(Column):
     ATTR_NAME = 'last_check'
 
     @classmethod
-    def sort_function(cls, model, iter1, iter2, column):
+    def sort_key(cls, value):
         """ Overrides default sorting behaviour """
-
-        data1, data2 = [model.get_value(x, column) for x in (iter1, iter2)]
-
         try:
-            first = Actions.MachineSortableDateMultisite(data1)
-            second = Actions.MachineSortableDateMultisite(data2)
-        except ValueError, err:
-            print err
-            return cmp(first, second)
-        # other order than default function
-        return second - first
+            # other order than default function
+            return -Actions.MachineSortableDateMultisite(value)
+        except ValueError:
+            return 0
 
 
 class DurationColumnMultisite(CustomSortingColumn):
     ATTR_NAME = 'duration'
 
     @classmethod
-    def sort_function(cls, model, iter1, iter2, column):
+    def sort_key(cls, value):
         """ Overrides default sorting behaviour """
-        data1, data2 = [model.get_value(x, column) for x in (iter1, iter2)]
         try:
-            first = Actions.MachineSortableDateMultisite(data1)
-            second = Actions.MachineSortableDateMultisite(data2)
-        except ValueError, err:
-            print err
-            return cmp(first, second)
-        # other order than default function
-        return second - first
+            # other order than default function
+            return -Actions.MachineSortableDateMultisite(value)
+        except ValueError:
+            return 0
 
 
 class MultisiteServer(GenericServer):
@@ -110,13 +140,44 @@ class MultisiteServer(GenericServer):
         StatusInformationColumn
     ]
 
+    HOST_ROWS = RowMapping(GenericHost, (("name",               "host",                 utf8),
+                                         ("status",             "host_state",           mapped(STATEMAP)),
+                                         ("last_check",         "host_check_age",       None),
+                                         ("duration",           "host_state_age",       None),
+                                         ("status_information", "host_plugin_output",   one_line),
+                                         ("attempt",            "host_attempt",         None),
+                                         ("status_type",        "host_attempt",         hard_or_soft),
+                                         ("site",               "sitename_plain",       utf8),
+                                         ("address",            "host_address",         utf8)),
+                           # transition to Check_MK 1.1.10p2
+                           optional=(("scheduled_downtime",     "host_in_downtime",     yes),
+                                     ("acknowledged",           "host_acknowledged",    yes),
+                                     ("notifications_disabled", "host_notifications_enabled", no)))
+
+    SERVICE_ROWS = RowMapping(GenericService, (("host",               "host",                 utf8),
+                                               ("name",               "service_description",  utf8),
+                                               ("status",             "service_state",        mapped(STATEMAP)),
+                                               ("last_check",         "svc_check_age",        None),
+                                               ("duration",           "svc_state_age",        None),
+                                               ("attempt",            "svc_attempt",          None),
+                                               ("status_type",        "svc_attempt",          hard_or_soft),
+                                               ("status_information", "svc_plugin_output",    one_line),
+                                               ("passiveonly",        ("svc_is_active", "svc_check_command"), passive_only),
+                                               ("flapping",           "svc_flapping",         yes),
+                                               ("site",               "sitename_plain",       utf8),
+                                               ("address",            "host_address",         utf8),
+                                               ("command",            "svc_check_command",    utf8)),
+                              # transition to Check_MK 1.1.10p2
+                              optional=(("scheduled_downtime",     "svc_in_downtime",      yes),
+                                        ("acknowledged",           "svc_acknowledged",     yes),
+                                        ("notifications_disabled", "svc_notifications_enabled", no)))
+
 
     def __init__(self, **kwds):
         GenericServer.__init__(self, **kwds)
 
         # Prepare all urls needed by nagstamon -
         self.urls = {}
-        self.statemap = {}
 
         # Entries for monitor default actions in context menu
         self.MENU_ACTIONS = ["Monitor", "Recheck", "Acknowledge", "Downtime"]
@@ -131,15 +192,15 @@ class MultisiteServer(GenericServer):
             self.monitor_url += '/'
 
         # Prepare all urls needed by nagstamon if not yet done
-        if len(self.urls) == len(self.statemap):
+        if len(self.urls) == 0:
             self.urls = {
-              'api_services':    self.monitor_url + "view.py?view_name=nagstamon_svc&output_format=python&lang=&limit=hard",
+              'api_services':    self.monitor_url + "view.py?view_name=nagstamon_svc&output_format=json&lang=&limit=hard",
               'human_services':  self.monitor_url + "index.py?%s" % \
                                                    urllib.urlencode({'start_url': 'view.py?view_name=nagstamon_svc'}),
               'human_service':   self.monitor_url + "index.py?%s" %
                                                    urllib.urlencode({'start_url': 'view.py?view_name=service'}),
 
-              'api_hosts':       self.monitor_url + "view.py?view_name=nagstamon_hosts&output_format=python&lang=&limit=hard",
+              'api_hosts':       self.monitor_url + "view.py?view_name=nagstamon_hosts&output_format=json&lang=&limit=hard",
               'human_hosts':     self.monitor_url + "index.py?%s" %
                                                    urllib.urlencode({'start_url': 'view.py?view_name=nagstamon_hosts'}),
               'human_host':      self.monitor_url + "index.py?%s" %
@@ -158,14 +219,6 @@ class MultisiteServer(GenericServer):
               'transid':         self.monitor_url + "view.py?actions=yes&filled_in=actions&host=$HOST$&service=$SERVICE$&view_name=service"
             }
 
-            self.statemap = {
-                'UNREACH': 'UNREACHABLE',
-                'CRIT':    'CRITICAL',
-                'WARN':    'WARNING',
-                'UNKN':    'UNKNOWN',
-                'PEND':    'PENDING',
-            }
-
         if self.CookieAuth:
             # get cookie to access Check_MK web interface
             if len(self.Cookie) == 0:
@@ -197,7 +250,7 @@ class MultisiteServer(GenericServer):
             self.Debug(server=self.get_name(), debug=c[0])
 
             raise MultisiteError(False, Result(result = "\n".join(c[1:]),
-                                               content = eval("\n".join(c[1:])),
+                                               content = json.loads("\n".join(c[1:])),
                                                error = c[0]))
         elif content.startswith('ERROR:'):
             raise MultisiteError(True, Result(result = content,
@@ -219,7 +272,7 @@ class MultisiteServer(GenericServer):
                 if content.startswith('<'):
                     return ""
 
-        return eval(content)
+        return json.loads(content)
 
 
     def _get_cookie_login(self):
@@ -264,50 +317,14 @@ class MultisiteServer(GenericServer):
                 if e.terminate:
                     return e.result
 
-            for row in response[1:]:
-                host= dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
-                n = {
-                    'host':               host['host'],
-                    'status':             self.statemap.get(host['host_state'], host['host_state']),
-                    'last_check':         host['host_check_age'],
-                    'duration':           host['host_state_age'],
-                    'status_information': host['host_plugin_output'],
-                    'attempt':            host['host_attempt'],
-                    'site':               host['sitename_plain'],
-                    'address':            host['host_address'],
-                }
-
-                # host objects contain service objects
-                if not self.new_hosts.has_key(n["host"]):
-                    new_host = n["host"]
-                    self.new_hosts[new_host] = GenericHost()
-                    self.new_hosts[new_host].name = n["host"]
-                    self.new_hosts[new_host].server = self.name
-                    self.new_hosts[new_host].status = n["status"]
-                    self.new_hosts[new_host].last_check = n["last_check"]
-                    self.new_hosts[new_host].duration = n["duration"]
-                    self.new_hosts[new_host].attempt = n["attempt"]
-                    self.new_hosts[new_host].status_information= n["status_information"].replace("\n", " ")
-                    self.new_hosts[new_host].site = n["site"]
-                    self.new_hosts[new_host].address = n["address"]
-                    # transisition to Check_MK 1.1.10p2
-                    if host.has_key('host_in_downtime'):
-                        if host['host_in_downtime'] == 'yes':
-                            self.new_hosts[new_host].scheduled_downtime = True
-                    if host.has_key('host_acknowledged'):
-                        if host['host_acknowledged'] == 'yes':
-                            self.new_hosts[new_host].acknowledged = True
-		    if host.has_key('host_notifications_enabled'):
-                        if host['host_notifications_enabled'] == 'no':
-                            self.new_hosts[new_host].notifications_disabled = True
-
-
-                    # hard/soft state for later filter evaluation
-                    real_attempt, max_attempt = self.new_hosts[new_host].attempt.split("/")
-                    if real_attempt <> max_attempt:
-                        self.new_hosts[new_host].status_type = "soft"
-                    else:
-                        self.new_hosts[new_host].status_type = "hard"
+            # first row contains column names
+            if len(response) > 0:
+                mapping = self.HOST_ROWS.indexed(response[0])
+                for row in response[1:]:
+                    new_host = mapping.build(row, server=self.name)
+                    # host objects contain service objects
+                    if not self.new_hosts.has_key(new_host.name):
+                        self.new_hosts[new_host.name] = new_host
 
             del response
 
@@ -329,73 +346,22 @@ class MultisiteServer(GenericServer):
                 if e.terminate:
                     return e.result
                 else:
-                    response = copy.deepcopy(e.result.content)
-                    ret = copy.deepcopy(e.result)
-
-            for row in response[1:]:
-                service = dict(zip(copy.deepcopy(response[0]), copy.deepcopy(row)))
-                n = {
-                    'host':               service['host'].encode("utf-8"),
-                    'service':            service['service_description'].encode("utf-8"),
-                    'status':             self.statemap.get(service['service_state'], service['service_state']),
-                    'last_check':         service['svc_check_age'],
-                    'duration':           service['svc_state_age'],
-                    'attempt':            service['svc_attempt'],
-                    'status_information': service['svc_plugin_output'].encode("utf-8"),
-                    # Check_MK passive services can be re-scheduled by using the Check_MK service
-                    'passiveonly':        service['svc_is_active'] == 'no' and not service['svc_check_command'].startswith('check_mk'),
-                    'notifications':      service['svc_notifications_enabled'] == 'yes',
-                    'flapping':           service['svc_flapping'] == 'yes',
-                    'site':               service['sitename_plain'],
-                    'address':            service['host_address'],
-                    'command':            service['svc_check_command'],
-                }
-
-                # host objects contain service objects
-                if not self.new_hosts.has_key(n["host"]):
-                    self.new_hosts[n["host"]] = GenericHost()
-                    self.new_hosts[n["host"]].name = n["host"]
-                    self.new_hosts[n["host"]].status = "UP"
-                    self.new_hosts[n["host"]].site = n["site"]
-                    self.new_hosts[n["host"]].address = n["address"]
-                # if a service does not exist create its object
-                if not self.new_hosts[n["host"]].services.has_key(n["service"]):
-                    new_service = n["service"]
-                    self.new_hosts[n["host"]].services[new_service] = GenericService()
-                    self.new_hosts[n["host"]].services[new_service].host = n["host"]
-                    self.new_hosts[n["host"]].services[new_service].server = self.name
-                    self.new_hosts[n["host"]].services[new_service].name = n["service"]
-                    self.new_hosts[n["host"]].services[new_service].status = n["status"]
-                    self.new_hosts[n["host"]].services[new_service].last_check = n["last_check"]
-                    self.new_hosts[n["host"]].services[new_service].duration = n["duration"]
-                    self.new_hosts[n["host"]].services[new_service].attempt = n["attempt"]
-                    self.new_hosts[n["host"]].services[new_service].status_information = n["status_information"].replace("\n", " ").strip()
-                    self.new_hosts[n["host"]].services[new_service].passiveonly = n["passiveonly"]
-                    self.new_hosts[n["host"]].services[new_service].flapping = n["flapping"]
-                    self.new_hosts[n["host"]].services[new_service].site = n["site"]
-                    self.new_hosts[n["host"]].services[new_service].address = n["address"]
-                    self.new_hosts[n["host"]].services[new_service].command = n["command"]
-                    # transistion to Check_MK 1.1.10p2
-                    if service.has_key('svc_in_downtime'):
-                        if service['svc_in_downtime'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].scheduled_downtime = True
-                    if service.has_key('svc_acknowledged'):
-                        if service['svc_acknowledged'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].acknowledged = True
-                    if service.has_key('svc_flapping'):
-                        if service['svc_flapping'] == 'yes':
-                            self.new_hosts[n["host"]].services[new_service].flapping = True
-                    if service.has_key('svc_notifications_enabled'):
-                        if service['svc_notifications_enabled'] == 'no':
-                            self.new_hosts[n["host"]].services[new_service].notifications_disabled = True
-
-
-                    # hard/soft state for later filter evaluation
-                    real_attempt, max_attempt = self.new_hosts[n["host"]].services[new_service].attempt.split("/")
-                    if real_attempt <> max_attempt:
-                        self.new_hosts[n["host"]].services[new_service].status_type = "soft"
-                    else:
-                        self.new_hosts[n["host"]].services[new_service].status_type = "hard"
+                    response = e.result.content
+                    ret = e.result
+
+            # first row contains column names
+            if len(response) > 0:
+                mapping = self.SERVICE_ROWS.indexed(response[0])
+                for row in response[1:]:
+                    new_service = mapping.build(row, server=self.name)
+                    # host objects contain service objects
+                    if not self.new_hosts.has_key(new_service.host):
+                        self.new_hosts[new_service.host] = GenericHost(name=new_service.host, status="UP",
+                                                                       site=new_service.site,
+                                                                       address=new_service.address)
+                    # if a service does not exist create its object
+                    if not self.new_hosts[new_service.host].services.has_key(new_service.name):
+                        self.new_hosts[new_service.host].services[new_service.name] = new_service
 
             del response
 
@@ -403,7 +369,7 @@ class MultisiteServer(GenericServer):
             # set checking flag back to False
             self.isChecking = False
             result, error = self.Error(sys.exc_info())
-            return Result(result=copy.deepcopy(result), error=copy.deepcopy(error))
+            return Result(result=result, error=error)
 
         del url_params
 
@@ -471,8 +437,24 @@ class MultisiteServer(GenericServer):
                                 server=self)
         action.run()
 
+
+    def _prepare_command_batch(self, command, items):
+        """
+        Multisite needs no start time from cmd.cgi
+        """
+        pass
+
+
+    def _send_command(self, command, host, service, params):
+        """
+        params of GenericServer.send_commands() are already those of the Multisite action
+        """
+        self._action(self.hosts[host].site, host, service, params)
+        return Result()
+
+
     def _set_downtime(self, host, service, author, comment, fixed, start_time, end_time, hours, minutes):
-        self._action(self.hosts[host].site, host, service, {
+        return self.send_commands([("downtime", host, service, {
             '_down_comment':  author == self.username and comment or '%s: %s' % (author, comment),
             '_down_flexible': fixed == 0 and 'on' or '',
             '_down_custom':   'Custom+time+range',
@@ -481,7 +463,7 @@ class MultisiteServer(GenericServer):
             '_down_to_date':   end_time.split(' ')[0],
             '_down_to_time':   end_time.split(' ')[1],
             '_down_duration':  '%s:%s' % (hours, minutes),
-        })
+        })])
 
 
     def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services=[]):
@@ -492,18 +474,19 @@ class MultisiteServer(GenericServer):
             '_ack_persistent': persistent == 1 and 'on' or '',
             '_ack_comment':    author == self.username and comment or '%s: %s' % (author, comment)
         }
-        self._action(self.hosts[host].site, host, service, p)
+        commands = [("acknowledge", host, service, p)]
 
         # acknowledge all services on a host when told to do so
         for s in all_services:
-            self._action(self.hosts[host].site, host, s, p)
+            commands.append(("acknowledge", host, s, p))
+        return self.send_commands(commands)
 
 
     def _set_recheck(self, host, service):
         p = {
             '_resched_checks':    'Reschedule active checks',
         }
-        self._action(self.hosts[host].site, host, service, p)
+        return self.send_commands([("recheck", host, service, p)])
 
 
     def recheck_all(self):
@@ -519,6 +502,8 @@ class MultisiteServer(GenericServer):
 
         result = self.FetchURL(url + '&' + urllib.urlencode(params), giveback = 'raw')
 
+        return True
+
     """
     def ToggleVisibility(self, widget):
         #Attempt to enable/disable visibility of all problems for user via
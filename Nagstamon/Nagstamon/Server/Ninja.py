@@ -39,12 +39,31 @@ except:
     from Nagstamon.thirdparty.BeautifulSoup import BeautifulSoup
 
 
+def id_name(td):
+    return td['id'].split('|')[-1]
+
+
+def title(td):
+    return td['title']
+
+
+def content(td):
+    return str(td.contents[0])
+
+
+def content_line(td):
+    return one_line(str(td.contents[0]))
+
+
 class NinjaServer(GenericServer):
     """
         Ninja plugin for Nagstamon
     """
     TYPE = "Ninja"
 
+    # own _set_recheck() instead of send_commands() - Actions.RecheckAll rechecks item by item
+    RECHECK_BY_COMMANDS = False
+
     bitmasks = {
         1: 'acknowledged',
         2: 'notifications_disabled',
@@ -60,6 +79,21 @@ class NinjaServer(GenericServer):
     services_path = "/index.php/status/service/all?servicestatustypes=78&hoststatustypes=71&items_per_page=10000"
     hosts_path = "/index.php/status/host/?host=all&hoststatustypes=6&items_per_page=999999"
 
+    # cells of host and service table rows
+    HOST_ROWS = RowMapping(GenericHost, (("name", 0, id_name),
+                                         ("status", 0, title),
+                                         ("last_check", 5, content),
+                                         ("duration", 6, content),
+                                         ("status_information", 7, content_line)))
+
+    SERVICE_ROWS = RowMapping(GenericService, (("host", 0, id_name),
+                                               ("name", 2, id_name),
+                                               ("status", 2, title),
+                                               ("last_check", 6, content),
+                                               ("duration", 7, content),
+                                               ("attempt", 8, content),
+                                               ("status_information", 9, content_line)))
+
     # A Monitor CGI URL is not necessary so hide it in settings
     # autologin is used only by Centreon
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
@@ -234,15 +268,11 @@ class NinjaServer(GenericServer):
         trs.pop(0)
 
         for tr in [tr for tr in table('tr') if len(tr('td')) > 1]:
-            n = self.parse_host_row(tr)
+            new_host = self.parse_host_row(tr)
 
             # host objects contain service objects
-            if n["name"] not in self.new_hosts:
-                new_host = GenericHost()
-                for attr, val in n.iteritems():
-                    setattr(new_host, attr, val)
+            if new_host.name not in self.new_hosts:
                 self.new_hosts[new_host.name] = new_host
-                self.new_hosts[new_host.name].server = self.name
 
         del trs, table, htobj
 
@@ -255,32 +285,23 @@ class NinjaServer(GenericServer):
         lasthost = ""
 
         for tr in [tr for tr in table('tr') if len(tr('td')) > 1]:
-            n, host_bitmask = self.parse_service_row(tr)
+            new_service, host_bitmask = self.parse_service_row(tr)
 
-            if n["host"] not in self.new_hosts:
+            if new_service.host not in self.new_hosts:
                 # the hosts that we just fetched were on a list only containing
                 # those in a non-OK state, thus, we just found a not-yet seen host
                 # and we have to fake it 'til we make it
-                new_host = GenericHost()
-                new_host.name = n["host"]
-                new_host.server = self.name
-                new_host.status = "UP"
-                new_host.visible = False
+                new_host = GenericHost(name=new_service.host, server=self.name, status="UP", visible=False)
 
                 # trying to fix https://sourceforge.net/tracker/index.php?func=detail&aid=3299790&group_id=236865&atid=1101370
                 # if host is not down but in downtime or any other flag this should be evaluated too
                 if host_bitmask:
-                    for number, name in self.bitmasks.iteritems():
-                        setattr(new_host, name, bool(int(host_bitmask) & number))
-                self.new_hosts[n["host"]] = new_host
+                    self.set_flags(new_host, host_bitmask)
+                self.new_hosts[new_service.host] = new_host
 
             # if a service does not exist create its object
-            if n["name"] not in self.new_hosts[n["host"]].services:
-                new_service = GenericService()
-                for attr, val in n.iteritems():
-                    setattr(new_service, attr, val)
-                self.new_hosts[n["host"]].services[n["name"]] = new_service
-                self.new_hosts[n["host"]].services[n["name"]].server = self.name
+            if new_service.name not in self.new_hosts[new_service.host].services:
+                self.new_hosts[new_service.host].services[new_service.name] = new_service
 
         del trs, table, htobj
 
@@ -302,46 +323,36 @@ class NinjaServer(GenericServer):
         return Result()
 
 
+    def set_flags(self, item, bitmask):
+        """
+        set flags of host or service from Ninja bitmask
+        """
+        for number, name in self.bitmasks.iteritems():
+            # only flags known by hosts and services
+            if hasattr(item, name):
+                setattr(item, name, bool(int(bitmask) & number))
+
+
     def parse_host_row(self, tr):
         tds = tr('td')
-        n = {}
-        n["name"] = tds[0]['id'].split('|')[-1]
-        n["status"] = tds[0]['title']
-        n["last_check"] = str(tds[5].contents[0])
-        n["duration"] = str(tds[6].contents[0])
-        n["attempt"] = "N/A"
-        n["status_information"] = str(tds[7].contents[0]).strip().replace("\n", " ").strip()
-        n["visible"] = True
+        new_host = self.HOST_ROWS.build(tds, server=self.name, attempt="N/A")
 
         # the last, hidden, span always contains an integer
-        bitmask = tds[2].findAll('span')[-1]
-
-        for number, name in self.bitmasks.iteritems():
-            n[name] = bool(int(bitmask.contents[0]) & number)
+        self.set_flags(new_host, tds[2].findAll('span')[-1].contents[0])
 
-        return n
+        return new_host
 
 
     def parse_service_row(self, tr):
         tds = tr('td')
-        n = {}
-        n["status"] = tds[2]['title']
+        new_service = self.SERVICE_ROWS.build(tds, server=self.name)
 
         host_bitmask = tds[1].findAll('span')
         if host_bitmask:
             # we got at least one hit, pick the last
             host_bitmask = host_bitmask[-1].contents[0]
-        n["host"] = tds[0]['id'].split('|')[-1]
-        n["name"] = tds[2]['id'].split('|')[-1]
-        n["last_check"] = str(tds[6].contents[0])
-        n["duration"] = str(tds[7].contents[0])
-        n["attempt"] = str(tds[8].contents[0])
-        n["status_information"] = str(tds[9].contents[0]).strip().replace("\n", " ").strip()
-        n["visible"] = True
 
         # the last, hidden, span always contains an integer
-        bitmask = tds[4].findAll('span')[-1]
-        for number, name in self.bitmasks.iteritems():
-            n[name] = bool(int(bitmask.contents[0]) & number)
+        self.set_flags(new_service, tds[4].findAll('span')[-1].contents[0])
 
-        return n, host_bitmask
+        return new_service, host_bitmask
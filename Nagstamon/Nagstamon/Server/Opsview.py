@@ -31,11 +31,26 @@ from Nagstamon.Objects import *
 from Nagstamon.Server.Generic import GenericServer
 
 
-class OpsviewService(GenericService):
+def upper(state):
     """
-    add Opsview specific service property to generic service class
+    states come in lower case from Opsview
     """
-    service_object_id = ""
+    return str(state.upper())
+
+
+def last_check_date(timestamp):
+    return datetime.fromtimestamp(int(timestamp)).strftime("%Y-%m-%d %H:%M:%S %z")
+
+
+def in_downtime(downtime):
+    return downtime == "2"
+
+
+def present(value):
+    """
+    some flags are only given if set
+    """
+    return True
 
 
 class OpsviewServer(GenericServer):
@@ -44,6 +59,28 @@ class OpsviewServer(GenericServer):
     """
     TYPE = 'Opsview'
 
+    # own _set_recheck() instead of send_commands() - Actions.RecheckAll rechecks item by item
+    RECHECK_BY_COMMANDS = False
+
+    # fields shared by hosts and services of REST status
+    REST_FIELDS = (("status", "state", upper),
+                   ("status_type", "state_type", str),
+                   ("last_check", "last_check", last_check_date),
+                   ("duration", "state_duration", Actions.HumanReadableDurationFromSeconds),
+                   ("attempt", ("current_check_attempt", "max_check_attempts"), attempts),
+                   ("status_information", "output", one_line),
+                   ("scheduled_downtime", "downtime", in_downtime))
+
+    REST_OPTIONAL_FIELDS = (("acknowledged", "acknowledged", present),
+                            ("flapping", "flapping", present))
+
+    REST_HOST_ROWS = RowMapping(GenericHost, (("name", "name", str),) + REST_FIELDS, optional=REST_OPTIONAL_FIELDS)
+
+    # extra opsview id for service, needed for submitting check results
+    REST_SERVICE_ROWS = RowMapping(GenericService, (("name", "name", None),
+                                                    ("service_object_id", "service_object_id", None)) + REST_FIELDS,
+                                   optional=REST_OPTIONAL_FIELDS)
+
     # Arguments available for submitting check results
     SUBMIT_CHECK_RESULT_ARGS = ["comment"]
 
@@ -211,48 +248,11 @@ class OpsviewServer(GenericServer):
 
             #for host in xmlobj.opsview.findAll("item"):
             for host in data["list"]:
-                self.new_hosts[host["name"]] = GenericHost()
-                self.new_hosts[host["name"]].name = str(host["name"])
-                self.new_hosts[host["name"]].server = self.name
-                # states come in lower case from Opsview
-                self.new_hosts[host["name"]].status = str(host["state"].upper())
-                self.new_hosts[host["name"]].status_type = str(host["state_type"])
-                self.new_hosts[host["name"]].last_check = datetime.fromtimestamp(int(host["last_check"])).strftime("%Y-%m-%d %H:%M:%S %z")
-                self.new_hosts[host["name"]].duration = Actions.HumanReadableDurationFromSeconds(host["state_duration"])
-                self.new_hosts[host["name"]].attempt = host["current_check_attempt"]+ "/" + host["max_check_attempts"]
-                self.new_hosts[host["name"]].status_information = host["output"].replace("\n", " ")
-
-                # if host is in downtime add it to known maintained hosts
-                if host["downtime"] == "2":
-                    self.new_hosts[host["name"]].scheduled_downtime = True
-                if host.has_key("acknowledged"):
-                    self.new_hosts[host["name"]].acknowledged = True
-                if host.has_key("flapping"):
-                    self.new_hosts[host["name"]].flapping = True
+                self.new_hosts[host["name"]] = self.REST_HOST_ROWS.build(host, server=self.name)
 
                 #services
                 for service in host["services"]:
-                    self.new_hosts[host["name"]].services[service["name"]] = OpsviewService()
-                    self.new_hosts[host["name"]].services[service["name"]].host = str(host["name"])
-                    self.new_hosts[host["name"]].services[service["name"]].name = service["name"]
-                    self.new_hosts[host["name"]].services[service["name"]].server = self.name
-
-                    # states come in lower case from Opsview
-                    self.new_hosts[host["name"]].services[service["name"]].status = service["state"].upper()
-                    self.new_hosts[host["name"]].services[service["name"]].status_type = service["state_type"]
-                    self.new_hosts[host["name"]].services[service["name"]].last_check = datetime.fromtimestamp(int(service["last_check"])).strftime("%Y-%m-%d %H:%M:%S %z")
-                    self.new_hosts[host["name"]].services[service["name"]].duration = Actions.HumanReadableDurationFromSeconds(service["state_duration"])
-                    self.new_hosts[host["name"]].services[service["name"]].attempt = service["current_check_attempt"]+ "/" + service["max_check_attempts"]
-                    self.new_hosts[host["name"]].services[service["name"]].status_information= service["output"].replace("\n", " ")
-                    if service["downtime"] == "2":
-                        self.new_hosts[host["name"]].services[service["name"]].scheduled_downtime = True
-                    if service.has_key("acknowledged"):
-                        self.new_hosts[host["name"]].services[service["name"]].acknowledged = True
-                    if service.has_key("flapping"):
-                        self.new_hosts[host["name"]].services[service["name"]].flapping = True
-
-                    # extra opsview id for service, needed for submitting check results
-                    self.new_hosts[host["name"]].services[service["name"]].service_object_id = service["service_object_id"]
+                    self.new_hosts[host["name"]].services[service["name"]] = self.REST_SERVICE_ROWS.build(service, server=self.name, host=str(host["name"]))
 
         except:
             # set checking flag back to False
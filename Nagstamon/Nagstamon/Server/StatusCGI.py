@@ -0,0 +1,200 @@
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+import codecs
+import htmlentitydefs
+from HTMLParser import HTMLParser
+
+
+def first_text(cell):
+    """
+    gives back first non-empty text of a cell or "" - what BeautifulSoup did with td(text=not_empty)[0]
+    """
+    if len(cell["texts"]) > 0:
+        return cell["texts"][0]
+    return ""
+
+
+def first_stripped(cell):
+    """
+    first text without surrounding whitespace
+    to fix http://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3280961&group_id=236865 attempts need
+    to be stripped
+    """
+    return first_text(cell).strip()
+
+
+def first_line(cell):
+    """
+    first text without line breaks, used for status information
+    """
+    return first_text(cell).replace("\n", " ").strip()
+
+
+def first_duration(cell):
+    """
+    only the largest unit of duration like "2d" of "0d 2h 3m 4s"
+    """
+    duration = first_text(cell)
+    for entity in duration.split():
+        if int(entity[:-1]) > 0:
+            return entity
+    return duration
+
+
+class StatusCGIParser(HTMLParser):
+    """
+        streaming parser for the table of class "status" in Nagios/Icinga status.cgi output
+        instead of building a whole BeautifulSoup tree of the page only the cells of the rows of
+        this table are collected and given back by parse() as soon as a row has been read
+        every row is a list of cells, every cell is a dictionary with its non-empty "texts"
+        as UTF-8 strings and the file names of its "icons"
+        table heads - the first row - get kicked out like before
+    """
+
+    # size of chunks read from socket
+    CHUNK_SIZE = 65536
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        # depth of nested tables - host and service cells contain tables too
+        self.table_depth = 0
+        # depth of status table, 0 as long as it has not been found
+        self.status_depth = 0
+        # only the first status table is of interest
+        self.status_done = False
+        # table heads are the first row
+        self.first_row = True
+        self.row = None
+        self.cell = None
+        self.text = []
+        # complete rows not yet given back
+        self.rows = []
+
+
+    def parse(self, stream):
+        """
+        generator yielding rows while reading stream, a file-like object as given back by urllib2
+        """
+        decoder = codecs.getincrementaldecoder("utf8")(errors="ignore")
+        try:
+            while not self.status_done:
+                chunk = stream.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.feed(decoder.decode(chunk))
+                while len(self.rows) > 0:
+                    yield self.rows.pop(0)
+            if not self.status_done:
+                self.feed(decoder.decode("", True))
+                try:
+                    self.close()
+                except:
+                    # broken HTML at end of page does not matter anymore
+                    pass
+                self._end_row()
+            while len(self.rows) > 0:
+                yield self.rows.pop(0)
+        finally:
+            stream.close()
+
+
+    def _flush_text(self):
+        """
+        text between tags becomes one text like a NavigableString in BeautifulSoup
+        """
+        if len(self.text) > 0:
+            text = u"".join(self.text).replace(u"\xa0", u" ").strip()
+            if text != "" and self.cell != None:
+                self.cell["texts"].append(text.encode("utf-8"))
+            self.text = []
+
+
+    def _end_cell(self):
+        if self.cell != None and self.row != None:
+            self.row.append(self.cell)
+        self.cell = None
+
+
+    def _end_row(self):
+        self._end_cell()
+        if self.row != None:
+            if self.first_row == True:
+                self.first_row = False
+            else:
+                self.rows.append(self.row)
+        self.row = None
+
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag == "table":
+            self.table_depth += 1
+            if self.status_depth == 0 and not self.status_done and dict(attrs).get("class") == "status":
+                self.status_depth = self.table_depth
+        elif tag == "tr" and self.status_depth != 0 and self.table_depth == self.status_depth:
+            # some rows have no end tag
+            self._end_row()
+            self.row = []
+        elif tag == "td" and self.row != None and self.table_depth == self.status_depth:
+            self._end_cell()
+            self.cell = {"texts":[], "icons":[]}
+        elif tag == "img" and self.cell != None:
+            src = dict(attrs).get("src")
+            if src:
+                self.cell["icons"].append(src.split("/")[-1])
+
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if self.status_depth != 0 and self.table_depth == self.status_depth:
+            if tag == "table":
+                self._end_row()
+                self.status_depth = 0
+                self.status_done = True
+            elif tag == "tr":
+                self._end_row()
+            elif tag == "td":
+                self._end_cell()
+        if tag == "table" and self.table_depth > 0:
+            self.table_depth -= 1
+
+
+    def handle_data(self, data):
+        if self.cell != None:
+            self.text.append(data)
+
+
+    def handle_entityref(self, name):
+        if self.cell != None:
+            if name in htmlentitydefs.name2codepoint:
+                self.text.append(unichr(htmlentitydefs.name2codepoint[name]))
+            else:
+                self.text.append(u"&%s;" % (name))
+
+
+    def handle_charref(self, name):
+        if self.cell != None:
+            try:
+                if name.lower().startswith("x"):
+                    self.text.append(unichr(int(name[1:], 16)))
+                else:
+                    self.text.append(unichr(int(name)))
+            except:
+                self.text.append(u"&#%s;" % (name))
@@ -18,7 +18,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
 
-from Nagstamon.Server.Generic import GenericServer
+from Nagstamon.Server.Generic import GenericServer, replace_objects
 import sys
 import cookielib
 import base64
@@ -26,18 +26,16 @@ import json
 import datetime
 import urllib
 import copy
-
-# to let Linux distributions use their own BeautifulSoup if existent try importing local BeautifulSoup first
-# see https://sourceforge.net/tracker/?func=detail&atid=1101370&aid=3302612&group_id=236865
-try:
-    from BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
-except:
-    from Nagstamon.thirdparty.BeautifulSoup import BeautifulSoup, BeautifulStoneSoup
+import time
 
 from Nagstamon.Actions import HostIsFilteredOutByRE, ServiceIsFilteredOutByRE, StatusInformationIsFilteredOutByRE, not_empty
 from Nagstamon.Objects import *
 
 
+def last_check_date(timestamp):
+    return datetime.datetime.fromtimestamp(int(timestamp)).isoformat(" ")
+
+
 class ThrukServer(GenericServer):
     """
         Thruk is derived from generic (Nagios) server
@@ -86,9 +84,34 @@ class ThrukServer(GenericServer):
     # Arguments available for submitting check results
     SUBMIT_CHECK_RESULT_ARGS = ["check_output", "performance_data"]
 
-    STATES_MAPPING = {"hosts" : {0 : "OK", 1 : "DOWN", 2 : "UNREACHABLE"},\
+    STATES_MAPPING = {"hosts" : {0 : "UP", 1 : "DOWN", 2 : "UNREACHABLE"},\
                       "services" : {0 : "OK", 1 : "WARNING",  2 : "CRITICAL", 3 : "UNKNOWN"}}
 
+    # seconds added to the time since last poll for delta polls to be sure not to miss anything
+    DELTA_OVERLAP = 30
+
+    # bulk commands of cmd.cgi as used by multi-select of Thruk status page
+    QUICK_COMMANDS = {"recheck": "1", "downtime": "2", "acknowledge": "4"}
+
+    # JSON columns of hosts and services as requested in init_config()
+    JSON_FIELDS = (("last_check", "last_check", last_check_date),
+                   ("duration", "last_state_change", Actions.HumanReadableDurationFromTimestamp),
+                   ("attempt", ("current_attempt", "max_check_attempts"), attempts),
+                   ("status_information", "plugin_output", one_line),
+                   ("passiveonly", "active_checks_enabled", inverted_flag),
+                   ("notifications_disabled", "notifications_enabled", inverted_flag),
+                   ("flapping", "is_flapping", flag),
+                   ("acknowledged", "acknowledged", flag),
+                   ("scheduled_downtime", "scheduled_downtime_depth", flag),
+                   ("status_type", "state_type", {0: "soft", 1: "hard"}.__getitem__))
+
+    JSON_HOST_ROWS = RowMapping(GenericHost, (("name", "name", None),
+                                              ("status", "state", STATES_MAPPING["hosts"].__getitem__)) + JSON_FIELDS)
+
+    JSON_SERVICE_ROWS = RowMapping(GenericService, (("host", "host_name", None),
+                                                    ("name", "description", None),
+                                                    ("status", "state", STATES_MAPPING["services"].__getitem__)) + JSON_FIELDS)
+
 
     def __init__(self, **kwds):
         GenericServer.__init__(self, **kwds)
@@ -171,12 +194,30 @@ class ThrukServer(GenericServer):
         # new_hosts dictionary
         self.new_hosts = dict()
 
+        # delta polls ask for hosts/services of all states whose state changed or which were checked since
+        # last poll - checks bring soft to hard changes, attempts and plugin output
+        # "duration" and relative "last check" are measured by Thruk itself so clocks need not be in sync,
+        # filters s0 and s1 are or'ed
+        delta = self.is_delta_poll()
+        poll_time = time.time()
+        if delta == True:
+            since = int(poll_time - self.last_poll_time) + self.DELTA_OVERLAP
+            delta_filter = "&" + urllib.urlencode([("dfl_s0_type", "duration"), ("dfl_s0_op", "<="), ("dfl_s0_value", since),\
+                                                  ("dfl_s1_type", "last check"), ("dfl_s1_op", ">="), ("dfl_s1_value", "-%is" % (since))])
+            cgiurl_hosts = self.cgiurl_hosts.replace("hoststatustypes=12", "hoststatustypes=15") + delta_filter
+            cgiurl_services = self.cgiurl_services.replace("servicestatustypes=28", "servicestatustypes=31") + delta_filter
+        else:
+            cgiurl_hosts = self.cgiurl_hosts
+            cgiurl_services = self.cgiurl_services
+        # names of hosts whose own state is part of a delta poll
+        changed_hosts = list()
+
         # hosts - mostly the down ones
         # unfortunately the hosts status page has a different structure so
         # hosts must be analyzed separately
         try:
             # JSON experiments
-            result = self.FetchURL(self.cgiurl_hosts, giveback="raw")
+            result = self.FetchURL(cgiurl_hosts, giveback="raw", conditional=not delta)
             jsonraw, error = copy.deepcopy(result.result), copy.deepcopy(result.error)
             if error != "": return Result(result=jsonraw, error=error)
 
@@ -190,22 +231,9 @@ class ThrukServer(GenericServer):
                 hosts = json.loads(jsonraw)
 
                 for h in hosts:
+                    changed_hosts.append(h["name"])
                     if not self.new_hosts.has_key(h["name"]):
-                        ###new_host = h["name"]
-                        self.new_hosts[h["name"]] = GenericHost()
-                        self.new_hosts[h["name"]].name = h["name"]
-                        self.new_hosts[h["name"]].server = self.name
-                        self.new_hosts[h["name"]].status = self.STATES_MAPPING["hosts"][h["state"]]
-                        self.new_hosts[h["name"]].last_check = datetime.datetime.fromtimestamp(int(h["last_check"])).isoformat(" ")
-                        self.new_hosts[h["name"]].duration = Actions.HumanReadableDurationFromTimestamp(h["last_state_change"])
-                        self.new_hosts[h["name"]].attempt = "%s/%s" % (h["current_attempt"], h["max_check_attempts"])
-                        self.new_hosts[h["name"]].status_information= h["plugin_output"].encode("utf-8").replace("\n", " ").strip()
-                        self.new_hosts[h["name"]].passiveonly = not(bool(int(h["active_checks_enabled"])))
-                        self.new_hosts[h["name"]].notifications_disabled = bool(int(h["is_flapping"]))
-                        self.new_hosts[h["name"]].flapping = bool(int(h["is_flapping"]))
-                        self.new_hosts[h["name"]].acknowledged = bool(int(h["acknowledged"]))
-                        self.new_hosts[h["name"]].scheduled_downtime = bool(int(h["scheduled_downtime_depth"]))
-                        self.new_hosts[h["name"]].status_type =  {0: "soft", 1: "hard"}[h["state_type"]]
+                        self.new_hosts[h["name"]] = self.JSON_HOST_ROWS.build(h, server=self.name)
                     del h
         except:
             # set checking flag back to False
@@ -217,7 +245,7 @@ class ThrukServer(GenericServer):
         try:
 
             # JSON experiments
-            result = self.FetchURL(self.cgiurl_services, giveback="raw")
+            result = self.FetchURL(cgiurl_services, giveback="raw", conditional=not delta)
             jsonraw, error = copy.deepcopy(result.result), copy.deepcopy(result.error)
 
             if error != "": return Result(result=jsonraw, error=error)
@@ -234,35 +262,40 @@ class ThrukServer(GenericServer):
                 for s in services:
                     # host objects contain service objects
                     if not self.new_hosts.has_key(s["host_name"]):
-                        self.new_hosts[s["host_name"]] = GenericHost()
-                        self.new_hosts[s["host_name"]].name = s["host_name"]
-                        self.new_hosts[s["host_name"]].server = self.name
-                        self.new_hosts[s["host_name"]].status = "UP"
+                        self.new_hosts[s["host_name"]] = GenericHost(name=s["host_name"], server=self.name, status="UP")
 
                     # if a service does not exist create its object
                     if not self.new_hosts[s["host_name"]].services.has_key(s["description"]):
-                        ###new_service = s["description"]
-                        self.new_hosts[s["host_name"]].services[s["description"]] = GenericService()
-                        self.new_hosts[s["host_name"]].services[s["description"]].host = s["host_name"]
-                        self.new_hosts[s["host_name"]].services[s["description"]].name = s["description"]
-                        self.new_hosts[s["host_name"]].services[s["description"]].server = self.name
-                        self.new_hosts[s["host_name"]].services[s["description"]].status = self.STATES_MAPPING["services"][s["state"]]
-                        self.new_hosts[s["host_name"]].services[s["description"]].last_check = datetime.datetime.fromtimestamp(int(s["last_check"])).isoformat(" ")
-                        self.new_hosts[s["host_name"]].services[s["description"]].duration = Actions.HumanReadableDurationFromTimestamp(s["last_state_change"])
-                        self.new_hosts[s["host_name"]].services[s["description"]].attempt = "%s/%s" % (s["current_attempt"], s["max_check_attempts"])
-                        self.new_hosts[s["host_name"]].services[s["description"]].status_information = s["plugin_output"].encode("utf-8").replace("\n", " ").strip()
-                        self.new_hosts[s["host_name"]].services[s["description"]].passiveonly = not(bool(int(s["active_checks_enabled"])))
-                        self.new_hosts[s["host_name"]].services[s["description"]].notifications_disabled = not(bool(int(s["notifications_enabled"])))
-                        self.new_hosts[s["host_name"]].services[s["description"]].flapping = bool(int(s["is_flapping"]))
-                        self.new_hosts[s["host_name"]].services[s["description"]].acknowledged = bool(int(s["acknowledged"]))
-                        self.new_hosts[s["host_name"]].services[s["description"]].scheduled_downtime = bool(int(s["scheduled_downtime_depth"]))
-                        self.new_hosts[s["host_name"]].services[s["description"]].status_type = {0: "soft", 1: "hard"}[s["state_type"]]
-                        del s
+                        self.new_hosts[s["host_name"]].services[s["description"]] = self.JSON_SERVICE_ROWS.build(s, server=self.name)
+                    del s
         except:
             # set checking flag back to False
             self.isChecking = False
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
+        if delta == True:
+            self.merge_delta(self.new_hosts, changed_hosts)
+        self.delta_poll_done(delta, poll_time)
+
         #dummy return in case all is OK
         return Result()
+
+
+    def _send_command_batch(self, command, params, items):
+        """
+        Thruk cmd.cgi runs one command for all hosts and services given as selected_hosts and
+        selected_services like its status page does - every item gets the result of this one request
+        a failed request is not sent again item by item as the monitor might have run the command
+        nevertheless, which would duplicate acknowledgements, comments and downtimes
+        """
+        self._prepare_command_batch(command, items)
+        hosts = [host for host, service in items if service == ""]
+        services = ["%s;%s" % (host, service) for host, service in items if service != ""]
+        # Thruk chooses host or service command type itself
+        fields = [f for f in self._command_fields(command, items[0][0], items[0][1], params) if f[0] != "cmd_typ"]
+        fields = replace_objects(fields, [("selected_hosts", ",".join(hosts)),\
+                                          ("selected_services", ",".join(services)),\
+                                          ("quick_command", self.QUICK_COMMANDS[command])])
+        result = self.FetchURL(self.monitor_cgi_url + "/cmd.cgi", giveback="raw", cgi_data=urllib.urlencode(fields))
+        return dict(((command, host, service), result) for host, service in items)
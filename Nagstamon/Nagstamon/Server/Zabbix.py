@@ -31,6 +31,7 @@
 
 import sys
 import urllib
+import urllib2
 import base64
 import time
 import datetime
@@ -41,6 +42,40 @@ from Nagstamon.Server.Generic import GenericServer
 from Nagstamon.thirdparty.zabbix_api import ZabbixAPI, ZabbixAPIException
 
 
+# host availability and trigger priorities
+STATEMAP = {
+    'UNREACH': 'UNREACHABLE',
+    'CRIT': 'CRITICAL',
+    'WARN': 'WARNING',
+    'UNKN': 'UNKNOWN',
+    'PEND': 'PENDING',
+    '0': 'OK',
+    '1': 'UNKNOWN',
+    '2': 'WARNING',
+    '5': 'CRITICAL',
+    '3': 'WARNING',
+    '4': 'CRITICAL'}
+
+
+def nagios_esque(description):
+    """
+    next dirty workaround to get Zabbix events to look Nagios-esque
+    """
+    if (" on " or " is ") in description:
+        for separator in [" on ", " is "]:
+            description = description.split(separator)[0]
+    return description
+
+
+def trigger_host(trigger):
+    """
+    name of host of trigger - expandData gives it directly, selectHosts as list
+    """
+    if trigger.has_key('host'):
+        return trigger['host']
+    return trigger['hosts'][0]['host']
+
+
 class ZabbixError(Exception):
     def __init__(self, terminate, result):
         self.terminate = terminate
@@ -52,8 +87,14 @@ class ZabbixServer(GenericServer):
        special treatment for Zabbix, taken from Check_MK Multisite JSON API
     """
     TYPE = 'Zabbix'
+
+    # own _set_recheck() instead of send_commands() - Actions.RecheckAll rechecks item by item
+    RECHECK_BY_COMMANDS = False
     zapi = None
 
+    # seconds subtracted from last trigger change for delta polls to be sure not to miss anything
+    DELTA_OVERLAP = 30
+
     # A Monitor CGI URL is not necessary so hide it in settings
     # autologin is used only by Centreon
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
@@ -64,112 +105,117 @@ class ZabbixServer(GenericServer):
                          "input_checkbutton_use_display_name_host",
                          "input_checkbutton_use_display_name_service"]
 
+    HOST_ROWS = RowMapping(GenericHost, (("name", "host", None),
+                                         ("status", "available", mapped(STATEMAP)),
+                                         ("duration", "errors_from", Actions.HumanReadableDurationFromTimestamp),
+                                         ("status_information", "error", None),
+                                         ("address", "host", None)))
+
+    SERVICE_ROWS = RowMapping(GenericService, (("host", "host", None),
+                                               ("name", "description", nagios_esque),
+                                               ("status", "priority", mapped(STATEMAP)),
+                                               ("duration", "lastchange", Actions.HumanReadableDurationFromTimestamp),
+                                               ("status_information", "description", None),
+                                               ("address", "host", None),
+                                               ("triggerid", "triggerid", None)))
+
 
     def __init__(self, **kwds):
         GenericServer.__init__(self, **kwds)
 
         # Prepare all urls needed by nagstamon -
         self.urls = {}
-        self.statemap = {}
 
         # Entries for monitor default actions in context menu
         self.MENU_ACTIONS = ["Recheck", "Acknowledge", "Downtime"]
         self.username = self.conf.servers[self.get_name()].username
         self.password = self.conf.servers[self.get_name()].password
+        # latest trigger change seen, used as monitor clock for delta polls
+        self.monitor_time = 0
 
 
     def _login(self):
         try:
-            self.zapi = ZabbixAPI(server=self.monitor_url, path="", log_level=0)
+            # keep-alive connections of server pool
+            self.zapi = ZabbixAPI(server=self.monitor_url, path="", log_level=0,
+                                  opener=urllib2.build_opener(self.http_handler, self.https_handler))
             self.zapi.login(self.username, self.password)
+            # new session might be another server version or user
+            self.metadata_cache.clear()
         except ZabbixAPIException:
             result, error = self.Error(sys.exc_info())
             return Result(result=result, error=error)
 
 
-    def init_HTTP(self):
-
-        self.statemap = {
-            'UNREACH': 'UNREACHABLE',
-            'CRIT': 'CRITICAL',
-            'WARN': 'WARNING',
-            'UNKN': 'UNKNOWN',
-            'PEND': 'PENDING',
-            '0': 'OK',
-            '1': 'UNKNOWN',
-            '2': 'WARNING',
-            '5': 'CRITICAL',
-            '3': 'WARNING',
-            '4': 'CRITICAL'}
-        GenericServer.init_HTTP(self)
+    def _get_hostgroup_ids(self):
+        """
+        ids of hostgroups used as filter - only ids are cached, availability of hosts is live and
+        comes with every full poll
+        """
+        # only without filter there is anything shown at all
+        #hostgroup_ids = [x['groupid'] for x in self.zapi.hostgroup.get(
+        #    {'output': 'extend',
+        #     'with_monitored_items': True,
+        #     'filter': {"name": group_list}}) if int(x['internal']) == 0]
+        return [x['groupid'] for x in self.zapi.hostgroup.get({'output': ['groupid', 'internal'], 'with_monitored_items': True})\
+                if int(x['internal']) == 0]
 
 
     def _get_status(self):
         """
-        Get status from Nagios Server
+        Get status from Zabbix Server - all hosts with their availability and all problem triggers with
+        their hosts and expanded descriptions in one batch request, delta polls only ask for triggers
+        changed since last poll including recovered ones and keep availability of hosts of last full poll
         """
         ret = Result()
-        # create Nagios items dictionary with to lists for services and hosts
-        # every list will contain a dictionary for every failed service/host
-        # this dictionary is only temporarily
-        nagitems = {"services": [], "hosts": []}
 
         # Create URLs for the configured filters
         if self.zapi is None:
             self._login()
 
-        try:
-            hosts = []
-            try:
-                hosts = self.zapi.host.get(
-                    {"output": ["host", "ip", "status", "available", "error", "errors_from"], "filter": {}})
-            except:
-                # set checking flag back to False
-                self.isChecking = False
-                result, error = self.Error(sys.exc_info())
-                return Result(result=result, error=error)
-
-            for host in hosts:
-                n = {
-                    'host': host['host'],
-                    'status': self.statemap.get(host['available'], host['available']),
-                    'last_check': 'n/a',
-                    'duration': Actions.HumanReadableDurationFromTimestamp(host['errors_from']),
-                    'status_information': host['error'],
-                    'attempt': '1/1',
-                    'site': '',
-                    'address': host['host'],
-                }
-
-                # add dictionary full of information about this host item to nagitems
-                nagitems["hosts"].append(n)
-                # after collection data in nagitems create objects from its informations
-                # host objects contain service objects
-                if n["host"] not in self.new_hosts:
-                    new_host = n["host"]
-                    self.new_hosts[new_host] = GenericHost()
-                    self.new_hosts[new_host].name = n["host"]
-                    self.new_hosts[new_host].status = n["status"]
-                    self.new_hosts[new_host].last_check = n["last_check"]
-                    self.new_hosts[new_host].duration = n["duration"]
-                    self.new_hosts[new_host].attempt = n["attempt"]
-                    self.new_hosts[new_host].status_information = n["status_information"]
-                    self.new_hosts[new_host].site = n["site"]
-                    self.new_hosts[new_host].address = n["address"]
-        except ZabbixError:
-            self.isChecking = False
-            result, error = self.Error(sys.exc_info())
-            return Result(result=result, error=error)
+        delta = self.is_delta_poll() and self.monitor_time > 0
+        poll_time = time.time()
+        # names of hosts whose own state is part of a delta poll
+        changed_hosts = list()
 
-        # services
-        services = []
-        groupids = []
-        zabbix_triggers = []
         try:
-            api_version = self.zapi.api_version()
-        except ZabbixAPIException:
-            # FIXME Is there a cleaner way to handle this? I just borrowed
-            # this code from 80 lines ahead. -- AGV
+            api_version = self.cached("api_version", self.zapi.api_version)
+            if self.monitor_cgi_url:
+                hostgroup_ids = self.cached("hostgroup_ids", self._get_hostgroup_ids)
+
+            params = {'output': 'extend',
+                      'expandDescription': True,
+                      'expandData': True,
+                      'sortfield': 'lastchange',
+                      'withLastEventUnacknowledged': True,
+                      'monitored': True}
+            if api_version <= '1.8':
+                # status information is made of item values
+                params['select_items'] = 'extend'
+            else:
+                params['selectHosts'] = ['host']
+            if self.monitor_cgi_url:
+                params['groupids'] = hostgroup_ids
+            if delta == True:
+                # recovered triggers are needed too for removing them
+                params['lastChangeSince'] = self.monitor_time - self.DELTA_OVERLAP
+            else:
+                params['filter'] = {'value': 1}
+
+            if delta == False:
+                hosts, services = self.zapi.do_batch([("host.get", {"output": ["host", "available", "error", "errors_from"],\
+                                                                    "filter": {}}),\
+                                                      ("trigger.get", params)])
+                for host in hosts:
+                    # host objects contain service objects
+                    if host['host'] not in self.new_hosts:
+                        self.new_hosts[host['host']] = self.HOST_ROWS.build(host, last_check='n/a', attempt='1/1', site='')
+            else:
+                services = self.zapi.trigger.get(params)
+            if type(services) is dict:
+                services = services.values()
+
+        except:
             # set checking flag back to False
             self.isChecking = False
             result, error = self.Error(sys.exc_info())
@@ -177,129 +223,30 @@ class ZabbixServer(GenericServer):
             return Result(result=result, error=error)
 
         try:
-            response = []
-            try:
-                #service = self.zapi.trigger.get({"select_items":"extend","monitored":1,"only_true":1,"min_severity":3,"output":"extend","filter":{}})
-
-                triggers_list = []
-                if self.monitor_cgi_url:
-                    group_list = self.monitor_cgi_url.split(',')
-
-                    #hostgroup_ids = [x['groupid'] for x in self.zapi.hostgroup.get(
-                    #    {'output': 'extend',
-                    #     'with_monitored_items': True,
-                    #     'filter': {"name": group_list}}) if int(x['internal']) == 0]
-
-                    # only without filter there is anything shown at all
-                    hostgroup_ids = [x['groupid'] for x in self.zapi.hostgroup.get(
-                                    {'output': 'extend', 'with_monitored_items': True})
-                                    if int(x['internal']) == 0]
-
-                    zabbix_triggers = self.zapi.trigger.get(
-                        {'sortfield': 'lastchange', 'withLastEventUnacknowledged': True, 'groupids': hostgroup_ids,
-                         "monitored": True, "filter": {'value': 1}})
-                else:
-                    zabbix_triggers = self.zapi.trigger.get(
-                        {'sortfield': 'lastchange', 'withLastEventUnacknowledged': True, "monitored": True,
-                         "filter": {'value': 1}})
-                triggers_list = []
-
-                for trigger in zabbix_triggers:
-                    triggers_list.append(trigger.get('triggerid'))
-                this_trigger = self.zapi.trigger.get(
-                    {'triggerids': triggers_list,
-                     'expandDescription': True,
-                     'output': 'extend',
-                     'select_items': 'extend',
-                     'expandData': True}
-                )
-                if type(this_trigger) is dict:
-                    for triggerid in this_trigger.keys():
-                        services.append(this_trigger[triggerid])
-                elif type(this_trigger) is list:
-                    for trigger in this_trigger:
-                        services.append(trigger)
-
-            except ZabbixAPIException:
-                # FIXME Is there a cleaner way to handle this? I just borrowed
-                # this code from 80 lines ahead. -- AGV
-                # set checking flag back to False
-                self.isChecking = False
-                result, error = self.Error(sys.exc_info())
-                print sys.exc_info()
-                return Result(result=result, error=error)
-
-            except ZabbixError, e:
-                #print "------------------------------------"
-                #print "%s" % e.result.error
-                if e.terminate:
-                    return e.result
-                else:
-                    service = e.result.content
-                    ret = e.result
-
             for service in services:
-                if api_version > '1.8':
-                    state = '%s' % service['description']
-                else:
-                    state = '%s=%s' % (service['items'][0]['key_'], service['items'][0]['lastvalue'])
-                n = {
-                    'host': service['host'],
-                    'service': service['description'],
-                    'status': self.statemap.get(service['priority'], service['priority']),
-                    # 1/1 attempt looks at least like there has been any attempt
-                    'attempt': '1/1',
-                    'duration': Actions.HumanReadableDurationFromTimestamp(service['lastchange']),
-                    'status_information': state,
-                    'passiveonly': 'no',
-                    'last_check': 'n/a',
-                    'notifications': 'yes',
-                    'flapping': 'no',
-                    'site': '',
-                    'command': 'zabbix',
-                    'triggerid': service['triggerid'],
-                }
-
-                nagitems["services"].append(n)
-                # after collection data in nagitems create objects of its informations
+                self.monitor_time = max(self.monitor_time, int(service['lastchange']))
+                service['host'] = trigger_host(service)
                 # host objects contain service objects
-                if n["host"] not in  self.new_hosts:
-                    self.new_hosts[n["host"]] = GenericHost()
-                    self.new_hosts[n["host"]].name = n["host"]
-                    self.new_hosts[n["host"]].status = "UP"
-                    self.new_hosts[n["host"]].site = n["site"]
-                    self.new_hosts[n["host"]].address = n["host"]
-                    # if a service does not exist create its object
-                if n["service"] not in  self.new_hosts[n["host"]].services:
+                if service['host'] not in self.new_hosts:
+                    self.new_hosts[service['host']] = GenericHost(name=service['host'], status="UP", site='', address=service['host'])
+                # if a service does not exist create its object
+                if service['description'] not in self.new_hosts[service['host']].services:
                     # workaround for non-existing (or not found) host status flag
-                    if n["service"] == "Host is down %s" % (n["host"]):
-                        self.new_hosts[n["host"]].status = "DOWN"
-                        # also take duration from "service" aka trigger
-                        self.new_hosts[n["host"]].duration = n["duration"]
+                    if service['description'] == "Host is down %s" % (service['host']):
+                        if str(service['value']) == '1':
+                            self.new_hosts[service['host']].status = "DOWN"
+                            # also take duration from "service" aka trigger
+                            self.new_hosts[service['host']].duration = Actions.HumanReadableDurationFromTimestamp(service['lastchange'])
+                        changed_hosts.append(service['host'])
                     else:
-                        new_service = n["service"]
-                        self.new_hosts[n["host"]].services[new_service] = GenericService()
-                        self.new_hosts[n["host"]].services[new_service].host = n["host"]
-
-                        # next dirty workaround to get Zabbix events to look Nagios-esque
-                        if (" on " or " is ") in n["service"]:
-                            for separator in [" on ", " is "]:
-                                n["service"] = n["service"].split(separator)[0]
-                        self.new_hosts[n["host"]].services[new_service].name = n["service"]
-
-                        self.new_hosts[n["host"]].services[new_service].status = n["status"]
-                        self.new_hosts[n["host"]].services[new_service].last_check = n["last_check"]
-                        self.new_hosts[n["host"]].services[new_service].duration = n["duration"]
-                        self.new_hosts[n["host"]].services[new_service].attempt = n["attempt"]
-                        self.new_hosts[n["host"]].services[new_service].status_information = n["status_information"]
-                        #self.new_hosts[n["host"]].services[new_service].passiveonly = n["passiveonly"]
-                        self.new_hosts[n["host"]].services[new_service].passiveonly = False
-                        #self.new_hosts[n["host"]].services[new_service].flapping = n["flapping"]
-                        self.new_hosts[n["host"]].services[new_service].flapping = False
-                        self.new_hosts[n["host"]].services[new_service].site = n["site"]
-                        self.new_hosts[n["host"]].services[new_service].address = n["host"]
-                        self.new_hosts[n["host"]].services[new_service].command = n["command"]
-                        self.new_hosts[n["host"]].services[new_service].triggerid = n["triggerid"]
+                        # 1/1 attempt looks at least like there has been any attempt
+                        new_service = self.SERVICE_ROWS.build(service, last_check='n/a', attempt='1/1', site='', command='zabbix')
+                        if api_version <= '1.8':
+                            new_service.status_information = '%s=%s' % (service['items'][0]['key_'], service['items'][0]['lastvalue'])
+                        # recovered since last poll
+                        if str(service['value']) != '1':
+                            new_service.status = "OK"
+                        self.new_hosts[service['host']].services[service['description']] = new_service
         except (ZabbixError, ZabbixAPIException):
             # set checking flag back to False
             self.isChecking = False
@@ -307,6 +254,10 @@ class ZabbixServer(GenericServer):
             print sys.exc_info()
             return Result(result=result, error=error)
 
+        if delta == True:
+            self.merge_delta(self.new_hosts, changed_hosts)
+        self.delta_poll_done(delta, poll_time)
+
         return ret
 
     def GetHost(self, host):
@@ -382,7 +333,7 @@ class ZabbixServer(GenericServer):
         self._set_acknowledge(thread_obj.host, ack_service, thread_obj.author, thread_obj.comment,\
                               thread_obj.sticky, thread_obj.notify, thread_obj.persistent, all_services)
         # resfresh immediately according to https://github.com/HenriWahl/Nagstamon/issues/86
-        self.thread.doRefresh = True
+        self.scheduler.Trigger(self)
 
     def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services=[]):
         triggerid = self.hosts[host].services[service].triggerid
@@ -22,12 +22,15 @@ import json
 import urllib
 import datetime
 import time
+import threading
+import itertools
+import Queue
 
 from datetime import datetime
 
 from Nagstamon import Actions
 from Nagstamon.Objects import *
-from Nagstamon.Server.Generic import GenericServer, not_empty
+from Nagstamon.Server.Generic import GenericServer, not_empty, load_json
 
 
 def human_duration(start):
@@ -58,6 +61,22 @@ def human_duration(start):
     return ret
 
 
+STATUS_SVC_MAPPING = {'0':'OK', '1':'WARNING', '2':'CRITICAL', '3':'UNKNOWN'}
+STATUS_HOST_MAPPING = {'0':'UP', '1':'DOWN', '2':'UNREACHABLE'}
+
+
+def host_status(state):
+    return STATUS_HOST_MAPPING[str(state)]
+
+
+def service_status(state):
+    return STATUS_SVC_MAPPING[str(state)]
+
+
+def last_check_date(timestamp):
+    return datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m-%d %H:%M:%S')
+
+
 class Op5MonitorServer(GenericServer):
     """
         object of Nagios server - when nagstamon will be able to poll various servers this
@@ -66,7 +85,6 @@ class Op5MonitorServer(GenericServer):
     """
 
     TYPE = 'op5Monitor'
-    api_count='/api/filter/count/?query='
     api_query='/api/filter/query/?query='
     api_cmd='/api/command'
 
@@ -102,18 +120,65 @@ class Op5MonitorServer(GenericServer):
     api_svc_col.append('scheduled_downtime_depth')
     api_svc_col.append('state')
 
+    # queries are fetched in pages by offset so they need a stable order by unique keys,
+    # otherwise a page might repeat or skip rows of another one
+    api_host_sort='&sort=name'
+    api_svc_sort='&sort=host.name,description'
+
     api_default_svc_query='[services] state !=0'
     api_default_svc_query+=' or host.state != 0'
     api_default_svc_query+='&columns=%s' % (','.join(api_svc_col))
+    api_default_svc_query+=api_svc_sort
     api_default_svc_query+='&format=json'
 
     api_default_host_query='[hosts] state !=0'
     api_default_host_query+='&columns=%s' % (','.join(api_host_col))
+    api_default_host_query+=api_host_sort
     api_default_host_query+='&format=json'
 
     api_default_host_query = api_default_host_query.replace(" ", "%20")
     api_default_svc_query = api_default_svc_query.replace(" ", "%20")
 
+    # delta polls ask for hosts/services of all states whose state changed or which were checked since
+    # given time - checks bring soft to hard changes, attempts and plugin output
+    api_delta_host_query='[hosts] last_state_change >= %(since)i'
+    api_delta_host_query+=' or last_check >= %(since)i'
+    api_delta_host_query+='&columns=%s' % (','.join(api_host_col))
+    api_delta_host_query+=api_host_sort
+    api_delta_host_query+='&format=json'
+
+    api_delta_svc_query='[services] last_state_change >= %(since)i'
+    api_delta_svc_query+=' or last_check >= %(since)i'
+    api_delta_svc_query+=' or host.last_state_change >= %(since)i'
+    api_delta_svc_query+='&columns=%s' % (','.join(api_svc_col))
+    api_delta_svc_query+=api_svc_sort
+    api_delta_svc_query+='&format=json'
+
+    # seconds subtracted from monitor time of last poll for delta polls to be sure not to miss anything
+    DELTA_OVERLAP = 30
+
+    # rows per request, further pages are fetched in parallel by connection_pool_size workers
+    API_PAGE_SIZE = 1000
+
+    # columns shared by api_host_col and api_svc_col
+    API_FIELDS = (("acknowledged", "acknowledged", flag),
+                  ("flapping", "is_flapping", flag),
+                  ("notifications_disabled", "notifications_enabled", inverted_flag),
+                  ("passiveonly", "active_checks_enabled", inverted_flag),
+                  ("scheduled_downtime", "scheduled_downtime_depth", flag),
+                  ("attempt", ("current_attempt", "max_check_attempts"), attempts),
+                  ("duration", "last_state_change", human_duration),
+                  ("last_check", "last_check", last_check_date),
+                  ("status_information", "plugin_output", one_line))
+
+    API_HOST_ROWS = RowMapping(GenericHost, (("name", "name", None),
+                                             ("status", "state", host_status),
+                                             ("status_type", "state", None)) + API_FIELDS)
+
+    API_SERVICE_ROWS = RowMapping(GenericService, (("host", "host", lambda host: host["name"]),
+                                                   ("name", "description", None),
+                                                   ("status", "state", service_status)) + API_FIELDS)
+
     # autologin is used only by Centreon
     DISABLED_CONTROLS = ["label_monitor_cgi_url",
                          "input_entry_monitor_cgi_url",
@@ -128,120 +193,59 @@ class Op5MonitorServer(GenericServer):
 
         # Entries for monitor default actions in context menu
         self.MENU_ACTIONS = ["Monitor", "Recheck", "Acknowledge", "Downtime"]
-        self.STATUS_SVC_MAPPING = {'0':'OK', '1':'WARNING', '2':'CRITICAL', '3':'UNKNOWN'}
-        self.STATUS_HOST_MAPPING = {'0':'UP', '1':'DOWN', '2':'UNREACHABLE'}
+        # latest last_check seen, used as monitor clock for delta polls
+        self.monitor_time = 0
 
 
     def _get_status(self):
         """
         Get status from op5 Monitor Server
         """
-        # create Nagios items dictionary with to lists for services and hosts
-        # every list will contain a dictionary for every failed service/host
-        # this dictionary is only temporarily
-        nagitems = {"hosts":[], "services":[]}
-
         # new_hosts dictionary
         self.new_hosts = dict()
 
+        # delta polls need monitor time of last poll - clocks of monitor and desktop might differ
+        delta = self.is_delta_poll() and self.monitor_time > 0
+        poll_time = time.time()
+        if delta == True:
+            since = {'since': self.monitor_time - self.DELTA_OVERLAP}
+            host_query = (self.api_delta_host_query % since).replace(" ", "%20")
+            svc_query = (self.api_delta_svc_query % since).replace(" ", "%20")
+        else:
+            host_query = self.api_default_host_query
+            svc_query = self.api_default_svc_query
+        # names of hosts whose own state is part of a delta poll
+        changed_hosts = list()
+
+        def add_host(api):
+            changed_hosts.append(api['name'])
+            self.monitor_time = max(self.monitor_time, int(api['last_check']))
+            if not self.new_hosts.has_key(api['name']):
+                self.new_hosts[api['name']] = self.API_HOST_ROWS.build(api)
+
+        def add_service(api):
+            host = api['host']['name']
+            self.monitor_time = max(self.monitor_time, int(api['last_check']))
+
+            if not self.new_hosts.has_key(host):
+                self.new_hosts[host] = GenericHost(name=host,
+                                                   status=host_status(api['host']['state']),
+                                                   passiveonly=inverted_flag(api['host']['active_checks_enabled']))
+
+            if not self.new_hosts[host].services.has_key(api['description']):
+                self.new_hosts[host].services[api['description']] = self.API_SERVICE_ROWS.build(api)
+
         # Fetch api listview with filters
         try:
-
             # Fetch Host info
-            result = self.FetchURL(self.monitor_url + self.api_count + self.api_default_host_query, giveback="raw")
-            data = json.loads(result.result)
-            if data['count']:
-                count = data['count']
-                result = self.FetchURL(self.monitor_url + self.api_query + self.api_default_host_query + '&limit=' + str(count), giveback="raw")
-                data = json.loads(result.result)
-                n = dict()
-                for api in data:
-                    n['host'] = api['name']
-                    n["acknowledged"] = api['acknowledged']
-                    n["flapping"] = api['is_flapping']
-                    n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
-                    n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
-                    n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
-                    n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
-                    n['duration'] = human_duration(api['last_state_change'])
-                    n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
-                    n['status'] = self.STATUS_HOST_MAPPING[str(api['state'])]
-                    n['status_information'] = api['plugin_output']
-                    n['status_type'] = api['state']
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].acknowledged = n["acknowledged"]
-                        self.new_hosts[n['host']].attempt = n['attempt']
-                        self.new_hosts[n['host']].duration = n['duration']
-                        self.new_hosts[n['host']].flapping = n["flapping"]
-                        self.new_hosts[n['host']].last_check = n['last_check']
-                        self.new_hosts[n['host']].notifications_disabled = n["notifications_disabled"]
-                        self.new_hosts[n['host']].passiveonly = n["passiveonly"]
-                        self.new_hosts[n['host']].scheduled_downtime = n["scheduled_downtime"]
-                        self.new_hosts[n['host']].status = n['status']
-                        self.new_hosts[n['host']].status_information = n['status_information'].replace("\n", " ").strip()
-                        self.new_hosts[n['host']].status_type = n['status_type']
-                    nagitems['hosts'].append(n)
-                del n
-
+            result = self._fetch_all(host_query, add_host)
+            if result.error != "":
+                return result
 
             # Fetch services info
-            result = self.FetchURL(self.monitor_url + self.api_count + self.api_default_svc_query, giveback="raw")
-            data = json.loads(result.result)
-            if data['count']:
-                count = data['count']
-                result = self.FetchURL(self.monitor_url + self.api_query + self.api_default_svc_query + '&limit=' + str(count), giveback="raw")
-                data = json.loads(result.result)
-                for api in data:
-                    n = dict()
-                    n['host'] = api['host']['name']
-                    n['status'] = self.STATUS_HOST_MAPPING[str(api['host']['state'])]
-                    n["passiveonly"] = 0 if api['host']['active_checks_enabled'] else 1
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].status = n['status']
-                        self.new_hosts[n['host']].passiveonly = n["passiveonly"]
-
-                    n['service'] = api['description']
-                    n["acknowledged"] = api['acknowledged']
-                    n["flapping"] = api['is_flapping']
-                    n["notifications_disabled"] = 0 if api['notifications_enabled'] else 1
-                    n["passiveonly"] = 0 if api['active_checks_enabled'] else 1
-                    n["scheduled_downtime"] = 1 if api['scheduled_downtime_depth'] else 0
-                    n['attempt'] = "%s/%s" % (str(api['current_attempt']), str(api['max_check_attempts']))
-                    n['duration'] = human_duration(api['last_state_change'])
-                    n['last_check'] = datetime.fromtimestamp(int(api['last_check'])).strftime('%Y-%m-%d %H:%M:%S')
-                    n['status_information'] = api['plugin_output']
-
-                    if not self.new_hosts.has_key(n['host']):
-                        self.new_hosts[n['host']] = GenericHost()
-                        self.new_hosts[n['host']].name = n['host']
-                        self.new_hosts[n['host']].status = n['status']
-
-                    if not self.new_hosts[n['host']].services.has_key(n['service']):
-                        n['status'] = self.STATUS_SVC_MAPPING[str(api['state'])]
-
-                        self.new_hosts[n['host']].services[n['service']] = GenericService()
-                        self.new_hosts[n['host']].services[n['service']].acknowledged = n['acknowledged']
-                        self.new_hosts[n['host']].services[n['service']].attempt = n['attempt']
-                        self.new_hosts[n['host']].services[n['service']].duration = n['duration']
-                        self.new_hosts[n['host']].services[n['service']].flapping = n['flapping']
-                        self.new_hosts[n['host']].services[n['service']].host = n['host']
-                        self.new_hosts[n['host']].services[n['service']].last_check = n['last_check']
-                        self.new_hosts[n['host']].services[n['service']].name = n['service']
-                        self.new_hosts[n['host']].services[n['service']].notifications_disabled = n["notifications_disabled"]
-                        self.new_hosts[n['host']].services[n['service']].passiveonly = n['passiveonly']
-                        self.new_hosts[n['host']].services[n['service']].scheduled_downtime = n['duration']
-                        self.new_hosts[n['host']].services[n['service']].scheduled_downtime = n['scheduled_downtime']
-                        self.new_hosts[n['host']].services[n['service']].status = n['status']
-                        self.new_hosts[n['host']].services[n['service']].status_information = n['status_information'].replace("\n", " ").strip()
-
-                    nagitems['services'].append(n)
-                return Result()
+            result = self._fetch_all(svc_query, add_service)
+            if result.error != "":
+                return result
         except:
             print "========================================== b0rked =========================================="
             self.isChecking = False
@@ -249,70 +253,128 @@ class Op5MonitorServer(GenericServer):
             print error
             return Result(result=result, error=error)
 
+        if delta == True:
+            self.merge_delta(self.new_hosts, changed_hosts)
+        self.delta_poll_done(delta, poll_time)
+
         return Result()
 
+    def _fetch_page(self, query, page):
+        """
+        fetch one page of listview query
+        """
+        url = self.monitor_url + self.api_query + query + '&limit=%i&offset=%i' % (self.API_PAGE_SIZE, page * self.API_PAGE_SIZE)
+        result = self.FetchURL(url, giveback="stream")
+        if result.error != "":
+            return result
+        try:
+            return Result(result=load_json(result.result))
+        finally:
+            result.result.close()
+
+
+    def _fetch_all(self, query, add):
+        """
+        fetch all rows of listview query page by page and give every row to add() - first page alone,
+        if it is full further pages in parallel over keep-alive connections
+        pages are added as they arrive and workers wait if more than one page per worker is queued
+        so only a few of them are in memory at once
+        rows of a live result set might still move between pages while fetching - repeated ones are
+        ignored by add() and the next poll catches skipped ones
+        """
+        result = self._fetch_page(query, 0)
+        if result.error != "":
+            return result
+        for api in result.result:
+            add(api)
+        if len(result.result) < self.API_PAGE_SIZE:
+            return Result()
+
+        workers = max(1, int(self.conf.connection_pool_size))
+        pages = Queue.Queue(maxsize=workers)
+        done = threading.Event()
+        counter = itertools.count(1)
+        lock = threading.Lock()
+        for i in range(workers):
+            Actions.PageWorker(server=self, query=query, counter=counter, lock=lock, done=done, pages=pages).start()
+
+        # rows are only added here so new_hosts is not touched by the workers
+        failed = Result()
+        while workers > 0:
+            result = pages.get()
+            if result == None:
+                workers -= 1
+            elif result.error != "":
+                if failed.error == "":
+                    failed = result
+            elif failed.error == "":
+                for api in result.result:
+                    add(api)
+        return failed
+
+
     def get_start_end(self, host):
         return time.strftime("%Y-%m-%d %H:%M"), time.strftime("%Y-%m-%d %H:%M", time.localtime(time.time() + 7200))
 
 
     def send_command(self, command, params=False):
+        """
+        POST command to API, gives back Result
+        """
         url = self.monitor_url + self.api_cmd + '/' + command
-        if 'service_description' in params.keys():
-            action = Actions.Action(
-                type="url-post",
-                string=url,
-                cgi_data=urllib.urlencode(params),
-                conf=self.conf,
-                server=self,
-                host=params["host_name"],
-                service=params["service_description"],
-            )
+        if str(self.conf.debug_mode) == "True":
+            self.Debug(server=self.get_name(), host=params["host_name"], debug="Submitting command: " + url)
+        return self.FetchURL(url, giveback="raw", cgi_data=urllib.urlencode(params))
+
+
+    def _send_command(self, command, host, service, params):
+        """
+        translate commands of GenericServer.send_commands() into API commands
+        """
+        params = dict(params)
+        params['host_name'] = host
+        if command == 'recheck':
+            params['check_time'] = int(time.time())
+            commands = ['SCHEDULE_HOST_CHECK', 'SCHEDULE_SVC_CHECK']
+        elif command == 'acknowledge':
+            commands = ['ACKNOWLEDGE_HOST_PROBLEM', 'ACKNOWLEDGE_SVC_PROBLEM']
+        elif command == 'downtime':
+            commands = ['SCHEDULE_HOST_DOWNTIME', 'SCHEDULE_SVC_DOWNTIME']
         else:
-            action = Actions.Action(
-                type="url-post",
-                string=url,
-                cgi_data=urllib.urlencode(params),
-                conf=self.conf,
-                server=self,
-                host=params["host_name"],
-            )
-        action.run()
+            return Result(result="ERROR", error="Unknown command %s" % (command))
+        if not service:
+            return self.send_command(commands[0], params)
+        params['service_description'] = service
+        return self.send_command(commands[1], params)
+
+
+    def _prepare_command_batch(self, command, items):
+        """
+        API needs no start time from web interface like cmd.cgi
+        """
+        pass
 
 
     def _set_recheck(self, host, service):
-        params = {'host_name': host, 'check_time': int(time.time())}
-        if not service:
-            command = 'SCHEDULE_HOST_CHECK'
-        else:
+        if service:
             if self.hosts[host].services[service].is_passive_only():
                 return
-            command = 'SCHEDULE_SVC_CHECK'
-            params['service_description'] = service
-        self.send_command(command, params)
+        return self.send_commands([('recheck', host, service, {})])
 
 
     def _set_acknowledge(self, host, service, author, comment, sticky, notify, persistent, all_services):
-        params = {'host_name': host, 'sticky': int(sticky),
-                  'notify': int(notify), 'persistent': int(persistent),
+        params = {'sticky': int(sticky), 'notify': int(notify), 'persistent': int(persistent),
                   'comment': comment}
-        if not service:
-            command = 'ACKNOWLEDGE_HOST_PROBLEM'
-        else:
-            params['service_description'] = service
-            command = 'ACKNOWLEDGE_SVC_PROBLEM'
-        self.send_command(command, params)
+        commands = [('acknowledge', host, service, params)]
+        for s in all_services:
+            commands.append(('acknowledge', host, s, params))
+        return self.send_commands(commands)
 
 
     def _set_downtime(self, host, service, author, comment, fixed, start_time, end_time, hours, minutes):
         start_time = int(time.mktime(time.strptime(start_time, "%Y-%m-%d %H:%M")))
         end_time = int(time.mktime(time.strptime(end_time, "%Y-%m-%d %H:%M")))
         duration = end_time - start_time
-        params = {'host_name': host, 'comment': comment,
-                  'fixed': fixed, 'trigger_id': '0', 'start_time': start_time,
+        params = {'comment': comment, 'fixed': fixed, 'trigger_id': '0', 'start_time': start_time,
                   'end_time': end_time, 'duration': duration}
-        if not service:
-            command = 'SCHEDULE_HOST_DOWNTIME'
-        else:
-            command = 'SCHEDULE_SVC_DOWNTIME'
-            params['service_description'] = service
-        self.send_command(command, params)
+        return self.send_commands([('downtime', host, service, params)])
@@ -134,10 +134,11 @@ class ZabbixAPI(object):
     # passwd: HTTP auth password
     # log_level: logging level
     # r_query_len: max len query history
+    # opener: urllib2 opener used for all requests, e.g. with keep-alive handlers
     # **kwargs: Data to pass to each api module
 
     def __init__(self, server='http://localhost/zabbix', user=None, passwd=None,
-                 log_level=logging.WARNING, timeout=10, r_query_len=10, **kwargs):
+                 log_level=logging.WARNING, timeout=10, r_query_len=10, opener=None, **kwargs):
         """ Create an API object.  """
         self._setuplogging()
         self.set_log_level(log_level)
@@ -148,6 +149,15 @@ class ZabbixAPI(object):
         self.httpuser = user
         self.httppasswd = passwd
         self.timeout = timeout
+        # one opener for all requests instead of a new one for every request
+        if opener is not None:
+            self.opener = opener
+        elif self.proto == "https":
+            self.opener = urllib2.build_opener(urllib2.HTTPSHandler(debuglevel=0))
+        elif self.proto == "http":
+            self.opener = urllib2.build_opener(urllib2.HTTPHandler(debuglevel=0))
+        else:
+            raise ZabbixAPIException("Unknow protocol %s" % self.proto)
         self.usergroup = ZabbixAPISubClass(self, dict({"prefix": "usergroup"}, **kwargs))
         self.user = ZabbixAPISubClass(self, dict({"prefix": "user"}, **kwargs))
         self.host = ZabbixAPISubClass(self, dict({"prefix": "host"}, **kwargs))
@@ -258,6 +268,48 @@ class ZabbixAPI(object):
             return False
 
     def do_request(self, json_obj):
+        jobj = self._post(json_obj)
+
+        self.id += 1
+
+        self._check_error(jobj, json_obj)
+        return jobj
+
+    def do_batch(self, calls):
+        """
+        send several (method, params) calls as one JSON-RPC batch in one POST request,
+        results are given back in the order of calls
+        """
+        self.__checkauth__()
+        objs = []
+        for method, params in calls:
+            objs.append({'jsonrpc': '2.0',
+                         'method': method,
+                         'params': params,
+                         'auth': self.auth,
+                         'id': self.id})
+            self.id += 1
+        json_obj = json.dumps(objs)
+
+        jobjs = self._post(json_obj)
+        # errors concerning the whole batch come as single object
+        if type(jobjs) is dict:
+            self._check_error(jobjs, json_obj)
+            raise ZabbixAPIException("Batch request not answered by list: %s" % str(jobjs))
+
+        answers = dict((jobj.get('id'), jobj) for jobj in jobjs)
+        results = []
+        for obj in objs:
+            if obj['id'] not in answers:
+                raise ZabbixAPIException("No answer for %s in batch request" % obj['method'])
+            self._check_error(answers[obj['id']], json.dumps(obj))
+            results.append(answers[obj['id']]['result'])
+        return results
+
+    def _post(self, json_obj):
+        """
+        POST JSON string and give back decoded answer
+        """
         headers = {'Content-Type': 'application/json-rpc',
                    'User-Agent': 'python/zabbix_api'}
 
@@ -270,44 +322,37 @@ class ZabbixAPI(object):
         self.debug(logging.DEBUG, "Sending headers: " + str(headers))
 
         request = urllib2.Request(url=self.url, data=json_obj.encode('utf-8'), headers=headers)
-        if self.proto == "https":
-            https_handler = urllib2.HTTPSHandler(debuglevel=0)
-            opener = urllib2.build_opener(https_handler)
-        elif self.proto == "http":
-            http_handler = urllib2.HTTPHandler(debuglevel=0)
-            opener = urllib2.build_opener(http_handler)
-        else:
-            raise ZabbixAPIException("Unknow protocol %s" % self.proto)
-
-        urllib2.install_opener(opener)
         try:
-            response = opener.open(request, timeout=self.timeout)
+            response = self.opener.open(request, timeout=self.timeout)
             self.debug(logging.INFO, "Response Code: " + str(response.code))
         except:
             #raise ZabbixAPIException("Could not open URL <%s>" % response.url)
             raise ZabbixAPIException("Could not open URL")
 
-        # NOTE: Getting a 412 response code means the headers are not in the
-        # list of allowed headers.
-        if response.code != 200:
-            raise ZabbixAPIException("HTTP ERROR %s: %s"
-                    % (response.status, response.reason))
         try:
-            reads = response.read()
-        except:
-            raise ZabbixAPIException("Could not read response data.")
+            # NOTE: Getting a 412 response code means the headers are not in the
+            # list of allowed headers.
+            if response.code != 200:
+                raise ZabbixAPIException("HTTP ERROR %s: %s"
+                        % (response.code, response.msg))
+            try:
+                reads = response.read()
+            except:
+                raise ZabbixAPIException("Could not read response data.")
+        finally:
+            # lets a keep-alive connection be used again
+            response.close()
 
         if len(reads) == 0:
             raise ZabbixAPIException("Received zero answer")
         try:
             jobj = json.loads(reads.decode('utf-8'))
         except ValueError as msg:
-            print ("unable to decode. returned string: %s" % reads)
-            sys.exit(-1)
+            raise ZabbixAPIException("Unable to decode. Returned string: %s" % reads)
         self.debug(logging.DEBUG, "Response Body: " + str(jobj))
+        return jobj
 
-        self.id += 1
-
+    def _check_error(self, jobj, json_obj):
         if 'error' in jobj:  # some exception
             msg = "Error %s: %s, %s while sending %s" % (jobj['error']['code'],
                     jobj['error']['message'], jobj['error']['data'], str(json_obj))
@@ -315,7 +360,6 @@ class ZabbixAPI(object):
                 raise Already_Exists(msg, jobj['error']['code'])
             else:
                 raise ZabbixAPIException(msg, jobj['error']['code'])
-        return jobj
 
     def logged_in(self):
         if self.auth != '':
@@ -25,6 +25,26 @@ import os.path
 import Queue
 import platform
 import socket
+import time
+
+# measure startup time for debug output - startup_benchmark.py measures the single steps reproducibly
+startup_time = time.time()
+
+def DebugStartupTime():
+    """
+    log time from start until GUI is up and idle in debug mode, used as gobject idle callback
+    """
+    if str(conf.debug_mode) == "True":
+        server_modules = [m for m in sys.modules if m.startswith("Nagstamon.Server.") and sys.modules[m] != None]
+        debug_queue.put("DEBUG: Startup took %.3f seconds, %s server modules loaded: %s" %\
+                        (time.time() - startup_time, len(server_modules), ", ".join(sorted(server_modules))))
+    return False
+
+# headless collector mode polls servers for Nagstamon aggregator servers of other desktops and needs no GUI
+if "--collector" in sys.argv:
+    from Nagstamon import Collector
+    Collector.Run()
+    sys.exit()
 
 try:
     import pygtk
@@ -146,6 +166,13 @@ debugloop.start()
 # start threaded monitor server checking loop
 Actions.StartRefreshLoop(servers=servers, conf=conf, output=output)
 
+# show status cached at last run until first polls finished
+if str(conf.status_cache) == "True":
+    output.ScheduleRefresh()
+
+# as soon as GUI is up and idle tell how long it took to get there
+gobject.idle_add(DebugStartupTime)
+
 # apparently useless desperate attempt to fix the memory leak -
 # beside its uselessness the leak seems to be less leakier now
 # after some code cleaning
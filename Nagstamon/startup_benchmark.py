@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# Nagstamon - Nagios status monitor for your desktop
+# Copyright (C) 2008-2014 Henri Wahl <h.wahl@ifw-dresden.de> et al.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+"""
+startup benchmark - measures the steps of nagstamon.py before the GUI shows up:
+importing modules, reading config and creating servers by Actions.CreateServer()
+every run happens in a fresh interpreter so imports are measured cold, an empty temporary
+config directory is used so nothing depends on the settings of the user
+
+usage: startup_benchmark.py [--servers N] [--type "Server type"] [--runs N] [--gui]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import shutil
+import subprocess
+import optparse
+import Queue
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+def measure(options):
+    """
+    one run, gives back seconds per step
+    """
+    steps = list()
+    start = time.time()
+
+    def step(name):
+        steps.append((name, time.time() - start - sum([s[1] for s in steps])))
+
+    if options.gui:
+        import pygtk
+        pygtk.require("2.0")
+        import gtk
+        step("import gtk")
+
+    from Nagstamon.Config import Config, Server
+    step("import Config")
+    from Nagstamon import Actions
+    from Nagstamon import Custom
+    step("import Actions, Custom")
+    if options.gui:
+        from Nagstamon import GUI
+        step("import GUI")
+
+    configdir = tempfile.mkdtemp(prefix="nagstamon-benchmark-")
+    try:
+        # Config takes its directory from command line
+        sys.argv = [sys.argv[0], configdir]
+        conf = Config()
+        step("Config()")
+
+        debug_queue = Queue.Queue()
+        for i in range(options.servers):
+            server = Server()
+            server.name = "benchmark-%s" % (i)
+            server.type = options.type
+            server.monitor_url = "http://monitor-%s.invalid" % (i)
+            server.monitor_cgi_url = server.monitor_url + "/cgi-bin"
+            conf.servers[server.name] = server
+            Actions.CreateServer(server, conf, debug_queue)
+        step("CreateServer() x %s" % (options.servers))
+    finally:
+        shutil.rmtree(configdir, ignore_errors=True)
+
+    steps.append(("total", time.time() - start))
+    return steps
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("--servers", type="int", default=10, help="number of servers to create")
+    parser.add_option("--type", default="Nagios", help="server type as in settings dialog")
+    parser.add_option("--runs", type="int", default=5, help="number of runs, each in a fresh interpreter")
+    parser.add_option("--gui", action="store_true", default=False, help="import gtk and GUI too")
+    parser.add_option("--child", action="store_true", default=False, help=optparse.SUPPRESS_HELP)
+    options, arguments = parser.parse_args()
+
+    if options.child:
+        print json.dumps(measure(options))
+        return
+
+    # run from directory of this script to use the Nagstamon package next to it
+    directory = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--servers", str(options.servers),
+               "--type", options.type] + {True:["--gui"], False:[]}[options.gui]
+    runs = list()
+    for i in range(options.runs):
+        output = subprocess.Popen(command, cwd=directory, stdout=subprocess.PIPE).communicate()[0]
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    print "%s runs, %s servers of type %s" % (options.runs, options.servers, options.type)
+    for i, (name, seconds) in enumerate(runs[0]):
+        times = sorted([run[i][1] for run in runs])
+        print "%-30s median %8.1f ms   min %8.1f ms" % (name, times[len(times) / 2] * 1000, times[0] * 1000)
+
+
+if __name__ == "__main__":
+    main()